@@ -1,10 +1,14 @@
 # 文件路径: tomato V7/main.py
-# 版本：已添加 ttkthemes 主题
+# 版本：已添加 ttkthemes 主题；连接数据库、检查用户与创建登录窗口同时进行，主程序沿用同一个连接
 
 import sys
 import os
 import logging
-from src.database import DatabaseManager
+import multiprocessing
+from tkinter import messagebox
+from concurrent.futures import ThreadPoolExecutor
+from src.startup_timer import StartupTimer
+from src.database import create_database_manager
 from src.gui import LoginWindow, handle_initial_user_setup, TomatoManagementApp
 from ttkthemes import ThemedTk # 导入 ThemedTk
 
@@ -21,29 +25,81 @@ def setup_logging():
         ]
     )
 
+def connect_database(timer):
+    # 在后台线程中执行：建立主程序要用的连接（含写后同步队列），并检查是否已有用户
+    db_manager = create_database_manager(write_behind=True)
+    has_users = bool(db_manager.get_all_users())
+    timer.mark("连接数据库")
+    return db_manager, has_users
+
+def create_login_window(db_manager=None):
+    # --- 核心修改：在登录窗口也应用主题 ---
+    # 注意：我们将 LoginWindow 的父类从 tk.Tk 改为 ThemedTk
+    login_window = LoginWindow(db_manager)
+    # 你可以尝试不同的主题, 如 'arc', 'plastik', 'breeze', 'scidblue' 等
+    login_window.set_theme("arc") 
+    return login_window
+
+def wait_for_connection(login_window, connection):
+    # 连接完成前登录按钮不可用；连接结果由界面线程轮询取得，窗口不会卡住
+    if not connection.done():
+        login_window.after(20, wait_for_connection, login_window, connection)
+        return
+    try:
+        db_manager, has_users = connection.result()
+    except Exception as e:
+        logging.error(f"连接数据库失败: {e}", exc_info=True)
+        login_window.startup_error = e
+        messagebox.showerror("连接数据库失败", f"无法连接数据库: {e}\n请检查网络和 config.json 中的数据库配置，详情请查看 logs/app.log 文件。",
+                             parent=login_window)
+        login_window.destroy()
+        return
+    login_window.db_manager = db_manager
+    login_window.has_users = has_users
+    if has_users:
+        login_window.set_db_manager(db_manager)
+    else:
+        # 首次运行需要先创建管理员，关闭登录窗口后在 main 中处理
+        login_window.destroy()
+
 def main():
+    timer = StartupTimer()
     setup_logging()
     
     if sys.version_info < (3, 8):
         logging.error("此程序需要 Python 3.8 或更高版本。")
         return
 
-    db_manager = DatabaseManager()
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="startup") as startup:
+        connection = startup.submit(connect_database, timer)
+        login_window = create_login_window()
+        login_window.startup_error = None
+        login_window.has_users = None
+        timer.mark("创建登录窗口")
+        wait_for_connection(login_window, connection)
+        login_window.mainloop()
 
-    if not db_manager.get_all_users():
+    if login_window.startup_error:
+        # 错误已写入日志并在登录窗口关闭前提示过用户
+        logging.info("连接数据库失败，程序退出。")
+        return
+    if login_window.db_manager is None:
+        # 连接完成前关闭了登录窗口
+        logging.info("登录窗口被关闭，程序退出。")
+        if connection.exception() is None:
+            connection.result()[0].close()
+        return
+    db_manager = login_window.db_manager
+
+    if login_window.has_users is False:
         if not handle_initial_user_setup(db_manager):
             logging.info("首次用户设置被取消，程序退出。")
+            db_manager.close()
             return
+        login_window = create_login_window(db_manager)
+        login_window.mainloop()
 
-    # --- 核心修改：在登录窗口也应用主题 ---
-    # 1. 创建带主题的登录窗口
-    # 注意：我们将 LoginWindow 的父类从 tk.Tk 改为 ThemedTk
-    # 为了简单起见，我们直接在这里修改主程序，让它为 LoginWindow 也设置主题
-    login_window = LoginWindow(db_manager)
-    # 你可以尝试不同的主题, 如 'arc', 'plastik', 'breeze', 'scidblue' 等
-    login_window.set_theme("arc") 
-    login_window.mainloop()
-    
+    timer.mark(StartupTimer.USER_WAIT_STAGE)
     login_info = login_window.login_info
 
     if login_info:
@@ -52,11 +108,14 @@ def main():
         # --- 核心修改：让主程序窗口继承 ThemedTk 而不是 tk.Tk ---
         # 这需要我们去 gui.py 修改 TomatoManagementApp 的父类
         # (我们已经在下面的 gui.py 代码中为您修改好了)
-        app = TomatoManagementApp(current_user_info=login_info)
+        app = TomatoManagementApp(current_user_info=login_info, db_manager=db_manager, startup_timer=timer)
         app.set_theme("arc") # 设置一个漂亮的主题
         app.mainloop()
     else:
         logging.info("登录失败或窗口被关闭，程序退出。")
+        db_manager.close()
 
 if __name__ == "__main__":
+    # 批量结算使用进程池，打包成 exe 后子进程需要这一行才能正确启动
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,227 @@
+# 文件路径: src/async_database.py
+# 版本：供 asyncio 服务端使用的异步数据库接口
+#
+# 云端后端使用 supabase-py 的异步客户端：等待网络时只挂起协程，不占用线程，
+# 同时进行的请求数不再受线程数限制。本地 SQLite 查询只需几毫秒，仍放到固定大小的线程池中执行。
+# 两种实现都提供：
+#   1. 并发上限：同时进行的数据库调用不超过 max_concurrency 个，其余请求排队等待；
+#   2. 合并请求：参数完全相同的读查询如果已经在进行中，后来的请求直接等待同一个结果。
+
+import copy
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from supabase import acreate_client
+from .config import ConfigManager
+from .cache import PageCache
+from .db_base import BaseDatabaseManager, _search_key
+from .db_pool import DatabaseManagerPool
+from .database import SupabaseQueries, create_database_manager
+
+
+def _freeze(value):
+    # 把参数转换为可哈希的形式，作为合并请求的键
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class SingleFlight:
+    """同一个键同时只执行一次，其余调用者共享结果（结果应视为只读）。"""
+
+    def __init__(self):
+        self._inflight = {}
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._inflight)
+
+    async def do(self, key, coroutine_factory):
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(coroutine_factory())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield：某个请求被取消（客户端断开）时，不影响其他等待同一结果的请求
+        return await asyncio.shield(future)
+
+
+async def create_async_database_manager(config=None, max_concurrency=16):
+    # 与 create_database_manager 一样按 storage_backend 选择后端；需在事件循环中调用
+    config = config or ConfigManager()
+    if config.get("storage_backend", "supabase") == "supabase":
+        url, key = config.get("supabase_url"), config.get("supabase_key")
+        if not url or not key or "YOUR_URL" in url:
+            raise ValueError("请在config.json中配置好Supabase的URL和Key")
+        return AsyncSupabaseManager(await acreate_client(url, key), max_concurrency)
+    # 连接池大小与并发上限一致，每个执行中的调用都能拿到独立的管理器
+    pool = DatabaseManagerPool(functools.partial(create_database_manager, config), size=max_concurrency)
+    return ThreadedDatabaseManager(pool, max_concurrency)
+
+
+class AsyncDatabaseManager:
+    """db.fetch_records_page(...) 等价于 await db.call('fetch_records_page', ...)；子类实现 _run。"""
+
+    # 这些只读方法的相同调用会被合并
+    COALESCED_METHODS = {'fetch_records_page', 'get_record', 'count_records', 'get_custom_summary', 'get_summary_totals', 'get_table_version'}
+
+    def __init__(self, max_concurrency=8):
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        self._flights = SingleFlight()
+
+    async def _run(self, method, *args):
+        raise NotImplementedError("子类必须实现 _run 方法")
+
+    async def call(self, method, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            return await self._run(method, *args)
+
+    def __getattr__(self, method):
+        if method.startswith('_'):
+            raise AttributeError(method)
+
+        async def invoke(*args):
+            if method in self.COALESCED_METHODS:
+                return await self._flights.do((method, _freeze(args)), lambda: self.call(method, *args))
+            return await self.call(method, *args)
+        return invoke
+
+    def stats(self):
+        return {'max_concurrency': self.max_concurrency, 'in_flight': len(self._flights), 'coalesced': self._flights.coalesced}
+
+    async def close(self):
+        raise NotImplementedError("子类必须实现 close 方法")
+
+
+class ThreadedDatabaseManager(AsyncDatabaseManager):
+    """把同步管理器的调用放到线程池中执行，用于本地 SQLite 后端。"""
+
+    def __init__(self, pool, max_concurrency=8):
+        super().__init__(max_concurrency)
+        self.pool = pool
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="async-db")
+
+    def _call_sync(self, method, args):
+        with self.pool.connection() as manager:
+            return getattr(manager, method)(*args)
+
+    async def _run(self, method, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call_sync, method, args)
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
+        self.pool.close()
+        logging.info("异步数据库接口已关闭。")
+
+
+class AsyncSupabaseManager(SupabaseQueries, AsyncDatabaseManager):
+    """基于 supabase-py 异步客户端的云端后端，查询构造与同步的 DatabaseManager 共用。
+
+    只实现 JSON 接口用到的方法，出错时的返回值与 DatabaseManager 相同。
+    """
+
+    def __init__(self, client, max_concurrency=8, page_cache=None):
+        super().__init__(max_concurrency)
+        self.client = client
+        self._page_cache = page_cache or PageCache(BaseDatabaseManager.PAGE_CACHE_ENTRIES, BaseDatabaseManager.PAGE_CACHE_TTL_SECONDS)
+
+    async def _run(self, method, *args):
+        handler = getattr(self, f"_{method}", None)
+        if handler is None:
+            raise AttributeError(f"异步数据库接口不支持 {method}")
+        return await handler(*args)
+
+    async def _fetch_records_page(self, table_name, page_size, search_params={}, cursor=None, direction='next', page=1, count_mode='exact'):
+        key = (table_name, 'cursor', page_size, _search_key(search_params), tuple(cursor) if cursor else None, direction, page, count_mode)
+        cached = self._page_cache.get(key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+        generation = self._page_cache.generation(table_name)
+        try:
+            response = await self._records_page_query(self.client, table_name, page_size, search_params, cursor, direction, page, count_mode).execute()
+            if cursor and count_mode:
+                total = (await self._record_count_query(self.client, table_name, search_params).execute()).count
+            else:
+                total = response.count
+        except Exception as e:
+            logging.error(f"游标分页获取 {table_name} 记录失败: {e}")
+            return BaseDatabaseManager._build_page_result([], page_size, None, 'next', 1, 0)
+        result = self._records_page_result(table_name, response, page_size, cursor, direction, page, total)
+        self._page_cache.set(key, result, generation)
+        return copy.deepcopy(result)
+
+    async def _get_record(self, table_name, record_id):
+        try:
+            response = await self.client.table(table_name).select("*").eq('id', record_id).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logging.error(f"获取 {table_name} 记录ID {record_id} 失败: {e}")
+            return None
+
+    async def _get_record_by_key(self, table_name, date, name, spec):
+        try:
+            response = await self._record_by_key_query(self.client, table_name, date, name, spec).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logging.error(f"按日期、姓名、规格查找 {table_name} 记录失败: {e}")
+            return None
+
+    async def _add_record(self, table_name, data):
+        try:
+            await self.client.table(table_name).insert({k: v for k, v in data.items() if v is not None}).execute()
+            self._page_cache.invalidate(table_name)
+            return True
+        except Exception as e:
+            logging.error(f"向 {table_name} 添加记录失败: {e}")
+            return False
+
+    async def _update_record(self, table_name, record_id, data):
+        try:
+            await self.client.table(table_name).update(data).eq('id', record_id).execute()
+            self._page_cache.invalidate(table_name)
+            return True
+        except Exception as e:
+            logging.error(f"更新 {table_name} 记录ID {record_id} 失败: {e}")
+            return False
+
+    async def _delete_record(self, table_name, record_id):
+        try:
+            await self.client.table(table_name).delete().eq('id', record_id).execute()
+            self._page_cache.invalidate(table_name)
+            return True
+        except Exception as e:
+            logging.error(f"删除记录ID '{record_id}' 失败: {e}")
+            return False
+
+    async def _get_custom_summary(self, record_type, start_date, end_date, name=None, granularity='day'):
+        # 没有同步版的本地汇总降级路径，需先执行 supabase/migrations 中的 get_record_summary 迁移
+        try:
+            response = await self._custom_summary_query(self.client, record_type, start_date, end_date, name, granularity).execute()
+            return self._custom_summary_frame(response.data)
+        except Exception as e:
+            logging.error(f"获取自定义汇总数据失败: {e}")
+            return self._custom_summary_frame(None)
+
+    async def _get_summary_totals(self, record_type, start_date=None, end_date=None, name=None):
+        try:
+            response = await self._summary_totals_query(self.client, record_type, start_date, end_date, name).execute()
+            return self._summary_totals_result(response.data)
+        except Exception as e:
+            logging.error(f"获取汇总合计失败: {e}")
+            return self._summary_totals_result(None)
+
+    def stats(self):
+        return dict(super().stats(), page_cache=self._page_cache.stats())
+
+    async def close(self):
+        await self.client.postgrest.aclose()
+        logging.info("异步数据库接口已关闭。")
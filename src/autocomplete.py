@@ -0,0 +1,50 @@
+# 文件路径: src/autocomplete.py
+# 版本：姓名/规格输入联想用的前缀索引，支持拼音首字母匹配（如 "zs" 匹配 "张三"）
+
+import bisect
+
+try:
+    # 可选依赖：未安装 pypinyin 时仅按原文前缀匹配
+    from pypinyin import lazy_pinyin, Style
+except ImportError:
+    lazy_pinyin = None
+
+
+def pinyin_keys(value):
+    # 返回拼音首字母和全拼两种检索键，例如 "张三" -> ["zs", "zhangsan"]
+    if lazy_pinyin is None or value.isascii():
+        return []
+    initials = "".join(lazy_pinyin(value, style=Style.FIRST_LETTER)).lower()
+    full = "".join(lazy_pinyin(value)).lower()
+    return [initials, full]
+
+
+class PrefixIndex:
+    """有序数组 + 二分查找的前缀索引，构建 O(n log n)，查询 O(log n + k)。"""
+
+    def __init__(self, values, max_results=50):
+        self.values = tuple(values)
+        self.max_results = max_results
+        entries = []
+        for order, value in enumerate(self.values):
+            text = str(value)
+            for key in {text.lower(), *pinyin_keys(text)}:
+                entries.append((key, order))
+        entries.sort()
+        self._keys = [key for key, _ in entries]
+        self._orders = [order for _, order in entries]
+
+    def search(self, prefix):
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return list(self.values[:self.max_results])
+        start = bisect.bisect_left(self._keys, prefix)
+        # 同一个值可能经由原文、首字母、全拼多次命中，去重后按原有顺序返回
+        matched = set()
+        for i in range(start, len(self._keys)):
+            if not self._keys[i].startswith(prefix):
+                break
+            matched.add(self._orders[i])
+            if len(matched) >= self.max_results:
+                break
+        return [self.values[order] for order in sorted(matched)]
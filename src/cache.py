@@ -0,0 +1,119 @@
+# 文件路径: src/cache.py
+# 版本：进程内缓存工具，供 DatabaseManager 减少重复的网络查询
+
+import time
+import bisect
+import threading
+import collections
+
+
+class DistinctValueCache:
+    """按 (表名, 列名) 缓存去重后的有序取值列表，超过 TTL 后需要重新查询。"""
+
+    def __init__(self, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            values, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            return list(values)
+
+    def set(self, key, values):
+        with self._lock:
+            self._entries[key] = (sorted(set(values)), time.monotonic() + self.ttl_seconds)
+
+    def add(self, key, value):
+        # 本地写入的新值直接插入有序列表，未缓存的键等下次查询时再整体加载
+        if not value:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            values = entry[0]
+            index = bisect.bisect_left(values, value)
+            if index == len(values) or values[index] != value:
+                values.insert(index, value)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+class PageCache:
+    """按 (表名, 查询方法, 查询参数) 缓存分页查询结果和总数，超出容量时淘汰最久未用的条目。
+
+    本进程写入某表后该表的条目全部失效；其他终端的写入靠 TTL 和变更推送失效。
+    """
+
+    def __init__(self, max_entries=200, ttl_seconds=30):
+        # max_entries 为 0 时不缓存（本地 SQLite 查询本身足够快）
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        # 每次失效时递增；查询开始后表被写入过的结果不再放入缓存
+        self._generations = collections.Counter()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        # key[0] 为表名；未命中返回 None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() < entry[1]:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def generation(self, table_name):
+        # 登记该表，之后 invalidate(None) 也会使查询中尚无缓存条目的表失效
+        with self._lock:
+            return self._generations.setdefault(table_name, 0)
+
+    def set(self, key, value, generation):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if self._generations[key[0]] != generation:
+                return
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, table_name=None):
+        with self._lock:
+            tables = [table_name] if table_name else {key[0] for key in self._entries} | set(self._generations)
+            for table in tables:
+                self._generations[table] += 1
+            for key in [key for key in self._entries if key[0] in tables]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,125 @@
+# 文件路径: src/change_feed.py
+# 版本：变更推送，后台线程读取变更日志并分发给桌面端列表和网页端的 SSE 连接
+#
+# 一个进程只需一个 ChangeFeed：无论有多少个监听者，数据库每个轮询周期只被查询一次，
+# 没有监听者时不查询。监听者拿到的是原始变更批次，用 coalesce_changes 合并后再更新界面。
+
+import time
+import queue
+import logging
+import threading
+from .db_base import TABLE_COLUMNS
+
+# 一个表在同一批中的变更超过该数量（例如批量导入）时，不再逐行更新，改为整页重新加载
+MAX_PATCH_ROWS = 200
+
+
+def reload_events(table_names=None):
+    return [{'table_name': t, 'op': 'reload'} for t in (table_names or TABLE_COLUMNS)]
+
+
+def coalesce_changes(changes, max_rows=MAX_PATCH_ROWS):
+    # 同一条记录只保留最后一次变更；变更过多的表合并为一个 reload 事件
+    latest = {}
+    for change in changes:
+        key = (change['table_name'], change.get('record_id'))
+        latest.pop(key, None)
+        latest[key] = change
+    per_table = {}
+    for change in latest.values():
+        per_table.setdefault(change['table_name'], []).append(change)
+    events = []
+    for table_name, table_changes in per_table.items():
+        if len(table_changes) > max_rows or any(c['op'] == 'reload' for c in table_changes):
+            events.extend(reload_events([table_name]))
+        else:
+            events.extend(table_changes)
+    return events
+
+
+class ChangeFeed:
+    """轮询变更日志，把每批新变更放入所有订阅者的队列。"""
+
+    # 数据库不可用或未建变更日志时，轮询间隔逐步放慢到该值，避免刷屏报错
+    MAX_BACKOFF_SECONDS = 60
+    PRUNE_INTERVAL_SECONDS = 3600
+
+    def __init__(self, run_query, interval=1.0, batch_size=500):
+        # run_query(method_name, *args) 执行一次数据库调用：网页端从连接池借用管理器，桌面端直接使用主程序的管理器
+        self._run_query = run_query
+        self.interval = interval
+        self.batch_size = batch_size
+        self.last_seq = None
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def subscribe(self, maxsize=100):
+        subscriber = queue.Queue(maxsize=maxsize)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _run(self):
+        delay = self.interval
+        last_prune = time.monotonic()
+        while not self._stop.wait(delay):
+            with self._lock:
+                has_subscribers = bool(self._subscribers)
+            if not has_subscribers:
+                # 无人监听时不查询，下次有人订阅时从最新位置开始
+                self.last_seq = None
+                continue
+            try:
+                ok = self._poll()
+            except Exception as e:
+                logging.error(f"读取变更日志失败: {e}")
+                ok = False
+            delay = self.interval if ok else min(delay * 2, self.MAX_BACKOFF_SECONDS)
+            # 本地 SQLite 由这里清理；云端由数据库定时任务清理，DatabaseManager.prune_change_log 为空操作
+            if ok and time.monotonic() - last_prune > self.PRUNE_INTERVAL_SECONDS:
+                last_prune = time.monotonic()
+                self._run_query('prune_change_log')
+
+    def _poll(self):
+        if self.last_seq is None:
+            self.last_seq = self._run_query('get_latest_change_seq')
+            return self.last_seq is not None
+        while True:
+            changes = self._run_query('fetch_changes', self.last_seq, self.batch_size)
+            if changes is None:
+                return False
+            if not changes:
+                return True
+            self.last_seq = changes[-1]['seq']
+            self._publish(changes)
+            if len(changes) < self.batch_size:
+                return True
+
+    def _publish(self, changes):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(changes)
+            except queue.Full:
+                # 监听者处理不过来：丢弃积压的变更，通知其整页重新加载
+                while True:
+                    try:
+                        subscriber.get_nowait()
+                    except queue.Empty:
+                        break
+                subscriber.put_nowait(reload_events())
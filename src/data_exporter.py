@@ -0,0 +1,111 @@
+# 文件路径: src/data_exporter.py
+# 版本：把记录导出为 CSV / Parquet 数据文件，列名与导入文件一致，导出的文件可直接再导入
+#
+# 与 Excel 结算单不同，这里只输出原始数据：CSV 供其他软件读取，Parquet（需要 pyarrow）供会计做数据分析。
+# 记录按块写入，内存占用与导出的总行数无关。
+
+import os
+import pandas as pd
+from .excel_importer import IMPORT_RENAME_MAPS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# 导入文件中没有、但导出时附带的计算列
+EXPORT_EXTRA_COLUMNS = {
+    'grower': {'net_weight': '净重(斤)', 'total_amount': '金额'},
+    'client': {'total_amount': '金额'},
+}
+TEXT_FIELDS = {'grower_name', 'client_name', 'spec', 'notes'}
+# Parquet 每个行组的行数，太小会拖慢读取
+PARQUET_ROW_GROUP_ROWS = 50000
+
+
+def export_columns(record_type):
+    # 数据库字段 -> 文件列名，顺序即文件中列的顺序
+    columns = {field: label for label, field in IMPORT_RENAME_MAPS[record_type].items()}
+    columns.update(EXPORT_EXTRA_COLUMNS[record_type])
+    return columns
+
+
+def export_file_types():
+    types = [("CSV 文件", "*.csv")]
+    if pq is not None:
+        types.append(("Parquet 文件", "*.parquet"))
+    return types
+
+
+def create_record_exporter(file_path, record_type):
+    if os.path.splitext(file_path)[1].lower() == '.parquet':
+        return ParquetRecordExporter(record_type)
+    return CsvRecordExporter(record_type)
+
+
+class RecordFileExporter:
+    def __init__(self, record_type):
+        self.record_type = record_type
+        self.columns = export_columns(record_type)
+
+    def _frame(self, chunk):
+        return pd.DataFrame(chunk, columns=list(self.columns)).rename(columns=self.columns)
+
+    def write(self, chunks, file_path, progress=None, total=None):
+        # chunks 为记录字典列表的迭代器（iter_record_chunks 的结果），返回写入的行数
+        raise NotImplementedError("子类必须实现 write 方法")
+
+
+class CsvRecordExporter(RecordFileExporter):
+    def write(self, chunks, file_path, progress=None, total=None):
+        count = 0
+        # 带 BOM 的 UTF-8，Excel 直接打开不会乱码
+        with open(file_path, 'w', encoding='utf-8-sig', newline='') as f:
+            for chunk in chunks:
+                self._frame(chunk).to_csv(f, header=(count == 0), index=False)
+                count += len(chunk)
+                if progress:
+                    progress(count, max(total or 0, count), "正在写入CSV")
+            if count == 0:
+                self._frame([]).to_csv(f, index=False)
+        return count
+
+
+class ParquetRecordExporter(RecordFileExporter):
+    def _schema(self):
+        fields = []
+        for field, label in self.columns.items():
+            if field == 'date':
+                fields.append(pa.field(label, pa.date32()))
+            elif field in TEXT_FIELDS:
+                fields.append(pa.field(label, pa.string()))
+            else:
+                fields.append(pa.field(label, pa.float64()))
+        return pa.schema(fields)
+
+    def _to_table(self, frames, schema):
+        df = pd.concat(frames, ignore_index=True)
+        date_label = self.columns['date']
+        df[date_label] = pd.to_datetime(df[date_label]).dt.date
+        return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+    def write(self, chunks, file_path, progress=None, total=None):
+        if pq is None:
+            raise RuntimeError("未安装 pyarrow，无法导出 Parquet 文件。")
+        schema = self._schema()
+        count = 0
+        pending, pending_rows = [], 0
+        with pq.ParquetWriter(file_path, schema, compression='zstd') as writer:
+            for chunk in chunks:
+                pending.append(self._frame(chunk))
+                pending_rows += len(chunk)
+                count += len(chunk)
+                if pending_rows >= PARQUET_ROW_GROUP_ROWS:
+                    writer.write_table(self._to_table(pending, schema))
+                    pending, pending_rows = [], 0
+                if progress:
+                    progress(count, max(total or 0, count), "正在写入Parquet")
+            if pending:
+                writer.write_table(self._to_table(pending, schema))
+        return count
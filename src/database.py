@@ -1,14 +1,117 @@
 # 文件路径: src/database.py
-# 最终PC端修正版: 已修复云端删除和添加的BUG
+# 版本：导入查重改为按日期范围+姓名集合批量查询
 
 import os
 import logging
 import pandas as pd
 from supabase import create_client, Client
 from .config import ConfigManager
+from .db_base import BaseDatabaseManager, NAME_COLUMNS, truncate_dates, CHANGE_LOG_RETENTION
 
-class DatabaseManager:
-    def __init__(self, db_name=None):
+
+def create_database_manager(config=None, write_behind=False, page_cache=None):
+    # 根据 config.json 中的 storage_backend 选择存储后端: supabase(默认) 或 sqlite
+    # write_behind=True 时，云端后端的增删改先写入本地日志，由后台线程同步（offline_sync 可关闭）
+    # page_cache 供网页端连接池中的多个云端管理器共用分页缓存
+    config = config or ConfigManager()
+    backend = config.get("storage_backend", "supabase")
+    if backend == "sqlite":
+        from .sqlite_database import SQLiteDatabaseManager
+        return SQLiteDatabaseManager(config.get("sqlite_path", "records.db"))
+    if backend == "supabase":
+        manager = DatabaseManager(page_cache=page_cache)
+        if write_behind and config.get("offline_sync", True):
+            from .sync_queue import SyncedDatabaseManager, default_journal_path
+            manager = SyncedDatabaseManager(manager, config.get("sync_journal_path") or default_journal_path())
+        return manager
+    raise ValueError(f"未知的存储后端: {backend}")
+
+
+class SupabaseQueries:
+    """同步的 DatabaseManager 与 async_database.AsyncSupabaseManager 共用的查询构造。
+
+    client 可以是同步或异步的 Supabase 客户端；方法返回尚未执行的查询，由调用方 execute()（异步客户端需 await）。
+    """
+
+    def _apply_search_filters(self, query, table_name, search_params):
+        name_col = NAME_COLUMNS[table_name]
+        if search_params.get('name'):
+            query = query.like(name_col, f"%{search_params['name']}%")
+        if search_params.get('start_date'):
+            query = query.gte('date', search_params['start_date'])
+        if search_params.get('end_date'):
+            query = query.lte('date', search_params['end_date'])
+        return query
+
+    def _records_page_query(self, client, table_name, page_size, search_params, cursor, direction, page, count_mode):
+        # 游标条件只用于定位本页，总数必须按搜索条件统计；带游标时由调用方单独计数，否则总数会随翻页不断变小
+        count_in_query = count_mode if not cursor else None
+        query = client.table(table_name).select("*", count=count_in_query) if count_in_query else client.table(table_name).select("*")
+        query = self._apply_search_filters(query, table_name, search_params)
+        if cursor:
+            # 键集分页：以 (date, id) 为游标，借助 (date, id) 索引直接定位，不再随页数增长变慢
+            cursor_date, cursor_id = cursor
+            op = 'lt' if direction == 'next' else 'gt'
+            query = query.or_(f"date.{op}.{cursor_date},and(date.eq.{cursor_date},id.{op}.{cursor_id})")
+            descending = direction == 'next'
+            return query.order('date', desc=descending).order('id', desc=descending).limit(page_size + 1)
+        offset = (page - 1) * page_size
+        return query.order('date', desc=True).order('id', desc=True).range(offset, offset + page_size)
+
+    def _records_page_result(self, table_name, response, page_size, cursor, direction, page, total):
+        rows = [BaseDatabaseManager._record_to_tuple(table_name, r) for r in response.data]
+        return BaseDatabaseManager._build_page_result(rows, page_size, cursor, direction, page, total)
+
+    def _record_count_query(self, client, table_name, search_params):
+        query = client.table(table_name).select("id", count='exact').limit(1)
+        return self._apply_search_filters(query, table_name, search_params)
+
+    def _record_by_key_query(self, client, table_name, date, name, spec):
+        return (client.table(table_name).select("*").eq('date', str(date))
+                .eq(NAME_COLUMNS[table_name], name).eq('spec', spec).limit(1))
+
+    def _custom_summary_query(self, client, record_type, start_date, end_date, name, granularity):
+        # 数据库端聚合函数 (supabase/migrations/*_get_record_summary.sql)，只传回聚合后的行
+        return client.rpc('get_record_summary', {
+            'p_record_type': record_type,
+            'p_start_date': start_date,
+            'p_end_date': end_date,
+            'p_name': name if name and name != '全部' else None,
+            'p_granularity': granularity,
+        })
+
+    @staticmethod
+    def _custom_summary_frame(data):
+        if not data:
+            return pd.DataFrame()
+        summary_df = pd.DataFrame(data)
+        summary_df['date'] = pd.to_datetime(summary_df['date'])
+        return summary_df
+
+    def _summary_totals_query(self, client, record_type, start_date, end_date, name):
+        return client.rpc('get_summary_totals', {
+            'p_record_type': record_type,
+            'p_start_date': start_date,
+            'p_end_date': end_date,
+            'p_name': name if name and name != '全部' else None,
+        })
+
+    @staticmethod
+    def _summary_totals_result(data):
+        row = data[0] if data else {}
+        return {
+            'total_weight': row.get('total_weight') or 0,
+            'total_amount': row.get('total_amount') or 0,
+            'record_count': row.get('record_count') or 0,
+        }
+
+
+class DatabaseManager(SupabaseQueries, BaseDatabaseManager):
+    # 按自然键批量查找时每次查询携带的键数，避免 URL 过长
+    KEY_LOOKUP_CHUNK_SIZE = 100
+
+    def __init__(self, db_name=None, page_cache=None):
+        super().__init__(page_cache)
         config = ConfigManager()
         url: str = config.get("supabase_url")
         key: str = config.get("supabase_key")
@@ -65,50 +168,108 @@ class DatabaseManager:
             logging.error(f"删除用户ID '{user_id}' 失败: {e}")
             return False
 
-    def fetch_paged_records(self, table_name, page, page_size, search_params={}):
+    def _query_paged_records(self, table_name, page, page_size, search_params={}):
         offset = (page - 1) * page_size
+        query = self.supabase.table(table_name).select("*").order('date', desc=True).order('id', desc=True).range(offset, offset + page_size - 1)
+        query = self._apply_search_filters(query, table_name, search_params)
+        response = query.execute()
+        return [self._record_to_tuple(table_name, r) for r in response.data]
+
+    def _query_records_page(self, table_name, page_size, search_params={}, cursor=None, direction='next', page=1, count_mode='exact'):
+        response = self._records_page_query(self.supabase, table_name, page_size, search_params, cursor, direction, page, count_mode).execute()
+        total = self._query_record_count(table_name, search_params) if cursor and count_mode else response.count
+        return self._records_page_result(table_name, response, page_size, cursor, direction, page, total)
+
+    def iter_record_chunks(self, table_name, search_params={}, chunk_size=1000):
+        cursor = None
+        while True:
+            query = self._apply_search_filters(self.supabase.table(table_name).select("*"), table_name, search_params)
+            if cursor:
+                query = query.or_(f"date.gt.{cursor[0]},and(date.eq.{cursor[0]},id.gt.{cursor[1]})")
+            rows = query.order('date').order('id').limit(chunk_size).execute().data
+            if rows:
+                yield rows
+            if len(rows) < chunk_size:
+                return
+            cursor = (rows[-1]['date'], rows[-1]['id'])
+
+    def get_search_overview(self, table_name, search_params={}):
+        # 几次各取一行的小查询代替把全部结果下载到本地再检查
+        name_col = self._name_column(table_name)
         try:
-            query = self.supabase.table(table_name).select("*", count='exact').order('date', desc=True).order('id', desc=True).range(offset, offset + page_size - 1)
-            name_col = 'grower_name' if table_name == 'grower_records' else 'client_name'
-            if search_params.get('name'):
-                query = query.like(name_col, f"%{search_params['name']}%")
-            if search_params.get('start_date'):
-                query = query.gte('date', search_params['start_date'])
-            if search_params.get('end_date'):
-                query = query.lte('date', search_params['end_date'])
-            response = query.execute()
-            records = []
-            if table_name == 'grower_records':
-                for r in response.data:
-                    records.append((r['id'], r['date'], r['grower_name'], r['spec'], r['gross_weight'], r['secondary_fruit'], r['tare_weight'], r['net_weight'], r['unit_price'], r['total_amount'], r['notes']))
-            else:
-                for r in response.data:
-                    records.append((r['id'], r['date'], r['client_name'], r['spec'], r['pieces'], r['weight'], r['unit_price'], r['total_amount'], r['notes']))
-            return records
+            def base_query(count_mode=None):
+                query = self.supabase.table(table_name).select(f"date,{name_col}", count=count_mode) if count_mode else self.supabase.table(table_name).select(f"date,{name_col}")
+                return self._apply_search_filters(query, table_name, search_params)
+            first = base_query('exact').order('date').order('id').limit(1).execute()
+            if not first.data:
+                return {'count': 0, 'names': [], 'min_date': None, 'max_date': None}
+            last = base_query().order('date', desc=True).order('id', desc=True).limit(1).execute().data[0]
+            names = [first.data[0][name_col]]
+            other = base_query().neq(name_col, names[0]).limit(1).execute().data
+            if other:
+                names.append(other[0][name_col])
+            return {'count': first.count, 'names': names, 'min_date': first.data[0]['date'], 'max_date': last['date']}
         except Exception as e:
-            logging.error(f"分页获取 {table_name} 记录失败: {e}")
-            return []
+            logging.error(f"获取 {table_name} 搜索结果概况失败: {e}")
+            return None
+
+    def _query_record_count(self, table_name, search_params={}):
+        return self._record_count_query(self.supabase, table_name, search_params).execute().count
 
-    def count_records(self, table_name, search_params={}):
+    def get_table_version(self, table_name):
         try:
-            query = self.supabase.table(table_name).select("id", count='exact')
-            name_col = 'grower_name' if table_name == 'grower_records' else 'client_name'
-            if search_params.get('name'):
-                query = query.like(name_col, f"%{search_params['name']}%")
-            if search_params.get('start_date'):
-                query = query.gte('date', search_params['start_date'])
-            if search_params.get('end_date'):
-                query = query.lte('date', search_params['end_date'])
-            response = query.execute()
-            return response.count
+            response = self.supabase.table('table_versions').select('version').eq('table_name', table_name).limit(1).execute()
+            return response.data[0]['version'] if response.data else 0
         except Exception as e:
-            logging.error(f"统计 {table_name} 记录数失败: {e}")
-            return 0
+            logging.error(f"获取 {table_name} 版本号失败: {e}")
+            return None
+
+    def fetch_changes(self, since_seq, limit=500):
+        try:
+            response = (self.supabase.table('change_log').select('seq, table_name, op, record_id, record')
+                        .gt('seq', int(since_seq or 0)).order('seq').limit(limit).execute())
+            return response.data or []
+        except Exception as e:
+            logging.error(f"读取变更日志失败: {e}")
+            return None
+
+    def get_latest_change_seq(self):
+        try:
+            response = self.supabase.table('change_log').select('seq').order('seq', desc=True).limit(1).execute()
+            return response.data[0]['seq'] if response.data else 0
+        except Exception as e:
+            logging.error(f"读取变更日志序号失败: {e}")
+            return None
+
+    def prune_change_log(self, keep=CHANGE_LOG_RETENTION):
+        # 云端变更日志由数据库内的定时任务清理（见 20261017180000_restrict_prune_change_log.sql），
+        # 客户端没有执行权限，这里什么也不做
+        return 0
+
+    def get_record(self, table_name, record_id):
+        try:
+            response = self.supabase.table(table_name).select("*").eq('id', record_id).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logging.error(f"获取 {table_name} 记录ID {record_id} 失败: {e}")
+            return None
+
+    def record_exists(self, table_name, record_id):
+        response = self.supabase.table(table_name).select("id").eq('id', record_id).execute()
+        return bool(response.data)
+
+    def get_last_change(self, table_name, record_id):
+        response = (self.supabase.table('change_log').select('seq, changed_at').eq('table_name', table_name)
+                    .eq('record_id', record_id).order('seq', desc=True).limit(1).execute())
+        if not response.data:
+            return None
+        return {'seq': response.data[0]['seq'], 'changed_at': pd.Timestamp(response.data[0]['changed_at']).timestamp()}
 
     def add_record(self, table_name, data):
         clean_data = {k: v for k, v in data.items() if v is not None}
         try:
             self.supabase.table(table_name).insert(clean_data).execute()
+            self._remember_written_values(table_name, [clean_data])
             return True
         except Exception as e:
             logging.error(f"向 {table_name} 添加记录失败: {e}")
@@ -117,6 +278,7 @@ class DatabaseManager:
     def update_record(self, table_name, record_id, data):
         try:
             self.supabase.table(table_name).update(data).eq('id', record_id).execute()
+            self._remember_written_values(table_name, [data])
             return True
         except Exception as e:
             logging.error(f"更新 {table_name} 记录ID {record_id} 失败: {e}")
@@ -125,22 +287,22 @@ class DatabaseManager:
     def delete_record(self, table_name, record_id):
         try:
             self.supabase.table(table_name).delete().eq('id', record_id).execute()
+            self._page_cache.invalidate(table_name)
             return True
         except Exception as e:
             logging.error(f"删除记录ID '{record_id}' 失败: {e}")
             return False
 
-    def fetch_distinct_values(self, table_name, column_name):
+    def _query_distinct_values(self, table_name, column_name):
         try:
-            response = self.supabase.table(table_name).select(column_name).execute()
-            if response.data:
-                distinct_values = sorted(list(set(item[column_name] for item in response.data if item[column_name])))
-                return distinct_values
-            return []
+            # 数据库端 DISTINCT (supabase/migrations/*_get_distinct_values.sql)，只传回唯一值
+            response = self.supabase.rpc('get_distinct_values', {'p_table': table_name, 'p_column': column_name}).execute()
+            return [row['value'] for row in response.data]
         except Exception as e:
-            logging.error(f"获取 {table_name} 的 {column_name} 列唯一值失败: {e}")
-            return []
-            
+            logging.warning(f"调用数据库去重函数失败，改为拉取整列去重: {e}")
+        rows = self._fetch_all_rows(lambda: self.supabase.table(table_name).select(column_name))
+        return [row[column_name] for row in rows if row[column_name]]
+
     def get_records_by_ids(self, table_name, ids):
         try:
             response = self.supabase.table(table_name).select("*").in_('id', ids).execute()
@@ -149,49 +311,113 @@ class DatabaseManager:
             logging.error(f"根据IDs获取 {table_name} 记录失败: {e}")
             return pd.DataFrame()
 
-    def get_custom_summary(self, record_type, start_date, end_date, name=None):
+    def get_custom_summary(self, record_type, start_date, end_date, name=None, granularity='day'):
+        name = name if name and name != '全部' else None
+        try:
+            # 优先调用数据库端聚合函数，只传回聚合后的行
+            response = self._custom_summary_query(self.supabase, record_type, start_date, end_date, name, granularity).execute()
+            return self._custom_summary_frame(response.data)
+        except Exception as e:
+            logging.warning(f"调用数据库聚合函数失败，改为在本地汇总: {e}")
+            return self._get_custom_summary_locally(record_type, start_date, end_date, name, granularity)
+
+    def get_summary_totals(self, record_type, start_date=None, end_date=None, name=None):
+        try:
+            response = self._summary_totals_query(self.supabase, record_type, start_date, end_date, name).execute()
+            return self._summary_totals_result(response.data)
+        except Exception as e:
+            logging.error(f"获取汇总合计失败: {e}")
+            return self._summary_totals_result(None)
+
+    def rebuild_daily_summary(self):
+        # 云端的重建函数只对 service_role 开放，使用 anon key 时会被拒绝，需在 SQL 编辑器中执行
+        try:
+            response = self.supabase.rpc('rebuild_daily_summary', {}).execute()
+            logging.info(f"日汇总表已重建，共 {response.data} 行。")
+            return response.data
+        except Exception as e:
+            logging.error(f"重建日汇总表失败（云端需在 Supabase SQL 编辑器中执行 select public.rebuild_daily_summary();）: {e}")
+            return None
+
+    def _get_custom_summary_locally(self, record_type, start_date, end_date, name, granularity):
         table_name = f"{record_type}_records"
-        name_column = 'grower_name' if record_type == 'grower' else 'client_name'
+        name_column = self._name_column(table_name)
+        weight_col = 'net_weight' if record_type == 'grower' else 'weight'
         try:
-            query = self.supabase.table(table_name).select('date', 'total_amount', 'net_weight' if record_type == 'grower' else 'weight').gte('date', start_date).lte('date', end_date)
-            if name and name != '全部':
-                query = query.eq(name_column, name)
-            response = query.execute()
-            if not response.data:
+            def build_query():
+                query = self.supabase.table(table_name).select('date', 'total_amount', weight_col).gte('date', start_date).lte('date', end_date)
+                return query.eq(name_column, name) if name else query
+            rows = self._fetch_all_rows(build_query)
+            if not rows:
                 return pd.DataFrame()
-            df = pd.DataFrame(response.data)
+            df = pd.DataFrame(rows)
             df['date'] = pd.to_datetime(df['date'])
-            weight_col = 'net_weight' if record_type == 'grower' else 'weight'
             df.rename(columns={weight_col: 'total_weight'}, inplace=True)
+            df['date'] = truncate_dates(df['date'], granularity)
             summary_df = df.groupby('date').agg(total_revenue=('total_amount', 'sum'), total_weight=('total_weight', 'sum')).reset_index()
             return summary_df
         except Exception as e:
             logging.error(f"获取自定义汇总数据失败: {e}")
             return pd.DataFrame()
 
-    def check_existing_records(self, table_name, records_to_check):
-        if not records_to_check:
-            return [], 0
-        name_col = 'grower_name' if table_name == 'grower_records' else 'client_name'
-        new_records = []
-        duplicate_count = 0
+    def _fetch_all_rows(self, build_query, page_size=1000):
+        # PostgREST 单次最多返回 1000 行，这里按 range 翻页直到取完
+        # 没有 ORDER BY 时各页的行序不固定，翻页之间可能漏行或重复，按唯一的 id 排序保证分页稳定
+        rows = []
+        offset = 0
+        while True:
+            response = build_query().order('id').range(offset, offset + page_size - 1).execute()
+            batch = response.data or []
+            rows.extend(batch)
+            if len(batch) < page_size:
+                return rows
+            offset += page_size
+
+    def get_record_by_key(self, table_name, date, name, spec):
         try:
-            for record in records_to_check:
-                response = self.supabase.table(table_name).select("id", count='exact').eq('date', record['date']).eq(name_col, record[name_col]).eq('spec', record['spec']).execute()
-                if response.count > 0:
-                    duplicate_count += 1
-                else:
-                    new_records.append(record)
-            return new_records, duplicate_count
+            response = self._record_by_key_query(self.supabase, table_name, date, name, spec).execute()
+            return response.data[0] if response.data else None
         except Exception as e:
-            logging.error(f"检查重复记录失败: {e}")
-            return records_to_check, 0 # 出错时返回所有记录，避免数据丢失
+            logging.error(f"按日期、姓名、规格查找 {table_name} 记录失败: {e}")
+            return None
+
+    def get_records_by_keys(self, table_name, keys):
+        # 按日期和姓名集合取出候选行，再在本地比对规格；分块避免 URL 过长
+        name_col = self._name_column(table_name)
+        wanted = {(str(d), n, s) for d, n, s in keys}
+        keys = sorted(wanted)
+        records = []
+        try:
+            for i in range(0, len(keys), self.KEY_LOOKUP_CHUNK_SIZE):
+                chunk = keys[i:i + self.KEY_LOOKUP_CHUNK_SIZE]
+                rows = self._fetch_all_rows(
+                    lambda: self.supabase.table(table_name).select("*")
+                    .in_('date', sorted({k[0] for k in chunk})).in_(name_col, sorted({k[1] for k in chunk})))
+                records.extend(r for r in rows if (str(r['date']), r[name_col], r['spec']) in wanted)
+            return records
+        except Exception as e:
+            logging.error(f"按自然键批量查找 {table_name} 记录失败: {e}")
+            return None
+
+    def upsert_records(self, table_name, records, policy='skip', batch_key=None):
+        if not records:
+            return {'inserted': 0, 'updated': 0, 'skipped': 0}
+        try:
+            # 数据库函数在一条 INSERT ... ON CONFLICT 语句中完成，并返回插入、更新、跳过的条数
+            response = self.supabase.rpc('import_records', {'p_table': table_name, 'p_records': records, 'p_policy': policy,
+                                                            'p_batch_key': batch_key}).execute()
+            self._remember_written_values(table_name, records)
+            return response.data
+        except Exception as e:
+            logging.error(f"批量写入 {table_name} 失败: {e}")
+            return None
 
     def bulk_insert_records(self, table_name, records):
         if not records:
             return 0
         try:
             self.supabase.table(table_name).insert(records).execute()
+            self._remember_written_values(table_name, records)
             return len(records)
         except Exception as e:
             logging.error(f"批量插入失败: {e}")
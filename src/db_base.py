@@ -0,0 +1,300 @@
+# 文件路径: src/db_base.py
+# 版本：存储后端抽象层，Supabase 与本地 SQLite 共用同一套接口
+
+import copy
+import logging
+from .cache import DistinctValueCache, PageCache
+
+# 各业务表除 id 以外的列，顺序即界面列表中记录元组的顺序
+TABLE_COLUMNS = {
+    'grower_records': ('date', 'grower_name', 'spec', 'gross_weight', 'secondary_fruit', 'tare_weight', 'net_weight', 'unit_price', 'total_amount', 'notes'),
+    'client_records': ('date', 'client_name', 'spec', 'pieces', 'weight', 'unit_price', 'total_amount', 'notes'),
+}
+
+NAME_COLUMNS = {
+    'grower_records': 'grower_name',
+    'client_records': 'client_name',
+}
+
+# 自然键：同一天、同一人、同一规格只能有一条记录（数据库中有唯一约束）
+def natural_key_columns(table_name):
+    return ('date', NAME_COLUMNS[table_name], 'spec')
+
+
+# 导入时与已有记录冲突的处理方式：跳过 / 覆盖 / 累加重量与金额
+CONFLICT_POLICIES = ('skip', 'overwrite', 'sum')
+# 按 sum 策略合并时累加的列，其余列保留原记录的值
+SUM_COLUMNS = {
+    'grower_records': ('gross_weight', 'secondary_fruit', 'tare_weight', 'net_weight', 'total_amount'),
+    'client_records': ('pieces', 'weight', 'total_amount'),
+}
+
+# 日汇总表 daily_summary 中各记录类型累加的重量列
+WEIGHT_COLUMNS = {
+    'grower_records': 'net_weight',
+    'client_records': 'weight',
+}
+
+
+# 变更日志保留的条数，断线超过这么多变更的客户端需要整页重新加载
+CHANGE_LOG_RETENTION = 10000
+
+# 看板汇总支持的时间粒度
+SUMMARY_GRANULARITIES = ('day', 'week', 'month')
+
+
+def truncate_dates(dates, granularity):
+    # 把日期序列截断到周一/月初，与数据库端 date_trunc 的结果保持一致
+    if granularity == 'week':
+        return dates.dt.to_period('W-SUN').dt.start_time
+    if granularity == 'month':
+        return dates.dt.to_period('M').dt.start_time
+    return dates
+
+
+def encode_cursor(cursor):
+    # 游标 (date, id) 与 URL 参数之间的转换，例如 ('2025-09-18', 41) <-> '2025-09-18_41'
+    return f"{cursor[0]}_{cursor[1]}" if cursor else ""
+
+
+def decode_cursor(value):
+    if not value:
+        return None
+    try:
+        date, record_id = value.rsplit('_', 1)
+        return (date, int(record_id))
+    except ValueError:
+        return None
+
+
+def record_matches_search(table_name, record, search_params):
+    # 与数据库端的搜索条件一致：姓名模糊匹配，日期闭区间；用于判断推送来的新记录是否属于当前列表
+    name = search_params.get('name')
+    if name and name not in str(record.get(NAME_COLUMNS[table_name]) or ''):
+        return False
+    date = str(record.get('date') or '')[:10]
+    if search_params.get('start_date') and date < search_params['start_date']:
+        return False
+    if search_params.get('end_date') and date > search_params['end_date']:
+        return False
+    return True
+
+
+def _search_key(search_params):
+    # 搜索条件的规范形式：忽略空条件，与参数顺序无关
+    return tuple(sorted((k, v) for k, v in (search_params or {}).items() if v))
+
+
+class BaseDatabaseManager:
+    """所有存储后端的公共基类，界面和网页端只依赖这里列出的方法。"""
+
+    # 下拉框候选值（姓名、规格）的缓存时间，本终端的写入会即时合并进缓存
+    DISTINCT_CACHE_TTL_SECONDS = 300
+    # 分页结果缓存的条目数和有效期；来回翻页、重复打开同一页时不再查询数据库
+    PAGE_CACHE_ENTRIES = 200
+    PAGE_CACHE_TTL_SECONDS = 30
+
+    def __init__(self, page_cache=None):
+        # page_cache 可由多个管理器共用（网页端连接池），任何一个写入后其他实例的缓存同时失效
+        self._distinct_cache = DistinctValueCache(self.DISTINCT_CACHE_TTL_SECONDS)
+        self._page_cache = page_cache or PageCache(self.PAGE_CACHE_ENTRIES, self.PAGE_CACHE_TTL_SECONDS)
+
+    def _name_column(self, table_name):
+        return NAME_COLUMNS.get(table_name, 'client_name')
+
+    @staticmethod
+    def _record_to_tuple(table_name, record):
+        return (record['id'],) + tuple(record.get(col) for col in TABLE_COLUMNS[table_name])
+
+    @staticmethod
+    def _build_page_result(rows, page_size, cursor, direction, page, total):
+        # rows 比 page_size 多取一行，用来判断该方向上是否还有下一页
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if cursor and direction == 'prev':
+            rows.reverse()
+            has_prev, has_next = has_more, True
+        else:
+            has_prev, has_next = bool(cursor) or page > 1, has_more
+        return {
+            'records': rows,
+            'total': total,
+            'has_prev': has_prev and bool(rows),
+            'has_next': has_next and bool(rows),
+            'prev_cursor': (rows[0][1], rows[0][0]) if rows else None,
+            'next_cursor': (rows[-1][1], rows[-1][0]) if rows else None,
+        }
+
+    def close(self):
+        raise NotImplementedError("子类必须实现 close 方法")
+
+    def get_user(self, username):
+        raise NotImplementedError("子类必须实现 get_user 方法")
+
+    def get_all_users(self):
+        raise NotImplementedError("子类必须实现 get_all_users 方法")
+
+    def add_user(self, username, password_hash, role='user'):
+        raise NotImplementedError("子类必须实现 add_user 方法")
+
+    def delete_user(self, user_id):
+        raise NotImplementedError("子类必须实现 delete_user 方法")
+
+    def _cached_query(self, table_name, key, query, default, error_message):
+        # 先查分页缓存，未命中时执行 query()；出错时记录日志并返回 default，错误结果不缓存
+        # 返回深拷贝：调用方修改返回的记录不会影响缓存中的条目
+        key = (table_name,) + key
+        value = self._page_cache.get(key)
+        if value is not None:
+            return copy.deepcopy(value)
+        generation = self._page_cache.generation(table_name)
+        try:
+            value = query()
+        except Exception as e:
+            logging.error(f"{error_message}: {e}")
+            return default
+        self._page_cache.set(key, value, generation)
+        return copy.deepcopy(value)
+
+    def invalidate_page_cache(self, table_name=None):
+        # 收到其他终端的变更推送时调用；本进程的写入会自动失效
+        self._page_cache.invalidate(table_name)
+
+    def get_page_cache_stats(self):
+        # {'hits', 'misses', 'evictions', 'entries', 'hit_rate'}，用于调整缓存大小
+        return self._page_cache.stats()
+
+    def fetch_paged_records(self, table_name, page, page_size, search_params={}):
+        return self._cached_query(
+            table_name, ('offset', page, page_size, _search_key(search_params)),
+            lambda: self._query_paged_records(table_name, page, page_size, search_params),
+            [], f"分页获取 {table_name} 记录失败")
+
+    def fetch_records_page(self, table_name, page_size, search_params={}, cursor=None, direction='next', page=1, count_mode='exact'):
+        # 返回 {'records', 'total', 'has_prev', 'has_next', 'prev_cursor', 'next_cursor'}，一次查询同时带回总数
+        # cursor 为当前页首行(prev)或末行(next)的 (date, id)；count_mode 为 None 时不统计总数
+        return self._cached_query(
+            table_name, ('cursor', page_size, _search_key(search_params), tuple(cursor) if cursor else None, direction, page, count_mode),
+            lambda: self._query_records_page(table_name, page_size, search_params, cursor, direction, page, count_mode),
+            self._build_page_result([], page_size, None, 'next', 1, 0), f"游标分页获取 {table_name} 记录失败")
+
+    def _query_paged_records(self, table_name, page, page_size, search_params={}):
+        # 以下三个 _query_ 方法出错时直接抛出异常，由带缓存的公开方法记录日志
+        raise NotImplementedError("子类必须实现 _query_paged_records 方法")
+
+    def _query_records_page(self, table_name, page_size, search_params={}, cursor=None, direction='next', page=1, count_mode='exact'):
+        raise NotImplementedError("子类必须实现 _query_records_page 方法")
+
+    def iter_record_chunks(self, table_name, search_params={}, chunk_size=1000):
+        # 按 (date, id) 升序逐块返回全部匹配记录（字典列表），用于导出完整搜索结果
+        # 出错时直接抛出异常，避免导出的结算单悄悄缺少数据
+        raise NotImplementedError("子类必须实现 iter_record_chunks 方法")
+
+    def get_search_overview(self, table_name, search_params={}):
+        # 导出前的轻量检查：返回 {'count', 'names'(最多两个), 'min_date', 'max_date'}，失败返回 None
+        raise NotImplementedError("子类必须实现 get_search_overview 方法")
+
+    def count_records(self, table_name, search_params={}):
+        return self._cached_query(
+            table_name, ('count', _search_key(search_params)),
+            lambda: self._query_record_count(table_name, search_params),
+            0, f"统计 {table_name} 记录数失败")
+
+    def _query_record_count(self, table_name, search_params={}):
+        raise NotImplementedError("子类必须实现 _query_record_count 方法")
+
+    def get_table_version(self, table_name):
+        # 表的版本号，任何增删改后都会变化；失败返回 None，调用方应视为“未知”而不使用缓存
+        raise NotImplementedError("子类必须实现 get_table_version 方法")
+
+    def fetch_changes(self, since_seq, limit=500):
+        # 变更日志中序号大于 since_seq 的记录，按序号升序：
+        # [{'seq', 'table_name', 'op'(insert/update/delete), 'record_id', 'record'(删除时为 None)}]，失败返回 None
+        raise NotImplementedError("子类必须实现 fetch_changes 方法")
+
+    def get_latest_change_seq(self):
+        # 变更日志当前最大序号，监听方从这里开始接收；失败返回 None
+        raise NotImplementedError("子类必须实现 get_latest_change_seq 方法")
+
+    def prune_change_log(self, keep=CHANGE_LOG_RETENTION):
+        # 只保留最近 keep 条变更，返回删除的条数
+        raise NotImplementedError("子类必须实现 prune_change_log 方法")
+
+    def get_record(self, table_name, record_id):
+        raise NotImplementedError("子类必须实现 get_record 方法")
+
+    def record_exists(self, table_name, record_id):
+        # 与其他方法不同，网络或数据库错误时直接抛出异常，便于同步队列区分“不存在”和“暂时失败”
+        raise NotImplementedError("子类必须实现 record_exists 方法")
+
+    def get_last_change(self, table_name, record_id):
+        # 变更日志中该记录最近一次变更 {'seq', 'changed_at'(Unix 时间戳)}，没有返回 None；
+        # 与 record_exists 一样出错时直接抛出异常，供同步队列按时间戳判断冲突
+        raise NotImplementedError("子类必须实现 get_last_change 方法")
+
+    def add_record(self, table_name, data):
+        raise NotImplementedError("子类必须实现 add_record 方法")
+
+    def update_record(self, table_name, record_id, data):
+        raise NotImplementedError("子类必须实现 update_record 方法")
+
+    def delete_record(self, table_name, record_id):
+        raise NotImplementedError("子类必须实现 delete_record 方法")
+
+    def fetch_distinct_values(self, table_name, column_name):
+        key = (table_name, column_name)
+        values = self._distinct_cache.get(key)
+        if values is not None:
+            return values
+        try:
+            values = self._query_distinct_values(table_name, column_name)
+        except Exception as e:
+            logging.error(f"获取 {table_name} 的 {column_name} 列唯一值失败: {e}")
+            return []
+        self._distinct_cache.set(key, values)
+        return sorted(set(values))
+
+    def _remember_written_values(self, table_name, records):
+        # 新增或修改记录后，使该表的分页缓存失效，并把其中的姓名、规格合并进已缓存的候选值
+        self._page_cache.invalidate(table_name)
+        for record in records:
+            for column_name in (self._name_column(table_name), 'spec'):
+                if record.get(column_name):
+                    self._distinct_cache.add((table_name, column_name), record[column_name])
+
+    def _query_distinct_values(self, table_name, column_name):
+        # 查询数据库中某列的全部非空唯一值；出错时直接抛出异常，由 fetch_distinct_values 记录日志
+        raise NotImplementedError("子类必须实现 _query_distinct_values 方法")
+
+    def get_records_by_ids(self, table_name, ids):
+        raise NotImplementedError("子类必须实现 get_records_by_ids 方法")
+
+    def get_custom_summary(self, record_type, start_date, end_date, name=None, granularity='day'):
+        # 返回列 date, total_revenue, total_weight；granularity 取 SUMMARY_GRANULARITIES 之一
+        raise NotImplementedError("子类必须实现 get_custom_summary 方法")
+
+    def get_summary_totals(self, record_type, start_date=None, end_date=None, name=None):
+        # 从日汇总表读取区间合计，返回 {'total_weight', 'total_amount', 'record_count'}
+        raise NotImplementedError("子类必须实现 get_summary_totals 方法")
+
+    def rebuild_daily_summary(self):
+        # 按原始记录全量重建日汇总表，返回重建后的汇总行数，失败返回 None
+        raise NotImplementedError("子类必须实现 rebuild_daily_summary 方法")
+
+    def get_record_by_key(self, table_name, date, name, spec):
+        # 按自然键 (日期, 姓名, 规格) 查找记录，用于新增失败时说明与哪条记录冲突；没有或出错时返回 None
+        raise NotImplementedError("子类必须实现 get_record_by_key 方法")
+
+    def get_records_by_keys(self, table_name, keys):
+        # 一次查出多个自然键 [(日期, 姓名, 规格), ...] 对应的已有记录，返回记录字典列表；出错返回 None
+        raise NotImplementedError("子类必须实现 get_records_by_keys 方法")
+
+    def upsert_records(self, table_name, records, policy='skip', batch_key=None):
+        # 按自然键批量写入，与已有记录冲突时按 policy（CONFLICT_POLICIES 之一）处理，整批在一个事务中完成；
+        # 返回 {'inserted', 'updated', 'skipped'}，失败返回 None。同一批中不应有重复的自然键
+        # batch_key 不为空时与写入在同一事务中登记；该批已写入过则什么都不做，返回的三项均为 0。
+        # 响应丢失后重试 sum 这样不幂等的写入时，靠它避免重复累加
+        raise NotImplementedError("子类必须实现 upsert_records 方法")
+
+    def bulk_insert_records(self, table_name, records):
+        raise NotImplementedError("子类必须实现 bulk_insert_records 方法")
@@ -0,0 +1,67 @@
+# 文件路径: src/db_pool.py
+# 版本：线程安全的数据库管理器连接池，供网页端多线程处理请求时使用
+
+import queue
+import logging
+import threading
+import contextlib
+
+
+class DatabaseManagerPool:
+    """最多创建 size 个 DatabaseManager，按需创建、用完归还；池满时等待其他请求归还。"""
+
+    def __init__(self, factory, size=4, acquire_timeout=30):
+        self._factory = factory
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        # 启动时先建一个，连接配置有误时尽早报错
+        self.release(self._create())
+
+    def _create(self):
+        with self._lock:
+            if self._created >= self.size:
+                return None
+            self._created += 1
+        try:
+            return self._factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def acquire(self, timeout=None):
+        # 超时仍没有空闲实例时抛出 queue.Empty
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        manager = self._create()
+        if manager is not None:
+            return manager
+        return self._idle.get(timeout=timeout or self.acquire_timeout)
+
+    def release(self, manager):
+        if manager is not None:
+            self._idle.put(manager)
+
+    @contextlib.contextmanager
+    def connection(self):
+        manager = self.acquire()
+        try:
+            yield manager
+        finally:
+            self.release(manager)
+
+    def close(self):
+        while True:
+            try:
+                manager = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                manager.close()
+            except Exception as e:
+                logging.error(f"关闭数据库连接失败: {e}")
@@ -4,12 +4,120 @@
 import os
 import datetime
 import logging
+import re
+import functools
+from copy import copy
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
 from tkinter import messagebox
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.worksheet import Worksheet
+from .settlement import SETTLEMENT_TYPE_COLUMNS, NUMERIC_COLUMNS, CURRENCY_COLUMNS, prepare_settlement_frame, to_chinese_currency
+from .utils import open_path
+
+CJK_PATTERN = re.compile('[\u4e00-\u9fff]')
+# 流式导出无法事先扫描全部内容，列宽按列名给定
+STREAM_COLUMN_WIDTHS = {'日期': 12, '规格': 14, '单价': 10, '金额': 15, '备注': 20}
+
+
+def create_settlement_named_styles():
+    # 结算单用到的全部样式，每个工作簿注册一次，单元格只引用样式名
+    border_thin_side = Side(border_style="thin", color="BFBFBF")
+    border_thin_box = Border(left=border_thin_side, right=border_thin_side, top=border_thin_side, bottom=border_thin_side)
+    fill_row_alt = PatternFill(start_color="DDEBF7", end_color="DDEBF7", fill_type="solid")
+    align_center = Alignment(horizontal='center', vertical='center')
+    align_left = Alignment(horizontal='left', vertical='center')
+    align_right = Alignment(horizontal='right', vertical='center')
+    specs = {
+        'st_company': dict(font=Font(name='黑体', size=20, bold=True, color="002060"), alignment=align_center),
+        'st_title': dict(font=Font(name='宋体', size=16, bold=True), alignment=align_center),
+        'st_info': dict(font=Font(name='宋体', size=11), alignment=align_left),
+        'st_info_right': dict(font=Font(name='宋体', size=11), alignment=align_right),
+        'st_header': dict(font=Font(name='宋体', size=11, bold=True, color="FFFFFF"), alignment=align_center, border=border_thin_box,
+                          fill=PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")),
+        'st_total_label': dict(font=Font(name='宋体', size=11, bold=True), alignment=align_right),
+        'st_total_value': dict(font=Font(name='宋体', size=11, bold=True, color="FF0000"), alignment=align_right, number_format='¥#,##0.00'),
+        'st_footer': dict(font=Font(name='宋体', size=9, italic=True, color="808080")),
+        'st_footer_right': dict(font=Font(name='宋体', size=9, italic=True, color="808080"), alignment=align_right),
+    }
+    body_font = Font(name='宋体', size=10)
+    for kind, alignment, number_format in (('text', align_left, 'General'), ('number', align_right, '#,##0.00'), ('currency', align_right, '¥#,##0.00')):
+        specs[f'st_body_{kind}'] = dict(font=body_font, alignment=alignment, border=border_thin_box, number_format=number_format)
+        specs[f'st_body_{kind}_alt'] = dict(font=body_font, alignment=alignment, border=border_thin_box, number_format=number_format, fill=fill_row_alt)
+    return [NamedStyle(name=name, **attrs) for name, attrs in specs.items()]
+
+
+@functools.lru_cache(maxsize=None)
+def settlement_template(record_type):
+    # 表头与表尾的布局只与记录类型有关，按类型缓存；每项为 (行, 列, 取值键, 样式名, 合并到的列, 行高)
+    display_columns = SETTLEMENT_TYPE_COLUMNS[record_type][1]
+    num_cols = len(display_columns)
+    amount_col = display_columns.index('金额') + 1
+    header = (
+        (1, 1, 'company_name', 'st_company', num_cols, 30),
+        (2, 1, 'title', 'st_title', num_cols, 25),
+        (4, 1, 'entity', 'st_info', None, None),
+        (4, num_cols - 2, 'period', 'st_info_right', num_cols, None),
+    )
+    # 表尾行号相对于合计行
+    footer = (
+        (0, 1, 'total_label', 'st_total_label', amount_col - 1, None),
+        (0, amount_col, 'total_amount', 'st_total_value', None, None),
+        (1, 1, 'amount_in_words', 'st_info', num_cols, None),
+        (3, 1, 'footer_text', 'st_footer', num_cols, None),
+        (4, 1, 'contact', 'st_footer_right', num_cols, None),
+    )
+    return {'header_row': 6, 'header': header, 'footer': footer}
+
+
+def settlement_column_widths(df_display):
+    # 列宽 = 最长内容的显示宽度 + 2，中文字符按 2 个宽度计；整列一次性计算，不逐个单元格扫描
+    fixed_widths = {'日期': 12, '单价': 10, '金额': 15}
+    widths = {}
+    for col_name in df_display.columns:
+        if col_name in fixed_widths:
+            widths[col_name] = fixed_widths[col_name]
+            continue
+        texts = df_display[col_name].dropna().astype(str)
+        header_len = len(col_name) + len(CJK_PATTERN.findall(col_name))
+        content_len = int((texts.str.len() + texts.str.count(CJK_PATTERN.pattern)).max()) if len(texts) else 0
+        width = max(header_len, content_len) + 2
+        widths[col_name] = min(width, 20) if col_name == '备注' else width
+    return widths
+
+
+def body_style_name(col_name, alt_row):
+    kind = 'currency' if col_name in CURRENCY_COLUMNS else ('number' if col_name in NUMERIC_COLUMNS else 'text')
+    return f"st_body_{kind}_alt" if alt_row else f"st_body_{kind}"
+
+
+def safe_file_name(name):
+    return "".join(c for c in str(name) if c.isalnum() or c in (' ', '_')).rstrip()
+
+
+def unique_file_stem(name, used_names):
+    # 不同姓名去掉特殊字符后可能相同（或为空），加 _2、_3 等后缀避免并行生成时互相覆盖；
+    # Windows 文件名不区分大小写，按小写判断是否重复
+    stem = safe_file_name(name) or "未命名"
+    candidate, suffix = stem, 1
+    while candidate.lower() in used_names:
+        suffix += 1
+        candidate = f"{stem}_{suffix}"
+    used_names.add(candidate.lower())
+    return candidate
+
+
+def render_settlement_file(config_values, records, title, entity_name, record_type, date_range, file_path):
+    # 批量结算在子进程中执行的任务，必须定义在模块级以便被 pickle；config_values 是普通字典
+    df = pd.DataFrame(records)
+    wb, _ = ExcelExporter(config_values).create_settlement_workbook(df, title, entity_name, record_type, date_range)
+    wb.save(file_path)
+    amounts = pd.to_numeric(df['total_amount'], errors='coerce').fillna(0) if 'total_amount' in df.columns else pd.Series(dtype=float)
+    return entity_name, file_path, len(df), float(amounts.sum())
+
 
 class ExcelExporter:
     def __init__(self, config_manager):
@@ -26,164 +134,70 @@ class ExcelExporter:
         return output_dir
 
     def _to_chinese_currency(self, num):
-        cn_num = ['零', '壹', '贰', '叁', '肆', '伍', '陆', '柒', '捌', '玖']
-        cn_unit = ['', '拾', '佰', '仟', '万', '拾万', '佰万', '仟万', '亿', '拾亿', '佰亿', '仟亿', '兆']
-        cn_decimal = ['角', '分']
-        num_str = f"{num:.2f}"
-        integer_part, decimal_part = num_str.split('.')
-        integer_result = ""
-        if integer_part == '0': integer_result = '零'
-        else:
-            integer_len = len(integer_part)
-            for i in range(integer_len):
-                digit = int(integer_part[i])
-                unit = cn_unit[integer_len - 1 - i]
-                if digit == 0:
-                    if integer_result and integer_result[-1] != '零': integer_result += '零'
-                else: integer_result += cn_num[digit] + unit
-            if integer_result.endswith('零'): integer_result = integer_result[:-1]
-        decimal_result = ""
-        if decimal_part == '00': decimal_result = '整'
-        else:
-            if decimal_part[0] != '0': decimal_result += cn_num[int(decimal_part[0])] + cn_decimal[0]
-            if decimal_part[1] != '0': decimal_result += cn_num[int(decimal_part[1])] + cn_decimal[1]
-        if integer_part == '0': return f"零元{decimal_result}"
-        return f"{integer_result}元{decimal_result}"
+        return to_chinese_currency(num)
+
+    def _template_values(self, title, entity_name, date_range, total_amount):
+        date_range_str = f"{date_range[0]} 至 {date_range[1]}" if date_range and date_range[0] != date_range[1] else (date_range[0] if date_range else "")
+        return {
+            'company_name': self.config_manager.get("company_name", "公司名称"),
+            'title': title,
+            'entity': f"结算对象: {entity_name}",
+            'period': f"结算周期: {date_range_str}",
+            'total_label': "总计 (TOTAL)",
+            'total_amount': total_amount,
+            'amount_in_words': f"金额大写: {self._to_chinese_currency(total_amount)}",
+            'footer_text': self.config_manager.get("footer_text", ""),
+            'contact': f"联系电话: {self.config_manager.get('phone_number', '')} | 生成时间: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+        }
+
+    def _fill_template_block(self, ws, block, values, row_offset=0):
+        for row, col, key, style_name, merge_to, height in block:
+            row += row_offset
+            if merge_to:
+                ws.merge_cells(start_row=row, start_column=col, end_row=row, end_column=merge_to)
+            cell = ws.cell(row, col, values[key])
+            cell.style = style_name
+            if height:
+                ws.row_dimensions[row].height = height
 
     def create_settlement_workbook(self, df, title, entity_name, record_type, date_range=None):
-        company_name = self.config_manager.get("company_name", "公司名称")
-        phone_number = self.config_manager.get("phone_number", "")
-        footer_text = self.config_manager.get("footer_text", "")
-        
-        df_processed = df.copy()
-        df_processed.rename(columns={'grower_name': '姓名', 'client_name': '姓名', 'date': '日期', 'spec': '规格', 'unit_price': '单价', 'total_amount': '金额', 'notes': '备注'}, inplace=True)
-        
-        if record_type == 'grower':
-            df_processed.rename(columns={'net_weight': '净重(斤)', 'gross_weight':'毛重(斤)', 'secondary_fruit':'次果(斤)', 'tare_weight':'皮重(斤)'}, inplace=True)
-            display_columns = ['日期', '规格', '毛重(斤)', '次果(斤)', '皮重(斤)', '净重(斤)', '单价', '金额', '备注']
-        else: # client
-            df_processed.rename(columns={'pieces': '件数', 'weight': '重量(斤)'}, inplace=True)
-            display_columns = ['日期', '规格', '件数', '重量(斤)', '单价', '金额', '备注']
-
-        for col in ['净重(斤)', '毛重(斤)', '次果(斤)', '皮重(斤)', '件数', '重量(斤)', '单价', '金额']:
-            if col in df_processed.columns:
-                df_processed[col] = pd.to_numeric(df_processed[col], errors='coerce').fillna(0)
-        
-        df_display = df_processed[display_columns]
+        template = settlement_template(record_type)
+        df_display, display_columns = prepare_settlement_frame(df, record_type)
         total_amount = df_display['金额'].sum()
 
-        font_company = Font(name='黑体', size=20, bold=True, color="002060")
-        font_title = Font(name='宋体', size=16, bold=True)
-        font_info = Font(name='宋体', size=11)
-        font_header = Font(name='宋体', size=11, bold=True, color="FFFFFF")
-        font_body = Font(name='宋体', size=10)
-        font_total_label = Font(name='宋体', size=11, bold=True)
-        font_total_value = Font(name='宋体', size=11, bold=True, color="FF0000")
-        font_footer = Font(name='宋体', size=9, italic=True, color="808080")
-        align_center = Alignment(horizontal='center', vertical='center')
-        align_left = Alignment(horizontal='left', vertical='center')
-        align_right = Alignment(horizontal='right', vertical='center')
-        fill_header = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        fill_row_alt = PatternFill(start_color="DDEBF7", end_color="DDEBF7", fill_type="solid")
-        border_thin_side = Side(border_style="thin", color="BFBFBF")
-        border_thin_box = Border(left=border_thin_side, right=border_thin_side, top=border_thin_side, bottom=border_thin_side)
-        currency_format = '¥#,##0.00'
-        number_format = '#,##0.00'
-        
         wb = Workbook()
+        for style in create_settlement_named_styles():
+            wb.add_named_style(style)
         ws: Worksheet = wb.active
         ws.title = "结算明细"
-        
-        num_cols = len(display_columns)
-        ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=num_cols)
-        cell = ws.cell(1, 1, company_name)
-        cell.font = font_company
-        cell.alignment = align_center
-        ws.row_dimensions[1].height = 30
-        
-        ws.merge_cells(start_row=2, start_column=1, end_row=2, end_column=num_cols)
-        cell = ws.cell(2, 1, title)
-        cell.font = font_title
-        cell.alignment = align_center
-        ws.row_dimensions[2].height = 25
-        
-        date_range_str = f"{date_range[0]} 至 {date_range[1]}" if date_range and date_range[0] != date_range[1] else (date_range[0] if date_range else "")
-        ws.cell(4, 1, f"结算对象: {entity_name}").font = font_info
-        ws.merge_cells(start_row=4, start_column=num_cols - 2, end_row=4, end_column=num_cols)
-        cell = ws.cell(4, num_cols - 2, f"结算周期: {date_range_str}")
-        cell.font = font_info
-        cell.alignment = align_right
-        
-        header_row = 6
+
+        values = self._template_values(title, entity_name, date_range, total_amount)
+        self._fill_template_block(ws, template['header'], values)
+        header_row = template['header_row']
         for c_idx, col_name in enumerate(display_columns, 1):
-            cell = ws.cell(header_row, c_idx, col_name)
-            cell.font = font_header
-            cell.fill = fill_header
-            cell.alignment = align_center
-            cell.border = border_thin_box
+            ws.cell(header_row, c_idx, col_name).style = 'st_header'
         ws.row_dimensions[header_row].height = 20
-        
-        current_row = header_row + 1
+
+        # 只有前两行正文按样式名设置，其余行直接复用这两行的样式，避免每个单元格重复查找样式
+        row_styles = {}
         for r_idx, row_data in enumerate(df_display.itertuples(index=False), 1):
+            current_row = header_row + r_idx
+            alt_row = r_idx % 2 == 0
+            shared = row_styles.get(alt_row)
+            if shared is None:
+                cells = [ws.cell(current_row, c_idx, value) for c_idx, value in enumerate(row_data, 1)]
+                for cell, col_name in zip(cells, display_columns):
+                    cell.style = body_style_name(col_name, alt_row)
+                row_styles[alt_row] = [cell._style for cell in cells]
+                continue
             for c_idx, value in enumerate(row_data, 1):
-                cell = ws.cell(current_row, c_idx, value)
-                cell.font = font_body
-                cell.border = border_thin_box
-                col_name = display_columns[c_idx-1]
-                if col_name in ['净重(斤)', '毛重(斤)', '次果(斤)', '皮重(斤)', '件数', '重量(斤)', '单价', '金额']:
-                    cell.alignment = align_right
-                    if col_name in ['单价', '金额']: cell.number_format = currency_format
-                    else: cell.number_format = number_format
-                else:
-                    cell.alignment = align_left
-                if r_idx % 2 == 0: cell.fill = fill_row_alt
-            current_row += 1
-            
-        total_row_idx = current_row + 1
-        total_amount_col_idx = display_columns.index('金额') + 1
-        ws.merge_cells(start_row=total_row_idx, start_column=1, end_row=total_row_idx, end_column=total_amount_col_idx - 1)
-        cell = ws.cell(total_row_idx, 1, "总计 (TOTAL)")
-        cell.font = font_total_label
-        cell.alignment = align_right
-        
-        cell = ws.cell(total_row_idx, total_amount_col_idx, total_amount)
-        cell.font = font_total_value
-        cell.alignment = align_right
-        cell.number_format = currency_format
-        
-        cn_total_amount = self._to_chinese_currency(total_amount)
-        amount_in_words_row = total_row_idx + 1
-        ws.merge_cells(start_row=amount_in_words_row, start_column=1, end_row=amount_in_words_row, end_column=num_cols)
-        cell = ws.cell(amount_in_words_row, 1, f"金额大写: {cn_total_amount}")
-        cell.font = font_info
-        cell.alignment = align_left
-        
-        footer_row_start = amount_in_words_row + 2
-        ws.merge_cells(start_row=footer_row_start, start_column=1, end_row=footer_row_start, end_column=num_cols)
-        ws.cell(footer_row_start, 1, footer_text).font = font_footer
-        ws.merge_cells(start_row=footer_row_start + 1, start_column=1, end_row=footer_row_start + 1, end_column=num_cols)
-        cell = ws.cell(footer_row_start + 1, 1, f"联系电话: {phone_number} | 生成时间: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        cell.font = font_footer
-        cell.alignment = align_right
-        
-        fixed_widths = {'日期': 12, '单价': 10, '金额': 15}
-        
-        for idx, col_name in enumerate(display_columns, 1):
-            column_letter = get_column_letter(idx)
-            if col_name in fixed_widths:
-                ws.column_dimensions[column_letter].width = fixed_widths[col_name]
-            else:
-                max_length = sum(2 if '\u4e00' <= char <= '\u9fff' else 1 for char in str(col_name))
-                for cell in ws[column_letter]:
-                    if cell.value is not None:
-                        try:
-                            cell_len = sum(2 if '\u4e00' <= char <= '\u9fff' else 1 for char in str(cell.value))
-                            if cell_len > max_length: max_length = cell_len
-                        except: pass
-                adjusted_width = max_length + 2
-                if col_name == '备注': adjusted_width = min(adjusted_width, 20)
-                ws.column_dimensions[column_letter].width = adjusted_width
-                
+                ws.cell(current_row, c_idx, value)._style = copy(shared[c_idx - 1])
+
+        self._fill_template_block(ws, template['footer'], values, row_offset=header_row + len(df_display) + 2)
+
+        for col_name, width in settlement_column_widths(df_display).items():
+            ws.column_dimensions[get_column_letter(display_columns.index(col_name) + 1)].width = width
+
         # --- 核心修改点：添加打印设置 ---
         ws.page_setup.orientation = ws.ORIENTATION_PORTRAIT
         ws.page_setup.paperSize = ws.PAPERSIZE_A4
@@ -197,19 +211,186 @@ class ExcelExporter:
         
         return wb, entity_name
 
-    def save_and_notify(self, wb, entity_name, title):
+    def _append_template_block(self, ws, block, values, next_row, row_offset=0):
+        # write_only 工作表只能逐行追加：中间的空行补齐后按模板写入，返回下一行的行号
+        rows = {}
+        for row, col, key, style_name, merge_to, _ in block:
+            rows.setdefault(row + row_offset, []).append((col, key, style_name, merge_to))
+        for row in range(next_row, max(rows) + 1):
+            entries = rows.get(row, [])
+            cells = [None] * max((col for col, _, _, _ in entries), default=0)
+            for col, key, style_name, merge_to in entries:
+                cell = WriteOnlyCell(ws, values[key])
+                cell.style = style_name
+                cells[col - 1] = cell
+                if merge_to:
+                    ws.merged_cells.add(f"{get_column_letter(col)}{row}:{get_column_letter(merge_to)}{row}")
+            ws.append(cells)
+        return max(rows) + 1
+
+    def write_settlement_stream(self, chunks, file_path, title, entity_name, record_type, date_range=None):
+        # 流式写出结算单：chunks 逐块提供记录字典列表，工作簿使用 write_only 模式，
+        # 已写出的行不再驻留内存，十万行级别的导出内存占用也保持稳定。返回 (行数, 总金额)
+        template = settlement_template(record_type)
+        display_columns = SETTLEMENT_TYPE_COLUMNS[record_type][1]
+        header_row = template['header_row']
+
+        wb = Workbook(write_only=True)
+        for style in create_settlement_named_styles():
+            wb.add_named_style(style)
+        ws = wb.create_sheet("结算明细")
+
+        # write_only 模式下列宽和打印设置必须在写入第一行之前完成
+        for idx, col_name in enumerate(display_columns, 1):
+            ws.column_dimensions[get_column_letter(idx)].width = STREAM_COLUMN_WIDTHS.get(col_name, 11)
+        ws.page_setup.orientation = Worksheet.ORIENTATION_PORTRAIT
+        ws.page_setup.paperSize = Worksheet.PAPERSIZE_A4
+        ws.page_setup.fitToWidth = 1
+        ws.page_setup.fitToHeight = 0
+        ws.sheet_properties.pageSetUpPr.fitToPage = True
+        ws.print_title_rows = f'{header_row}:{header_row}'
+        ws.page_margins.left = 0.75; ws.page_margins.right = 0.75; ws.page_margins.top = 0.75; ws.page_margins.bottom = 0.75
+        ws.print_options.horizontalCentered = True
+
+        next_row = self._append_template_block(ws, template['header'], self._template_values(title, entity_name, date_range, 0), 1)
+        for _ in range(next_row, header_row):
+            ws.append([])
+        header_cells = []
+        for col_name in display_columns:
+            cell = WriteOnlyCell(ws, col_name)
+            cell.style = 'st_header'
+            header_cells.append(cell)
+        ws.append(header_cells)
+
+        # 每列正文的样式按样式名解析一次，之后每个单元格只复制解析结果
+        row_styles = {}
+        for alt_row in (False, True):
+            row_styles[alt_row] = []
+            for col_name in display_columns:
+                prototype = WriteOnlyCell(ws)
+                prototype.style = body_style_name(col_name, alt_row)
+                row_styles[alt_row].append(prototype._style)
+
+        row_count = 0
+        total_amount = 0.0
+        for chunk in chunks:
+            if not chunk:
+                continue
+            df_display, _ = prepare_settlement_frame(pd.DataFrame(chunk), record_type)
+            total_amount += float(df_display['金额'].sum())
+            for row_data in df_display.itertuples(index=False):
+                row_count += 1
+                cells = []
+                for style, value in zip(row_styles[row_count % 2 == 0], row_data):
+                    cell = WriteOnlyCell(ws, None if pd.isna(value) else value)
+                    cell._style = copy(style)
+                    cells.append(cell)
+                ws.append(cells)
+
+        values = self._template_values(title, entity_name, date_range, total_amount)
+        self._append_template_block(ws, template['footer'], values, header_row + row_count + 1, row_offset=header_row + row_count + 2)
+
+        wb.save(file_path)
+        return row_count, total_amount
+
+    def build_output_path(self, entity_name, title, extension=".xlsx"):
         output_dir = self.get_output_dir()
-        if not output_dir: return
+        if not output_dir: return None
+        timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        return os.path.join(output_dir, f"{safe_file_name(entity_name)}_{title}_{timestamp}{extension}")
 
+    def export_batch_settlements(self, df, title, record_type, name_key, date_range, progress=None, max_workers=None):
+        # 按姓名分组，每人一份结算单，在进程池中并行生成，最后写一份汇总索引表。
+        # 返回 (输出目录, 成功列表[(姓名, 文件路径, 记录数, 金额)], 失败姓名列表)
+        output_dir = self.get_output_dir()
+        if not output_dir: return None, [], []
         timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
-        safe_entity_name = "".join(c for c in entity_name if c.isalnum() or c in (' ', '_')).rstrip()
-        file_name = f"{safe_entity_name}_{title}_{timestamp}.xlsx"
-        file_path = os.path.join(output_dir, file_name)
-        
+        batch_dir = os.path.join(output_dir, f"批量{title}_{date_range[0]}至{date_range[1]}_{timestamp}")
+        os.makedirs(batch_dir, exist_ok=True)
+
+        config_values = {key: self.config_manager.get(key, default) for key, default in
+                         (("company_name", "公司名称"), ("phone_number", ""), ("footer_text", ""))}
+        groups = [(name, group) for name, group in df.groupby(name_key, sort=True)]
+        total = len(groups)
+        results, failures = [], []
+        if progress: progress(0, total, "")
+        workers = max_workers or min(os.cpu_count() or 1, total) or 1
+        executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            futures = {}
+            used_names = set()
+            for name, group in groups:
+                file_path = os.path.join(batch_dir, f"{unique_file_stem(name, used_names)}_{title}.xlsx")
+                future = executor.submit(render_settlement_file, config_values, group.to_dict('records'),
+                                         title, name, record_type, date_range, file_path)
+                futures[future] = name
+            for done, future in enumerate(as_completed(futures), 1):
+                name = futures[future]
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    logging.error(f"生成 {name} 的结算单失败: {e}")
+                    failures.append(name)
+                # 用户取消时 progress 抛出 TaskCancelled，由下面的 except 丢弃尚未开始的结算单
+                if progress: progress(done, total, name)
+        except BaseException:
+            # 取消或出错：排队中的任务不再执行，只等正在生成的几份结束，不等整批跑完
+            executor.shutdown(wait=False, cancel_futures=True)
+            logging.info(f"批量结算已中止，已生成 {len(results)} / {total} 份，保存在 {batch_dir}")
+            raise
+        executor.shutdown()
+
+        results.sort(key=lambda item: item[0])
+        self._write_batch_index(batch_dir, title, date_range, results, failures)
+        return batch_dir, results, failures
+
+    def _write_batch_index(self, batch_dir, title, date_range, results, failures):
+        wb = Workbook()
+        ws: Worksheet = wb.active
+        ws.title = "结算汇总"
+        ws.append([f"{title}汇总  结算周期: {date_range[0]} 至 {date_range[1]}"])
+        ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=4)
+        ws.cell(1, 1).font = Font(name='宋体', size=14, bold=True)
+        ws.append(["姓名", "记录数", "金额", "文件"])
+        for cell in ws[2]:
+            cell.font = Font(name='宋体', size=11, bold=True)
+        for entity_name, file_path, row_count, total_amount in results:
+            ws.append([entity_name, row_count, total_amount, os.path.basename(file_path)])
+            link_cell = ws.cell(ws.max_row, 4)
+            link_cell.hyperlink = os.path.basename(file_path)
+            link_cell.style = "Hyperlink"
+            ws.cell(ws.max_row, 3).number_format = '¥#,##0.00'
+        total_row = ws.max_row + 1
+        ws.cell(total_row, 1, "合计").font = Font(name='宋体', size=11, bold=True)
+        ws.cell(total_row, 2, sum(item[2] for item in results))
+        cell = ws.cell(total_row, 3, sum(item[3] for item in results))
+        cell.number_format = '¥#,##0.00'
+        if failures:
+            ws.cell(total_row + 2, 1, f"生成失败: {'、'.join(str(name) for name in failures)}").font = Font(color="FF0000")
+        for column_letter, width in (('A', 16), ('B', 10), ('C', 15), ('D', 40)):
+            ws.column_dimensions[column_letter].width = width
+        wb.save(os.path.join(batch_dir, f"{title}汇总.xlsx"))
+
+    def notify_saved(self, file_path, title):
+        messagebox.showinfo("导出成功", f"{title}已成功导出到:\n{file_path}")
+        open_path(os.path.dirname(file_path))
+
+    def notify_batch_saved(self, batch_dir, results, failures):
+        message = f"已生成 {len(results)} 份结算单，保存在:\n{batch_dir}"
+        if failures:
+            message += f"\n\n以下 {len(failures)} 人生成失败，详情请查看logs/app.log文件:\n{'、'.join(str(name) for name in failures)}"
+            messagebox.showwarning("批量结算完成", message)
+        else:
+            messagebox.showinfo("批量结算完成", message)
+        open_path(batch_dir)
+
+    def save_and_notify(self, wb, entity_name, title):
+        file_path = self.build_output_path(entity_name, title)
+        if not file_path: return
+
         try:
             wb.save(file_path)
-            messagebox.showinfo("导出成功", f"{title}已成功导出到:\n{file_path}")
-            os.startfile(output_dir)
+            self.notify_saved(file_path, title)
         except PermissionError:
             messagebox.showerror("导出失败", f"文件权限不足或文件被占用，无法写入：\n{file_path}\n请关闭可能正在使用此文件的Excel程序。")
         except Exception as e:
@@ -1,90 +1,259 @@
 # 文件路径: src/excel_importer.py
-# 版本：已升级，返回新记录、重复数和总行数
+# 版本：导入支持 Excel / CSV / Parquet，各格式共用同一套列映射和校验，分块向量化解析
+#
+# 每种格式只需实现 _iter_frames：逐块产出 (来源名称, DataFrame)，DataFrame 的列为文件中的中文列名，
+# 索引为该行在文件中的行号；列映射、数值校验、净重与金额计算都在 RecordImporter 中完成。
 
+import os
+import operator
+import openpyxl
 import pandas as pd
-from tkinter import messagebox
 
-class ExcelImporter:
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+# 流式读取时每次交给向量化解析的行数
+IMPORT_CHUNK_ROWS = 5000
+
+# 文件中的中文列名 -> 数据库字段，导入与导出 CSV / Parquet 共用
+IMPORT_RENAME_MAPS = {
+    'grower': {
+        '日期': 'date',
+        '姓名': 'grower_name',
+        '规格': 'spec',
+        '毛重(斤)': 'gross_weight',
+        '次果(斤)': 'secondary_fruit',
+        '皮重(斤)': 'tare_weight',
+        '单价': 'unit_price',
+        '备注': 'notes'
+    },
+    'client': {
+        '日期': 'date',
+        '姓名': 'client_name',
+        '规格': 'spec',
+        '件数': 'pieces',
+        '重量(斤)': 'weight',
+        '单价': 'unit_price',
+        '备注': 'notes'
+    },
+}
+
+
+def parquet_available():
+    return pq is not None
+
+
+def create_importer(file_path, record_type, db_manager):
+    # 按扩展名选择导入器
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == '.csv':
+        return CsvImporter(file_path, record_type, db_manager)
+    if extension == '.parquet':
+        return ParquetImporter(file_path, record_type, db_manager)
+    return ExcelImporter(file_path, record_type, db_manager)
+
+
+def import_file_types():
+    # 文件选择对话框的类型列表，未安装 pyarrow 时不提供 Parquet
+    types = [("Excel 文件", "*.xlsx"), ("CSV 文件", "*.csv")]
+    if parquet_available():
+        types.append(("Parquet 文件", "*.parquet"))
+    return [("所有支持的文件", " ".join(pattern for _, pattern in types))] + types
+
+
+class RecordImporter:
+    # 需要转换为数字的列
+    NUMERIC_COLUMNS = {
+        'grower': ['gross_weight', 'secondary_fruit', 'tare_weight', 'unit_price'],
+        'client': ['pieces', 'weight', 'unit_price'],
+    }
+
     def __init__(self, file_path, record_type, db_manager): # 添加 db_manager
         self.file_path = file_path
         self.record_type = record_type
         self.db_manager = db_manager # 保存 db_manager 实例
-        self.expected_columns = []
-        self.rename_map = {}
-
-    def _prepare_columns(self):
-        if self.record_type == "grower":
-            self.expected_columns = ['日期', '姓名', '规格', '毛重(斤)', '次果(斤)', '皮重(斤)', '单价', '备注']
-            self.rename_map = {
-                '日期': 'date',
-                '姓名': 'grower_name',
-                '规格': 'spec',
-                '毛重(斤)': 'gross_weight',
-                '次果(斤)': 'secondary_fruit',
-                '皮重(斤)': 'tare_weight',
-                '单价': 'unit_price',
-                '备注': 'notes'
-            }
-        elif self.record_type == "client":
-            self.expected_columns = ['日期', '姓名', '规格', '件数', '重量(斤)', '单价', '备注']
-            self.rename_map = {
-                '日期': 'date',
-                '姓名': 'client_name',
-                '规格': 'spec',
-                '件数': 'pieces',
-                '重量(斤)': 'weight',
-                '单价': 'unit_price',
-                '备注': 'notes'
-            }
-
-    def parse_excel(self):
-        self._prepare_columns()
+        self.rename_map = IMPORT_RENAME_MAPS[record_type]
+        self.expected_columns = list(self.rename_map)
+        self.error = None
+        self.invalid_rows = []
+        self.skipped_sources = []
+
+    def _iter_frames(self, progress=None):
+        raise NotImplementedError("子类必须实现 _iter_frames 方法")
+
+    def parse(self, progress=None):
+        # 在后台线程中调用，不弹出对话框：返回 (有效记录列表, 总行数)，失败时返回 (None, 0) 并把原因写入 self.error，
+        # 被跳过的行和工作表汇总在 self.invalid_rows / self.skipped_sources 中，由界面一次性提示
+        self.error = None
+        self.invalid_rows = []
+        self.skipped_sources = []
+        valid_records = []
+        total_rows = 0
         try:
-            df = pd.read_excel(self.file_path)
+            for source, frame in self._iter_frames(progress):
+                total_rows += len(frame)
+                valid_records.extend(self._build_records(frame.rename(columns=self.rename_map), source))
         except Exception as e:
-            messagebox.showerror("读取失败", f"无法读取Excel文件。\n错误: {e}")
-            return None, 0, 0
-
-        if not all(col in df.columns for col in self.expected_columns):
-            missing_cols = [col for col in self.expected_columns if col not in df.columns]
-            messagebox.showerror("格式错误", f"Excel文件缺少必要的列: {', '.join(missing_cols)}")
-            return None, 0, 0
-        
-        df = df[self.expected_columns]
-        df.rename(columns=self.rename_map, inplace=True)
-        
-        valid_records = []
-        for index, row in df.iterrows():
-            record = row.to_dict()
-            
-            for key, value in record.items():
-                if pd.isna(value):
-                    record[key] = '' if key in ['notes', 'spec'] else 0
-
-            try:
-                if self.record_type == 'grower':
-                    gross = float(record.get('gross_weight', 0))
-                    secondary = float(record.get('secondary_fruit', 0))
-                    tare = float(record.get('tare_weight', 0))
-                    price = float(record.get('unit_price', 0))
-                    
-                    net_weight = gross - secondary - tare
-                    record['net_weight'] = net_weight
-                    record['total_amount'] = round(net_weight * price, 2)
-                else: # client
-                    record['total_amount'] = round(float(record['weight']) * float(record['unit_price']), 2)
-
-            except (ValueError, TypeError):
-                messagebox.showwarning("数据警告", f"第 {index + 2} 行的重量或单价不是有效数字，该行将被跳过。")
-                continue
-
-            if isinstance(record.get('date'), pd.Timestamp):
-                record['date'] = record['date'].strftime('%Y-%m-%d')
-            
-            valid_records.append(record)
-        
-        # --- 核心修改点：调用数据库检查重复项 ---
-        table_name = f"{self.record_type}_records"
-        new_records, duplicate_count = self.db_manager.check_existing_records(table_name, valid_records)
-            
-        return new_records, duplicate_count, len(df)
\ No newline at end of file
+            self.error = f"无法读取文件。\n错误: {e}"
+            return None, 0
+
+        if not total_rows and self.skipped_sources:
+            self.error = f"文件缺少必要的列: {', '.join(self.skipped_sources[0][1])}"
+            return None, 0
+
+        # 不在这里查重：与已有记录的冲突在写入时由数据库的唯一约束按所选方式处理
+        return valid_records, total_rows
+
+    def _build_records(self, df, source):
+        # 整列转换与计算；空白的数值单元格按 0 处理，填了但不是数字的单元格使该行无效
+        name_col = self.rename_map['姓名']
+        labels = {v: k for k, v in self.rename_map.items()}
+        numeric_cols = self.NUMERIC_COLUMNS[self.record_type]
+        raw = df[numeric_cols]
+        numbers = raw.apply(pd.to_numeric, errors='coerce')
+        problems = numbers.isna() & raw.notna()
+        numbers = numbers.fillna(0)
+
+        dates = pd.to_datetime(df['date'], errors='coerce')
+        # 格式按第一行推断，写法不同的日期（如 2025/01/03）再逐个解析一次
+        retry = dates.isna() & df['date'].notna()
+        if retry.any():
+            dates[retry] = pd.to_datetime(df['date'][retry].astype(str), errors='coerce', format='mixed')
+        names = df[name_col].fillna('').astype(str).str.strip()
+        problems['date'] = dates.isna()
+        problems[name_col] = names == ''
+        invalid = problems.any(axis=1)
+        if invalid.any():
+            bad = problems[invalid]
+            self.invalid_rows.extend(
+                (source, index, '、'.join(labels[col] for col in bad.columns[row]))
+                for index, row in zip(bad.index, bad.to_numpy())
+            )
+
+        out = pd.DataFrame({
+            'date': dates.dt.strftime('%Y-%m-%d'),
+            name_col: names,
+            'spec': df['spec'].fillna('').astype(str).str.strip(),
+        })
+        for col in numeric_cols:
+            out[col] = numbers[col]
+        if self.record_type == 'grower':
+            out['net_weight'] = out['gross_weight'] - out['secondary_fruit'] - out['tare_weight']
+            out['total_amount'] = (out['net_weight'] * out['unit_price']).round(2)
+        else:
+            out['total_amount'] = (out['weight'] * out['unit_price']).round(2)
+        out['notes'] = df['notes'].fillna('').astype(str)
+        return out[~invalid].to_dict('records')
+
+    def invalid_report(self, limit=20):
+        # 把被跳过的工作表（文件）和行汇总成一段提示文字，行数过多时只列出前 limit 行
+        parts = [f"{source} 缺少列 {', '.join(cols)}，已跳过。" for source, cols in self.skipped_sources]
+        if self.invalid_rows:
+            lines = [f"{source} 第 {row} 行: {columns} 无效" for source, row, columns in self.invalid_rows[:limit]]
+            if len(self.invalid_rows) > limit:
+                lines.append(f"……另有 {len(self.invalid_rows) - limit} 行")
+            parts.append(f"以下 {len(self.invalid_rows)} 行数据无效，已跳过:\n" + "\n".join(lines))
+        return "\n".join(parts)
+
+
+class ExcelImporter(RecordImporter):
+    def _iter_frames(self, progress=None, chunk_rows=IMPORT_CHUNK_ROWS):
+        # 只读模式逐行读取所有工作表，每 chunk_rows 行组成一个 DataFrame 交给向量化解析；
+        # DataFrame 的索引为该行在 Excel 中的行号。缺少必要列的工作表跳过并记入 self.skipped_sources
+        workbook = openpyxl.load_workbook(self.file_path, read_only=True, data_only=True)
+        try:
+            # 没有写入尺寸信息的文件 max_row 为 None，此时总数随读取进度增长
+            total = sum(max((ws.max_row or 1) - 1, 0) for ws in workbook.worksheets)
+            done = 0
+            for ws in workbook.worksheets:
+                rows = ws.iter_rows(values_only=True)
+                header = [str(h).strip() if h is not None else '' for h in next(rows, ())]
+                missing_cols = [col for col in self.expected_columns if col not in header]
+                if missing_cols:
+                    self.skipped_sources.append((f"工作表 {ws.title}", missing_cols))
+                    continue
+                positions = [header.index(col) for col in self.expected_columns]
+                pick = operator.itemgetter(*positions)
+                buffer, row_numbers = [], []
+                for row_number, row in enumerate(rows, start=2):
+                    if row.count(None) == len(row):
+                        continue
+                    try:
+                        buffer.append(pick(row))
+                    except IndexError:
+                        # 行尾的空单元格可能不在该行中
+                        buffer.append(tuple(row[p] if p < len(row) else None for p in positions))
+                    row_numbers.append(row_number)
+                    if len(buffer) >= chunk_rows:
+                        yield f"工作表 {ws.title}", pd.DataFrame(buffer, columns=self.expected_columns, index=row_numbers)
+                        done += len(buffer)
+                        if progress:
+                            progress(done, max(total, done), f"正在读取工作表 {ws.title}")
+                        buffer, row_numbers = [], []
+                if buffer:
+                    yield f"工作表 {ws.title}", pd.DataFrame(buffer, columns=self.expected_columns, index=row_numbers)
+                    done += len(buffer)
+                    if progress:
+                        progress(done, max(total, done), f"正在读取工作表 {ws.title}")
+        finally:
+            workbook.close()
+
+
+class CsvImporter(RecordImporter):
+    # 地磅软件导出的 CSV 可能是 UTF-8（带或不带 BOM）或 GBK 编码
+    def _detect_encoding(self):
+        with open(self.file_path, 'rb') as f:
+            head = f.read(65536)
+        try:
+            head.decode('utf-8')
+        except UnicodeDecodeError as e:
+            # 截断在多字节字符中间时仍视为 UTF-8
+            if e.start < len(head) - 3:
+                return 'gb18030'
+        return 'utf-8-sig'
+
+    def _iter_frames(self, progress=None, chunk_rows=IMPORT_CHUNK_ROWS * 4):
+        source = os.path.basename(self.file_path)
+        encoding = self._detect_encoding()
+        header = pd.read_csv(self.file_path, nrows=0, encoding=encoding).columns
+        columns = {str(col).strip(): col for col in header}
+        missing_cols = [col for col in self.expected_columns if col not in columns]
+        if missing_cols:
+            self.skipped_sources.append((source, missing_cols))
+            return
+        total_kb = max(os.path.getsize(self.file_path) // 1024, 1)
+        with open(self.file_path, 'rb') as f:
+            # 全部按文本读入，由 _build_records 统一校验数值列
+            reader = pd.read_csv(f, encoding=encoding, dtype=str, usecols=[columns[col] for col in self.expected_columns],
+                                 chunksize=chunk_rows)
+            for chunk in reader:
+                chunk.columns = [str(col).strip() for col in chunk.columns]
+                # 第 1 行是表头
+                chunk.index = chunk.index + 2
+                yield source, chunk[self.expected_columns]
+                if progress:
+                    progress(min(f.tell() // 1024, total_kb), total_kb, f"KB，正在读取 {source}")
+
+
+class ParquetImporter(RecordImporter):
+    def _iter_frames(self, progress=None, chunk_rows=IMPORT_CHUNK_ROWS * 4):
+        if pq is None:
+            raise RuntimeError("未安装 pyarrow，无法读取 Parquet 文件。")
+        source = os.path.basename(self.file_path)
+        parquet_file = pq.ParquetFile(self.file_path)
+        missing_cols = [col for col in self.expected_columns if col not in parquet_file.schema_arrow.names]
+        if missing_cols:
+            self.skipped_sources.append((source, missing_cols))
+            return
+        total = parquet_file.metadata.num_rows
+        done = 0
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=self.expected_columns):
+            frame = batch.to_pandas()
+            # Parquet 没有行号，按第几条记录（从 1 开始）报告
+            frame.index = frame.index + done + 1
+            done += len(frame)
+            yield source, frame
+            if progress:
+                progress(done, total, f"正在读取 {source}")
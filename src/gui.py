@@ -1,28 +1,36 @@
 # 文件路径: src/gui.py
-# 版本：已添加异步任务处理逻辑和错误样式
+# 版本：后台任务统一交给共享的任务池，结果由一个定时派发循环交回界面线程；
+#       标签页在首次选中时才创建，主窗口先显示，首屏数据在后台加载
 
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 import os
 import time
-import threading
 import queue
+import logging
+import importlib
 
 from ttkthemes import ThemedTk 
 
-from .database import DatabaseManager
+from .database import create_database_manager
 from .config import ConfigManager
 from .excel_exporter import ExcelExporter
+from .change_feed import ChangeFeed, coalesce_changes
+from .task_executor import TaskExecutor, PRIORITY_NORMAL, DEFAULT_MAX_WORKERS
 from .utils import hash_password, verify_password, resource_path
 
-from .tabs.dashboard_tab import DashboardTab
-from .tabs.grower_tab import GrowerTab
-from .tabs.client_tab import ClientTab
-from .tabs.admin_tab import AdminTab
+# 标签页: (标题, 模块, 类名, 是否仅管理员可见)。模块在标签页首次选中时才导入，看板用到的 matplotlib 不拖慢启动
+TAB_SPECS = [
+    (" 数据看板 ", "dashboard_tab", "DashboardTab", True),
+    (" 种植户收购管理 ", "grower_tab", "GrowerTab", False),
+    (" 客户发货管理 ", "client_tab", "ClientTab", False),
+    (" 系统与用户管理 ", "admin_tab", "AdminTab", True),
+]
 
 
 class LoginWindow(ThemedTk):
-    def __init__(self, db_manager):
+    def __init__(self, db_manager=None):
+        # db_manager 为 None 时数据库仍在后台连接，连接完成后由 set_db_manager 传入，在此之前不能登录
         super().__init__()
         try:
             icon_path = resource_path('tomato.ico')
@@ -55,7 +63,14 @@ class LoginWindow(ThemedTk):
         self.password_entry.pack(fill="x", padx=30)
         self.password_entry.bind("<Return>", self.attempt_login)
         self.username_entry.bind("<Return>", lambda e: self.password_entry.focus_set())
-        ttk.Button(self, text="登录", command=self.attempt_login).pack(pady=15)
+        self.login_button = ttk.Button(self, text="登录", command=self.attempt_login)
+        self.login_button.pack(pady=15)
+        if db_manager is None:
+            self.login_button.config(text="正在连接数据库...", state="disabled")
+
+    def set_db_manager(self, db_manager):
+        self.db_manager = db_manager
+        self.login_button.config(text="登录", state="normal")
 
     def center_window(self):
         self.update_idletasks()
@@ -64,6 +79,8 @@ class LoginWindow(ThemedTk):
         self.geometry(f"+{x}+{y}")
 
     def attempt_login(self, event=None):
+        if self.db_manager is None:
+            return
         username = self.username_entry.get()
         password = self.password_entry.get()
         user_data = self.db_manager.get_user(username)
@@ -103,12 +120,66 @@ def handle_initial_user_setup(db_manager):
     return False
 
 
+class SyncProblemsWindow(tk.Toplevel):
+    # 列出写后同步队列中冲突和失败的操作，由用户逐条选择处理方式
+    ACTIONS = [("重试", 'retry'), ("累加到云端记录", 'sum'), ("以本地为准", 'overwrite'), ("丢弃本地操作", 'discard')]
+
+    def __init__(self, parent, db_manager):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.title("同步问题")
+        self.geometry("820x360")
+        self.transient(parent)
+
+        columns = ("序号", "状态", "表", "操作", "日期", "姓名", "规格", "原因")
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", selectmode="browse")
+        for col in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=80 if col != "原因" else 300, stretch=(col == "原因"))
+        self.tree.pack(expand=True, fill="both", padx=10, pady=10)
+
+        button_frame = ttk.Frame(self)
+        button_frame.pack(fill="x", padx=10, pady=(0, 10))
+        for text, action in self.ACTIONS:
+            ttk.Button(button_frame, text=text, command=lambda a=action: self._resolve(a)).pack(side="left", padx=5)
+        ttk.Button(button_frame, text="关闭", command=self.destroy).pack(side="right", padx=5)
+        self._load()
+
+    def _load(self):
+        self.tree.delete(*self.tree.get_children())
+        table_labels = {'grower_records': '种植户', 'client_records': '客户'}
+        op_labels = {'insert': '新增', 'update': '修改', 'delete': '删除'}
+        status_labels = {'conflict': '冲突', 'failed': '失败'}
+        for op in self.db_manager.get_sync_problems():
+            payload = op['payload'] or {}
+            name = payload.get('grower_name', payload.get('client_name', ''))
+            self.tree.insert("", "end", iid=str(op['seq']), values=(
+                op['seq'], status_labels.get(op['status'], op['status']), table_labels.get(op['table_name'], op['table_name']), op_labels.get(op['op'], op['op']),
+                payload.get('date', ''), name, payload.get('spec', ''), op['last_error'] or ''))
+
+    def _resolve(self, action):
+        selected = self.tree.selection()
+        if not selected:
+            messagebox.showwarning("提示", "请先选择一条记录！", parent=self)
+            return
+        if action == 'discard' and not messagebox.askyesno("确认", "丢弃后本地的这次操作将不会写入云端，确定吗？", parent=self):
+            return
+        try:
+            self.db_manager.resolve_sync_problem(int(selected[0]), action)
+        except Exception as e:
+            logging.error(f"处理同步问题失败: {e}")
+            messagebox.showerror("错误", f"处理失败: {e}", parent=self)
+        self._load()
+
+
 class TomatoManagementApp(ThemedTk):
-    def __init__(self, current_user_info):
+    def __init__(self, current_user_info, db_manager=None, startup_timer=None):
+        # db_manager: 登录时已建立的连接，直接沿用；startup_timer: 记录首屏显示前各阶段耗时
         super().__init__()
         
         self.current_user_info = current_user_info
         self.status_message_job_id = None
+        self.startup_timer = startup_timer
 
         try:
             icon_path = resource_path('tomato.ico')
@@ -122,15 +193,92 @@ class TomatoManagementApp(ThemedTk):
         self.title(f"番茄收购与发货管理系统 - 当前用户: {username} ({role})")
         self.geometry("1280x700")
         
-        self.db_manager = DatabaseManager()
         self.config_manager = ConfigManager()
+        self.db_manager = db_manager or create_database_manager(self.config_manager, write_behind=True)
+        # 只包含已经创建的记录标签页
+        self.record_tabs = []
         self.excel_exporter = ExcelExporter(self.config_manager)
+        # 翻页、搜索、保存、导出等后台任务共用一个固定大小的线程池
+        self.task_executor = TaskExecutor(self.config_manager.get("task_workers", DEFAULT_MAX_WORKERS),
+                                          on_error=self._show_task_error)
+        self.task_progress_text = {}
 
         self._configure_styles()
         self._create_widgets()
         
         self.protocol("WM_DELETE_WINDOW", self._on_closing)
         self._update_time()
+        self._update_sync_status()
+        self._dispatch_task_results()
+
+        # 其他终端和网页端的增删改通过变更日志推送过来，只更新列表中受影响的行
+        self.change_feed = ChangeFeed(lambda method, *args: getattr(self.db_manager, method)(*args),
+                                      interval=self.config_manager.get("change_poll_interval", 2.0))
+        self.change_queue = self.change_feed.subscribe()
+        self.change_feed.start()
+        self._apply_live_changes()
+
+        # 先让主窗口和占位标签页显示出来，再创建当前选中的标签页
+        self.after(10, self._show_first_tab)
+
+    def _show_first_tab(self):
+        if self.startup_timer:
+            self.startup_timer.mark("主窗口显示")
+        self._on_tab_changed()
+        self.notebook.bind("<<NotebookTabChanged>>", self._on_tab_changed)
+        if self.startup_timer:
+            self.startup_timer.mark("首个标签页创建")
+            self._wait_for_first_data()
+
+    def _wait_for_first_data(self):
+        # 首个标签页提交的后台读取全部完成并显示后，输出启动耗时
+        if self.task_executor.pending_count():
+            self.after(20, self._wait_for_first_data)
+            return
+        self.startup_timer.mark("首屏数据加载")
+        self.startup_timer.report()
+
+    def _on_tab_changed(self, event=None):
+        selected = self.notebook.select()
+        if selected in self.tab_placeholders:
+            self._build_tab(selected)
+
+    def _build_tab(self, placeholder_name):
+        module_name, class_name = self.tab_placeholders.pop(placeholder_name)
+        placeholder = self.nametowidget(placeholder_name)
+        try:
+            tab_class = getattr(importlib.import_module(f".tabs.{module_name}", __package__), class_name)
+            frame = tab_class(self.notebook, self.shared_context)
+        except Exception as e:
+            logging.error(f"创建标签页 {class_name} 失败: {e}", exc_info=True)
+            for child in placeholder.winfo_children():
+                child.config(text=f"加载失败: {e}")
+            return
+        # 先选中新标签页再移除占位，避免移除时选中其他占位而连带创建
+        self.notebook.insert(placeholder, frame, text=self.notebook.tab(placeholder, "text"))
+        self.notebook.select(frame)
+        self.notebook.forget(placeholder)
+        placeholder.destroy()
+        if hasattr(frame, 'table_name'):
+            self.record_tabs.append(frame)
+
+    def _apply_live_changes(self):
+        changes = []
+        while True:
+            try:
+                changes.extend(self.change_queue.get_nowait())
+            except queue.Empty:
+                break
+        if changes:
+            events = coalesce_changes(changes)
+            # 其他终端写入的表，本地缓存的分页结果已经过期
+            for table_name in {e['table_name'] for e in events}:
+                self.db_manager.invalidate_page_cache(table_name)
+            for tab in self.record_tabs:
+                tab_events = [e for e in events if e['table_name'] == tab.table_name]
+                if tab_events:
+                    tab.apply_changes(tab_events)
+        self.after(500, self._apply_live_changes)
 
     def _configure_styles(self):
         style = ttk.Style(self)
@@ -159,6 +307,9 @@ class TomatoManagementApp(ThemedTk):
         style.configure('Error.TEntry', fieldbackground='mistyrose')
 
     def _on_closing(self):
+        logging.info(f"分页缓存统计: {self.db_manager.get_page_cache_stats()}")
+        self.task_executor.shutdown()
+        self.change_feed.stop()
         self.db_manager.close()
         self.destroy()
 
@@ -167,10 +318,10 @@ class TomatoManagementApp(ThemedTk):
         main_frame = ttk.Frame(self)
         main_frame.pack(expand=True, fill="both", padx=15, pady=(15, 0)) 
         
-        notebook = ttk.Notebook(main_frame)
-        notebook.pack(expand=True, fill="both")
+        self.notebook = ttk.Notebook(main_frame)
+        self.notebook.pack(expand=True, fill="both")
         
-        shared_context = {
+        self.shared_context = {
             "db_manager": self.db_manager,
             "config_manager": self.config_manager,
             "excel_exporter": self.excel_exporter,
@@ -178,19 +329,15 @@ class TomatoManagementApp(ThemedTk):
             "app": self
         }
 
-        if self.current_user_info['role'] == 'admin':
-            dashboard_frame = DashboardTab(notebook, shared_context)
-            notebook.add(dashboard_frame, text=" 数据看板 ")
-
-        grower_frame = GrowerTab(notebook, shared_context)
-        notebook.add(grower_frame, text=" 种植户收购管理 ")
-        
-        client_frame = ClientTab(notebook, shared_context)
-        notebook.add(client_frame, text=" 客户发货管理 ")
-        
-        if self.current_user_info['role'] == 'admin':
-            admin_frame = AdminTab(notebook, shared_context)
-            notebook.add(admin_frame, text=" 系统与用户管理 ")
+        # 每个标签页先放一个占位框架，首次选中时替换为真正的标签页
+        self.tab_placeholders = {}
+        for title, module_name, class_name, admin_only in TAB_SPECS:
+            if admin_only and self.current_user_info['role'] != 'admin':
+                continue
+            placeholder = ttk.Frame(self.notebook)
+            ttk.Label(placeholder, text="正在加载...").pack(expand=True)
+            self.notebook.add(placeholder, text=title)
+            self.tab_placeholders[str(placeholder)] = (module_name, class_name)
 
     def _create_statusbar(self):
         status_bar = ttk.Frame(self, style='Header.TFrame')
@@ -202,11 +349,49 @@ class TomatoManagementApp(ThemedTk):
         self.time_label = ttk.Label(status_bar, anchor='e')
         self.time_label.pack(side="right", padx=10, pady=2)
 
+        self.task_label = ttk.Label(status_bar, anchor='e')
+        self.task_label.pack(side="right", padx=10, pady=2)
+
+        self.sync_label = ttk.Label(status_bar, anchor='e', cursor='hand2')
+        self.sync_label.pack(side="right", padx=10, pady=2)
+        self.sync_label.bind("<Button-1>", lambda e: self._show_sync_problems())
+        self.last_conflict_count = 0
+
+    def _show_sync_problems(self):
+        if hasattr(self.db_manager, 'get_sync_problems'):
+            SyncProblemsWindow(self, self.db_manager)
+
     def _update_time(self):
         current_time = time.strftime("%Y-%m-%d %H:%M:%S")
         self.time_label.config(text=current_time)
         self.after(1000, self._update_time)
 
+    def _update_sync_status(self):
+        # 仅在启用写后同步队列时显示待同步数量和最近同步时间
+        if hasattr(self.db_manager, 'get_sync_status'):
+            status = self.db_manager.get_sync_status()
+            last_sync = status['last_sync_time'].strftime('%H:%M:%S') if status['last_sync_time'] else '尚未同步'
+            text = f"待同步: {status['pending']} 条 | 最近同步: {last_sync}"
+            if status['conflict']:
+                text += f" | 同步冲突: {status['conflict']} 条"
+            if status['failed']:
+                text += f" | 同步失败: {status['failed']} 条"
+            elif status['last_error']:
+                text += " | 网络异常，稍后重试"
+            problems = status['conflict'] + status['failed']
+            if problems:
+                text += "（点击处理）"
+            self.sync_label.config(text=text, foreground='#C0392B' if problems else '')
+            if status['conflict'] > self.last_conflict_count:
+                messagebox.showwarning("同步冲突", "有本地录入或修改与其他终端的数据冲突，尚未写入云端。\n"
+                                       "请点击状态栏的同步状态逐条处理。", parent=self)
+            self.last_conflict_count = status['conflict']
+            synced_tables = self.db_manager.pop_synced_tables()
+            for tab in self.record_tabs:
+                if tab.table_name in synced_tables:
+                    tab.load_paged_records()
+        self.after(1000, self._update_sync_status)
+
     def show_status_message(self, message, duration_ms=3000):
         if self.status_message_job_id:
             self.after_cancel(self.status_message_job_id)
@@ -217,7 +402,7 @@ class TomatoManagementApp(ThemedTk):
         self.status_label.config(text=" 欢迎使用番茄管理系统！")
         self.status_message_job_id = None
 
-    def _create_loading_window(self, message="正在处理，请稍候..."):
+    def _create_loading_window(self, message="正在处理，请稍候...", determinate=False, on_cancel=None):
         loading_window = tk.Toplevel(self)
         loading_window.title("请稍候")
         loading_window.geometry("300x100")
@@ -231,38 +416,82 @@ class TomatoManagementApp(ThemedTk):
         loading_window.grab_set()
 
         ttk.Label(loading_window, text=message, font=("微软雅黑", 12)).pack(expand=True, pady=10)
-        progress = ttk.Progressbar(loading_window, mode='indeterminate')
-        progress.pack(pady=10, padx=20, fill='x')
-        progress.start(10)
+        if determinate:
+            # 可报告进度的任务显示真实进度和当前处理的对象
+            loading_window.geometry("360x120")
+            loading_window.progress = ttk.Progressbar(loading_window, mode='determinate', maximum=1)
+            loading_window.progress.pack(pady=(0, 5), padx=20, fill='x')
+            loading_window.detail_label = ttk.Label(loading_window, text="")
+            loading_window.detail_label.pack(pady=(0, 10))
+        else:
+            progress = ttk.Progressbar(loading_window, mode='indeterminate')
+            progress.pack(pady=10, padx=20, fill='x')
+            progress.start(10)
+        if on_cancel:
+            loading_window.geometry("360x160" if determinate else "300x140")
+            ttk.Button(loading_window, text="取消", command=on_cancel).pack(pady=(0, 10))
+            loading_window.protocol("WM_DELETE_WINDOW", on_cancel)
         
         return loading_window
 
-    def run_long_task(self, task_function, on_complete=None, *args):
-        loading_window = self._create_loading_window()
-        result_queue = queue.Queue()
+    def _dispatch_task_results(self):
+        # 唯一的结果派发循环：后台任务的完成、出错和进度回调都在这里回到界面线程执行
+        self.task_executor.dispatch()
+        running = self.task_executor.pending_count()
+        if self.task_progress_text:
+            self.task_label.config(text=" | ".join(self.task_progress_text.values()))
+        else:
+            self.task_label.config(text=f"后台任务: {running} 个" if running else "")
+        self.after(50, self._dispatch_task_results)
+
+    def _show_task_error(self, error):
+        messagebox.showerror("发生错误", f"处理失败: {error}\n详情请查看日志文件。")
+
+    def submit_task(self, task_function, on_complete=None, *args, priority=PRIORITY_NORMAL, modal=False,
+                    with_progress=False, on_error=None, cancellable=False, message="正在处理，请稍候..."):
+        # 提交后台任务，返回可 cancel() 的任务对象；回调都在界面线程中执行。
+        # modal=True 时显示阻止其他操作的等待窗口；否则界面照常可用，进度显示在状态栏。
+        # with_progress=True 时 task_function 的第一个参数是进度回调 progress(done, total, text)。
+        loading_window = None
+        task = None
+
+        def cancel():
+            task.cancel()
+            finish()
+
+        def finish():
+            if loading_window is not None and loading_window.winfo_exists():
+                loading_window.destroy()
+            self.task_progress_text.pop(task, None)
 
-        def task_wrapper():
-            try:
-                result = task_function(*args)
-                result_queue.put(('success', result))
-            except Exception as e:
-                result_queue.put(('error', e))
+        def completed(result):
+            finish()
+            if on_complete:
+                on_complete(result)
 
-        thread = threading.Thread(target=task_wrapper)
-        thread.daemon = True
-        thread.start()
+        def failed(error):
+            finish()
+            (on_error or self._show_task_error)(error)
 
-        def check_queue():
-            try:
-                status, result = result_queue.get_nowait()
-                loading_window.destroy()
-                if status == 'success':
-                    if on_complete:
-                        on_complete(result)
-                elif status == 'error':
-                    logging.error(f"线程任务出错: {result}", exc_info=True)
-                    messagebox.showerror("发生错误", f"处理失败: {result}\n详情请查看日志文件。")
-            except queue.Empty:
-                self.after(100, check_queue)
+        def progressed(done, total, text):
+            if loading_window is not None:
+                loading_window.progress.config(maximum=max(total, 1), value=done)
+                loading_window.detail_label.config(text=f"{done} / {total}  {text}")
+            else:
+                self.task_progress_text[task] = f"{text} {done} / {total}" if total else text
+
+        if modal:
+            loading_window = self._create_loading_window(message, determinate=with_progress,
+                                                         on_cancel=cancel if cancellable else None)
+        task = self.task_executor.submit(task_function, *args, priority=priority, on_complete=completed,
+                                         on_error=failed, on_progress=progressed, with_progress=with_progress)
+        return task
+
+    def run_long_task(self, task_function, on_complete=None, *args):
+        # 显示等待窗口的后台任务，完成前不能进行其他操作
+        return self.submit_task(task_function, on_complete, *args, modal=True)
 
-        self.after(100, check_queue)
\ No newline at end of file
+    def run_progress_task(self, task_function, on_complete=None, *args):
+        # 与 run_long_task 相同，但 task_function 的第一个参数是进度回调 progress(done, total, text)，
+        # 可在后台线程中任意调用，界面上显示确定进度的进度条，并可取消
+        return self.submit_task(task_function, on_complete, *args, modal=True, with_progress=True, cancellable=True)
@@ -0,0 +1,146 @@
+# 文件路径: src/import_job.py
+# 版本：大批量导入，按固定大小分批写入，每批失败自动重试，中断后可从断点继续；
+#       每批按自然键 (日期, 姓名, 规格) 写入，与已有记录冲突时按所选方式跳过、覆盖或累加
+#
+# 确认导入时先把待插入的记录整体写入本地断点库 (import_checkpoint.db)，每成功一批推进一次进度；
+# 程序崩溃或网络中断后再次导入同一个文件（路径、大小、修改时间均未变），可直接从中断处继续，
+# 不会重复插入已经成功的批次。每批带有批次键 (本次导入的 run_id, 起始位置, 条数)，数据库在写入的同一事务中登记，
+# 已写入的批次再次发送时直接跳过，因此响应超时后的重试、崩溃后的续传都不会把 sum 方式的重量和金额累加两次。
+
+import os
+import json
+import time
+import sqlite3
+import uuid
+import hashlib
+import logging
+import contextlib
+from .db_base import SUM_COLUMNS, natural_key_columns
+
+CHECKPOINT_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS import_jobs (
+    job_key TEXT PRIMARY KEY,
+    source_path TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    policy TEXT NOT NULL DEFAULT 'skip',
+    run_id TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS import_rows (
+    job_key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (job_key, position)
+);
+"""
+
+# 每批插入的记录数，单次请求体保持在几百 KB 以内
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_RETRIES = 3
+
+
+def default_checkpoint_path():
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(project_root, "import_checkpoint.db")
+
+
+def import_job_key(source_path, table_name):
+    # 文件内容变化后（大小或修改时间不同）不再沿用旧的断点
+    stat = os.stat(source_path)
+    raw = f"{os.path.abspath(source_path)}|{stat.st_size}|{stat.st_mtime_ns}|{table_name}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def merge_duplicate_keys(records, table_name, policy):
+    # 文件内自然键重复的行先按同样的方式合并，一批写入中同一个键只出现一次；返回 (合并后的记录, 合并掉的行数)
+    key_columns = natural_key_columns(table_name)
+    merged = {}
+    for record in records:
+        key = tuple(record[col] for col in key_columns)
+        existing = merged.get(key)
+        if existing is None or policy == 'overwrite':
+            merged[key] = dict(record)
+        elif policy == 'sum':
+            for col in SUM_COLUMNS[table_name]:
+                existing[col] = (existing.get(col) or 0) + (record.get(col) or 0)
+    return list(merged.values()), len(records) - len(merged)
+
+
+class ImportCheckpoint:
+    def __init__(self, path=None):
+        self.path = path or default_checkpoint_path()
+        with self._connect() as conn:
+            conn.executescript(CHECKPOINT_SCHEMA_SQL)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # 界面线程和导入线程都会访问，每次操作使用独立连接
+        conn = sqlite3.connect(self.path)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def pending(self, job_key):
+        # 未完成的导入返回 (已完成条数, 总条数)，否则返回 None
+        with self._connect() as conn:
+            row = conn.execute("SELECT done, total FROM import_jobs WHERE job_key = ?", (job_key,)).fetchone()
+        return tuple(row) if row and row[0] < row[1] else None
+
+    def create(self, job_key, source_path, table_name, records, policy='skip'):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM import_rows WHERE job_key = ?", (job_key,))
+            # 同一个文件完成后再次导入是新的一次导入，run_id 不同，批次键不会与上次的冲突
+            conn.execute("INSERT OR REPLACE INTO import_jobs (job_key, source_path, table_name, total, done, created_at, policy, run_id) VALUES (?, ?, ?, ?, 0, ?, ?, ?)",
+                         (job_key, source_path, table_name, len(records), time.time(), policy, uuid.uuid4().hex))
+            conn.executemany("INSERT INTO import_rows (job_key, position, payload) VALUES (?, ?, ?)",
+                             ((job_key, i, json.dumps(r, ensure_ascii=False, default=str)) for i, r in enumerate(records)))
+
+    def load(self, job_key):
+        # 返回 (表名, 冲突处理方式, run_id, 已完成条数, 总条数, 剩余记录列表)
+        with self._connect() as conn:
+            table_name, policy, run_id, done, total = conn.execute(
+                "SELECT table_name, policy, run_id, done, total FROM import_jobs WHERE job_key = ?", (job_key,)).fetchone()
+            rows = conn.execute("SELECT payload FROM import_rows WHERE job_key = ? AND position >= ? ORDER BY position", (job_key, done)).fetchall()
+        return table_name, policy, run_id, done, total, [json.loads(row[0]) for row in rows]
+
+    def advance(self, job_key, done):
+        with self._connect() as conn:
+            conn.execute("UPDATE import_jobs SET done = ? WHERE job_key = ?", (done, job_key))
+
+    def discard(self, job_key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM import_rows WHERE job_key = ?", (job_key,))
+            conn.execute("DELETE FROM import_jobs WHERE job_key = ?", (job_key,))
+
+
+def run_import_job(db_manager, checkpoint, job_key, progress=None, batch_size=IMPORT_BATCH_SIZE, max_retries=IMPORT_MAX_RETRIES):
+    # 从断点继续写入剩余记录；返回 {'inserted', 'updated', 'skipped', 'done', 'total', 'error'}，error 为 None 表示全部完成
+    table_name, policy, run_id, done, total, records = checkpoint.load(job_key)
+    result = {'inserted': 0, 'updated': 0, 'skipped': 0, 'done': done, 'total': total, 'error': None}
+    for start in range(0, len(records), batch_size):
+        batch = records[start:start + batch_size]
+        for attempt in range(max_retries + 1):
+            # 每批是一个事务：要么整批写入并登记批次键，要么什么都没写；已登记的批次重发时被跳过
+            batch_key = f"{run_id}:{done}:{len(batch)}"
+            counts = db_manager.upsert_records(table_name, batch, policy, batch_key)
+            if counts is not None:
+                break
+            if attempt < max_retries:
+                logging.warning(f"导入 {table_name} 第 {done + 1} - {done + len(batch)} 条失败，{2 ** attempt} 秒后重试。")
+                time.sleep(2 ** attempt)
+        else:
+            result['error'] = f"第 {done + 1} - {done + len(batch)} 条重试 {max_retries} 次后仍然失败"
+            return result
+        for key in ('inserted', 'updated', 'skipped'):
+            result[key] += counts[key]
+        done += len(batch)
+        result['done'] = done
+        checkpoint.advance(job_key, done)
+        if progress:
+            progress(done, total, "正在写入数据库")
+    checkpoint.discard(job_key)
+    return result
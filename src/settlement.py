@@ -0,0 +1,50 @@
+# 文件路径: src/settlement.py
+# 版本：结算单的数据准备与金额大写，Excel、PDF、HTML 各种输出格式共用，不依赖任何界面库
+
+import pandas as pd
+
+SETTLEMENT_RENAME_MAP = {'grower_name': '姓名', 'client_name': '姓名', 'date': '日期', 'spec': '规格', 'unit_price': '单价', 'total_amount': '金额', 'notes': '备注'}
+SETTLEMENT_TYPE_COLUMNS = {
+    'grower': ({'net_weight': '净重(斤)', 'gross_weight': '毛重(斤)', 'secondary_fruit': '次果(斤)', 'tare_weight': '皮重(斤)'},
+               ['日期', '规格', '毛重(斤)', '次果(斤)', '皮重(斤)', '净重(斤)', '单价', '金额', '备注']),
+    'client': ({'pieces': '件数', 'weight': '重量(斤)'},
+               ['日期', '规格', '件数', '重量(斤)', '单价', '金额', '备注']),
+}
+NUMERIC_COLUMNS = ['净重(斤)', '毛重(斤)', '次果(斤)', '皮重(斤)', '件数', '重量(斤)', '单价', '金额']
+CURRENCY_COLUMNS = ['单价', '金额']
+
+
+def prepare_settlement_frame(df, record_type):
+    # 把数据库字段转换为结算单的中文列，并把数值列统一为数字
+    type_rename_map, display_columns = SETTLEMENT_TYPE_COLUMNS[record_type]
+    df_processed = df.rename(columns={**SETTLEMENT_RENAME_MAP, **type_rename_map})
+    for col in NUMERIC_COLUMNS:
+        if col in df_processed.columns:
+            df_processed[col] = pd.to_numeric(df_processed[col], errors='coerce').fillna(0)
+    return df_processed[display_columns], display_columns
+
+
+def to_chinese_currency(num):
+    cn_num = ['零', '壹', '贰', '叁', '肆', '伍', '陆', '柒', '捌', '玖']
+    cn_unit = ['', '拾', '佰', '仟', '万', '拾万', '佰万', '仟万', '亿', '拾亿', '佰亿', '仟亿', '兆']
+    cn_decimal = ['角', '分']
+    num_str = f"{num:.2f}"
+    integer_part, decimal_part = num_str.split('.')
+    integer_result = ""
+    if integer_part == '0': integer_result = '零'
+    else:
+        integer_len = len(integer_part)
+        for i in range(integer_len):
+            digit = int(integer_part[i])
+            unit = cn_unit[integer_len - 1 - i]
+            if digit == 0:
+                if integer_result and integer_result[-1] != '零': integer_result += '零'
+            else: integer_result += cn_num[digit] + unit
+        if integer_result.endswith('零'): integer_result = integer_result[:-1]
+    decimal_result = ""
+    if decimal_part == '00': decimal_result = '整'
+    else:
+        if decimal_part[0] != '0': decimal_result += cn_num[int(decimal_part[0])] + cn_decimal[0]
+        if decimal_part[1] != '0': decimal_result += cn_num[int(decimal_part[1])] + cn_decimal[1]
+    if integer_part == '0': return f"零元{decimal_result}"
+    return f"{integer_result}元{decimal_result}"
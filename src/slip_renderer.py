@@ -0,0 +1,155 @@
+# 文件路径: src/slip_renderer.py
+# 版本：结算小票的 HTML / PDF 输出，不依赖 Excel 和界面库，服务器端也可直接生成
+#
+# HTML 为单文件（样式内联），浏览器打开即可打印；PDF 需要可选依赖 reportlab，
+# 使用其内置的中文 CID 字体，无需额外安装字体文件。
+
+import io
+import html
+import datetime
+from .settlement import prepare_settlement_frame, to_chinese_currency, NUMERIC_COLUMNS, CURRENCY_COLUMNS
+
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import mm
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+except ImportError:
+    pdfmetrics = None
+
+PDF_FONT_NAME = 'STSong-Light'
+
+SLIP_CSS = """
+body { font-family: "SimSun", "Songti SC", "Noto Serif CJK SC", serif; margin: 24px; color: #000; }
+h1 { font-family: "SimHei", "Heiti SC", sans-serif; font-size: 22px; color: #002060; text-align: center; margin: 0 0 4px; }
+h2 { font-size: 17px; text-align: center; margin: 0 0 16px; }
+.info { display: flex; justify-content: space-between; font-size: 13px; margin-bottom: 8px; }
+table { width: 100%; border-collapse: collapse; font-size: 12px; }
+th { background: #4472C4; color: #fff; padding: 4px; border: 1px solid #BFBFBF; }
+td { padding: 3px 4px; border: 1px solid #BFBFBF; }
+td.num { text-align: right; }
+tbody tr:nth-child(even) { background: #DDEBF7; }
+thead { display: table-header-group; }
+.total { text-align: right; font-weight: bold; margin-top: 10px; font-size: 13px; }
+.total span { color: #FF0000; }
+.words { font-size: 13px; margin-top: 4px; }
+.footer { font-size: 11px; font-style: italic; color: #808080; margin-top: 16px; }
+.footer .right { text-align: right; }
+@media print { body { margin: 0; } @page { size: A4; margin: 18mm; } }
+"""
+
+
+def pdf_available():
+    return pdfmetrics is not None
+
+
+def _format_cell(col_name, value):
+    if col_name in CURRENCY_COLUMNS:
+        return f"¥{value:,.2f}"
+    if col_name in NUMERIC_COLUMNS:
+        return f"{value:,.2f}"
+    return "" if value is None or value != value else str(value)
+
+
+def _slip_content(df, title, entity_name, record_type, date_range, config):
+    # HTML 与 PDF 共用的数据：表头、格式化后的正文行、合计与页脚文字
+    df_display, display_columns = prepare_settlement_frame(df, record_type)
+    total_amount = float(df_display['金额'].sum())
+    rows = [[_format_cell(col_name, value) for col_name, value in zip(display_columns, row)]
+            for row in df_display.itertuples(index=False)]
+    date_range_str = f"{date_range[0]} 至 {date_range[1]}" if date_range and date_range[0] != date_range[1] else (date_range[0] if date_range else "")
+    return {
+        'company_name': config.get("company_name", "公司名称"),
+        'title': title,
+        'entity': f"结算对象: {entity_name}",
+        'period': f"结算周期: {date_range_str}",
+        'columns': display_columns,
+        'rows': rows,
+        'total': f"¥{total_amount:,.2f}",
+        'amount_in_words': f"金额大写: {to_chinese_currency(total_amount)}",
+        'footer_text': config.get("footer_text", ""),
+        'contact': f"联系电话: {config.get('phone_number', '')} | 生成时间: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+    }
+
+
+def render_settlement_html(df, title, entity_name, record_type, date_range, config):
+    content = _slip_content(df, title, entity_name, record_type, date_range, config)
+    esc = html.escape
+    numeric = [col in NUMERIC_COLUMNS for col in content['columns']]
+    header = "".join(f"<th>{esc(col)}</th>" for col in content['columns'])
+    body = "\n".join(
+        "<tr>" + "".join(f'<td class="num">{esc(v)}</td>' if is_num else f"<td>{esc(v)}</td>" for v, is_num in zip(row, numeric)) + "</tr>"
+        for row in content['rows']
+    )
+    return f"""<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+<meta charset="UTF-8">
+<title>{esc(content['title'])} - {esc(entity_name)}</title>
+<style>{SLIP_CSS}</style>
+</head>
+<body>
+<h1>{esc(content['company_name'])}</h1>
+<h2>{esc(content['title'])}</h2>
+<div class="info"><span>{esc(content['entity'])}</span><span>{esc(content['period'])}</span></div>
+<table>
+<thead><tr>{header}</tr></thead>
+<tbody>
+{body}
+</tbody>
+</table>
+<div class="total">总计 (TOTAL): <span>{esc(content['total'])}</span></div>
+<div class="words">{esc(content['amount_in_words'])}</div>
+<div class="footer"><div>{esc(content['footer_text'])}</div><div class="right">{esc(content['contact'])}</div></div>
+</body>
+</html>
+"""
+
+
+def render_settlement_pdf(df, title, entity_name, record_type, date_range, config):
+    if not pdf_available():
+        raise RuntimeError("生成PDF需要安装 reportlab (pip install reportlab)")
+    if PDF_FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(UnicodeCIDFont(PDF_FONT_NAME))
+    content = _slip_content(df, title, entity_name, record_type, date_range, config)
+
+    def style(size, color=colors.black, align=0):
+        return ParagraphStyle('slip', fontName=PDF_FONT_NAME, fontSize=size, leading=size * 1.4, textColor=color, alignment=align)
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=18 * mm, rightMargin=18 * mm, topMargin=18 * mm, bottomMargin=18 * mm,
+                            title=f"{content['title']} - {entity_name}")
+    table = Table([content['columns']] + content['rows'], repeatRows=1)
+    numeric_cols = [i for i, col in enumerate(content['columns']) if col in NUMERIC_COLUMNS]
+    table_style = [
+        ('FONTNAME', (0, 0), (-1, -1), PDF_FONT_NAME),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#4472C4")),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor("#BFBFBF")),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor("#DDEBF7")]),
+    ]
+    table_style += [('ALIGN', (i, 1), (i, -1), 'RIGHT') for i in numeric_cols]
+    table.setStyle(TableStyle(table_style))
+    story = [
+        Paragraph(html.escape(content['company_name']), style(18, colors.HexColor("#002060"), 1)),
+        Paragraph(html.escape(content['title']), style(14, align=1)),
+        Spacer(1, 4 * mm),
+        Table([[content['entity'], content['period']]], colWidths=['50%', '50%'],
+              style=[('FONTNAME', (0, 0), (-1, -1), PDF_FONT_NAME), ('FONTSIZE', (0, 0), (-1, -1), 10),
+                     ('ALIGN', (1, 0), (1, 0), 'RIGHT'), ('LEFTPADDING', (0, 0), (-1, -1), 0), ('RIGHTPADDING', (0, 0), (-1, -1), 0)]),
+        Spacer(1, 2 * mm),
+        table,
+        Spacer(1, 3 * mm),
+        Paragraph(f"总计 (TOTAL): <font color='#FF0000'>{html.escape(content['total'])}</font>", style(10, align=2)),
+        Paragraph(html.escape(content['amount_in_words']), style(10)),
+        Spacer(1, 6 * mm),
+        Paragraph(html.escape(content['footer_text']), style(8, colors.HexColor("#808080"))),
+        Paragraph(html.escape(content['contact']), style(8, colors.HexColor("#808080"), 2)),
+    ]
+    doc.build(story)
+    return buffer.getvalue()
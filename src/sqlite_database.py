@@ -0,0 +1,651 @@
+# 文件路径: src/sqlite_database.py
+# 版本：本地 SQLite 存储后端，接口与 Supabase 版 DatabaseManager 保持一致
+
+import os
+import json
+import sqlite3
+import logging
+import threading
+import pandas as pd
+from .db_base import (BaseDatabaseManager, TABLE_COLUMNS, NAME_COLUMNS, WEIGHT_COLUMNS, CHANGE_LOG_RETENTION,
+                      CONFLICT_POLICIES, SUM_COLUMNS, natural_key_columns)
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    role TEXT NOT NULL DEFAULT 'user'
+);
+CREATE TABLE IF NOT EXISTS grower_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    grower_name TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    gross_weight REAL,
+    secondary_fruit REAL,
+    tare_weight REAL,
+    net_weight REAL NOT NULL,
+    unit_price REAL NOT NULL,
+    total_amount REAL NOT NULL,
+    notes TEXT
+);
+CREATE TABLE IF NOT EXISTS client_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    client_name TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    pieces REAL NOT NULL,
+    weight REAL NOT NULL,
+    unit_price REAL NOT NULL,
+    total_amount REAL NOT NULL,
+    notes TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_grower_records_date_id ON grower_records (date, id);
+CREATE INDEX IF NOT EXISTS idx_grower_records_name_date ON grower_records (grower_name, date);
+CREATE INDEX IF NOT EXISTS idx_client_records_date_id ON client_records (date, id);
+CREATE INDEX IF NOT EXISTS idx_client_records_name_date ON client_records (client_name, date);
+CREATE TABLE IF NOT EXISTS daily_summary (
+    record_type TEXT NOT NULL,
+    date TEXT NOT NULL,
+    name TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    total_weight REAL NOT NULL DEFAULT 0,
+    total_amount REAL NOT NULL DEFAULT 0,
+    record_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (record_type, date, name, spec)
+);
+CREATE INDEX IF NOT EXISTS idx_daily_summary_type_name_date ON daily_summary (record_type, name, date);
+CREATE TABLE IF NOT EXISTS import_batches (
+    batch_key TEXT PRIMARY KEY,
+    applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO table_versions (table_name, version) VALUES ('grower_records', 0), ('client_records', 0);
+CREATE TABLE IF NOT EXISTS change_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name TEXT NOT NULL,
+    op TEXT NOT NULL,
+    record_id INTEGER NOT NULL,
+    record TEXT,
+    changed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_change_log_record ON change_log (table_name, record_id, seq);
+"""
+
+
+def _summary_trigger_sql(table_name):
+    # 为业务表生成维护 daily_summary 的触发器，增删改与汇总更新处于同一事务
+    record_type = table_name.replace('_records', '')
+    name_col = NAME_COLUMNS[table_name]
+    weight_col = WEIGHT_COLUMNS[table_name]
+    add_new = f"""
+        INSERT INTO daily_summary (record_type, date, name, spec, total_weight, total_amount, record_count)
+        VALUES ('{record_type}', NEW.date, NEW.{name_col}, NEW.spec, COALESCE(NEW.{weight_col}, 0), COALESCE(NEW.total_amount, 0), 1)
+        ON CONFLICT (record_type, date, name, spec) DO UPDATE SET
+            total_weight = total_weight + excluded.total_weight,
+            total_amount = total_amount + excluded.total_amount,
+            record_count = record_count + 1;"""
+    remove_old = f"""
+        UPDATE daily_summary SET
+            total_weight = total_weight - COALESCE(OLD.{weight_col}, 0),
+            total_amount = total_amount - COALESCE(OLD.total_amount, 0),
+            record_count = record_count - 1
+        WHERE record_type = '{record_type}' AND date = OLD.date AND name = OLD.{name_col} AND spec = OLD.spec;
+        DELETE FROM daily_summary
+        WHERE record_type = '{record_type}' AND date = OLD.date AND name = OLD.{name_col} AND spec = OLD.spec AND record_count <= 0;"""
+    return f"""
+CREATE TRIGGER IF NOT EXISTS trg_{table_name}_summary_insert AFTER INSERT ON {table_name}
+BEGIN{add_new}
+END;
+CREATE TRIGGER IF NOT EXISTS trg_{table_name}_summary_update AFTER UPDATE ON {table_name}
+BEGIN{remove_old}{add_new}
+END;
+CREATE TRIGGER IF NOT EXISTS trg_{table_name}_summary_delete AFTER DELETE ON {table_name}
+BEGIN{remove_old}
+END;
+"""
+
+
+def _version_trigger_sql(table_name):
+    # 每次增删改都递增表版本号，网页端据此判断页面是否需要重新生成
+    bump = f"UPDATE table_versions SET version = version + 1 WHERE table_name = '{table_name}';"
+    return "".join(f"""
+CREATE TRIGGER IF NOT EXISTS trg_{table_name}_version_{op.lower()} AFTER {op} ON {table_name}
+BEGIN {bump} END;""" for op in ('INSERT', 'UPDATE', 'DELETE'))
+
+
+def _change_trigger_sql(table_name):
+    # 每行增删改都写一条变更日志，新增和修改附带整行内容，监听方据此只更新受影响的行
+    row_json = "json_object('id', NEW.id, " + ", ".join(f"'{col}', NEW.{col}" for col in TABLE_COLUMNS[table_name]) + ")"
+    values = {
+        'INSERT': f"'insert', NEW.id, {row_json}",
+        'UPDATE': f"'update', NEW.id, {row_json}",
+        'DELETE': "'delete', OLD.id, NULL",
+    }
+    return "".join(f"""
+CREATE TRIGGER IF NOT EXISTS trg_{table_name}_changes_{op.lower()} AFTER {op} ON {table_name}
+BEGIN INSERT INTO change_log (table_name, op, record_id, record) VALUES ('{table_name}', {value}); END;""" for op, value in values.items())
+
+
+def _natural_key_index_sql(table_name):
+    return f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{table_name}_natural_key ON {table_name} (date, {NAME_COLUMNS[table_name]}, spec)"
+
+
+def _merge_duplicate_keys_sql(table_name):
+    # 建唯一约束前合并旧库中自然键重复的记录，与导入时的 sum 方式一致：
+    # 保留 ID 最小的一行，重量和金额累加到这一行，备注去重后拼接，其余行删除；汇总表由触发器同步更新
+    name_col = NAME_COLUMNS[table_name]
+    same_key = f"d.date = {table_name}.date AND d.{name_col} = {table_name}.{name_col} AND d.spec = {table_name}.spec"
+    sums = ", ".join(f"{col} = (SELECT SUM(COALESCE(d.{col}, 0)) FROM {table_name} d WHERE {same_key})"
+                     for col in SUM_COLUMNS[table_name])
+    keepers = f"SELECT MIN(id) FROM {table_name} GROUP BY date, {name_col}, spec"
+    return [
+        f"UPDATE {table_name} SET {sums}, "
+        f"notes = (SELECT group_concat(DISTINCT NULLIF(d.notes, '')) FROM {table_name} d WHERE {same_key}) "
+        f"WHERE id IN ({keepers} HAVING COUNT(*) > 1)",
+        f"DELETE FROM {table_name} WHERE id NOT IN ({keepers})",
+    ]
+
+
+def _upsert_sql(table_name, policy):
+    if policy not in CONFLICT_POLICIES:
+        raise ValueError(f"未知的冲突处理方式: {policy}")
+    columns = TABLE_COLUMNS[table_name]
+    key = natural_key_columns(table_name)
+    sql = (f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+           f"ON CONFLICT ({', '.join(key)}) ")
+    if policy == 'skip':
+        return sql + "DO NOTHING"
+    if policy == 'overwrite':
+        updates = [f"{col} = excluded.{col}" for col in columns if col not in key]
+    else:
+        updates = [f"{col} = COALESCE({col}, 0) + COALESCE(excluded.{col}, 0)" for col in SUM_COLUMNS[table_name]]
+    return sql + "DO UPDATE SET " + ", ".join(updates)
+
+
+def _summary_rebuild_sql():
+    selects = []
+    for table_name in TABLE_COLUMNS:
+        record_type = table_name.replace('_records', '')
+        selects.append(
+            f"SELECT '{record_type}', date, {NAME_COLUMNS[table_name]}, spec, "
+            f"COALESCE(SUM({WEIGHT_COLUMNS[table_name]}), 0), COALESCE(SUM(total_amount), 0), COUNT(*) "
+            f"FROM {table_name} GROUP BY date, {NAME_COLUMNS[table_name]}, spec"
+        )
+    return ("INSERT INTO daily_summary (record_type, date, name, spec, total_weight, total_amount, record_count) "
+            + " UNION ALL ".join(selects))
+
+# 汇总粒度对应的分组表达式：周从周一开始，月取每月 1 日
+SUMMARY_BUCKET_SQL = {
+    'day': "date",
+    'week': "date(date, '-6 days', 'weekday 1')",
+    'month': "strftime('%Y-%m-01', date)",
+}
+
+# SQLite 单条语句可绑定的参数个数有上限，IN 查询按此大小分块
+SQLITE_IN_CHUNK_SIZE = 500
+
+
+class SQLiteDatabaseManager(BaseDatabaseManager):
+    # 本地查询只需几毫秒，不缓存分页结果，也就不会读到其他进程写入前的旧数据
+    PAGE_CACHE_ENTRIES = 0
+
+    def __init__(self, db_name=None):
+        super().__init__()
+        db_name = db_name or "records.db"
+        if not os.path.isabs(db_name):
+            # 与 ConfigManager 一致，相对路径以项目根目录为基准
+            project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            db_name = os.path.join(project_root, db_name)
+        self.db_name = db_name
+        # 每个线程使用独立连接，配合 WAL 模式实现读写并发
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        with self._transaction() as conn:
+            conn.executescript(SCHEMA_SQL + "".join(_summary_trigger_sql(t) + _version_trigger_sql(t) + _change_trigger_sql(t) for t in TABLE_COLUMNS))
+        # 没有唯一约束的表不能批量写入：ON CONFLICT 找不到约束会直接报错
+        self._natural_key_tables = {t for t in TABLE_COLUMNS if self._ensure_natural_key_index(t)}
+        self._ensure_daily_summary()
+        logging.info(f"成功打开本地SQLite数据库: {self.db_name}")
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_name, check_same_thread=False, cached_statements=256)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _transaction(self):
+        # sqlite3.Connection 作为上下文管理器时，成功提交、异常回滚
+        return self._connection()
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections.clear()
+        self._local = threading.local()
+        logging.info("数据库会话结束。")
+
+    def backup(self, backup_path):
+        target = sqlite3.connect(backup_path)
+        try:
+            self._connection().backup(target)
+        finally:
+            target.close()
+
+    def _build_where(self, table_name, search_params):
+        clauses, params = [], []
+        if search_params.get('name'):
+            clauses.append(f"{self._name_column(table_name)} LIKE ?")
+            params.append(f"%{search_params['name']}%")
+        if search_params.get('start_date'):
+            clauses.append("date >= ?")
+            params.append(search_params['start_date'])
+        if search_params.get('end_date'):
+            clauses.append("date <= ?")
+            params.append(search_params['end_date'])
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def _ensure_natural_key_index(self, table_name):
+        try:
+            with self._transaction() as conn:
+                exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+                                      (f"uq_{table_name}_natural_key",)).fetchone()
+                if exists:
+                    return True
+                merged = 0
+                for sql in _merge_duplicate_keys_sql(table_name):
+                    merged = conn.execute(sql).rowcount
+                if merged:
+                    logging.warning(f"{table_name} 中有 {merged} 条日期、姓名、规格都相同的重复记录，已合并到同键的第一条记录")
+                conn.execute(_natural_key_index_sql(table_name))
+            return True
+        except sqlite3.Error as e:
+            logging.error(f"{table_name} 创建唯一约束失败，导入和离线同步将不可用: {e}")
+            return False
+
+    def _check_table(self, table_name):
+        if table_name not in TABLE_COLUMNS:
+            raise ValueError(f"未知的数据表: {table_name}")
+
+    def _clean_data(self, table_name, data):
+        # 只保留表中真实存在的列，列名不会拼接任何外部输入
+        return {k: v for k, v in data.items() if k in TABLE_COLUMNS[table_name]}
+
+    def get_user(self, username):
+        try:
+            row = self._connection().execute(
+                "SELECT id, username, password_hash, role FROM users WHERE username = ?", (username,)
+            ).fetchone()
+            return tuple(row) if row else None
+        except sqlite3.Error as e:
+            logging.error(f"获取用户 '{username}' 失败: {e}")
+            return None
+
+    def get_all_users(self):
+        try:
+            rows = self._connection().execute("SELECT id, username, role FROM users ORDER BY id").fetchall()
+            return [tuple(row) for row in rows]
+        except sqlite3.Error as e:
+            logging.error(f"获取所有用户失败: {e}")
+            return []
+
+    def add_user(self, username, password_hash, role='user'):
+        if self.get_user(username):
+            return False
+        try:
+            with self._transaction() as conn:
+                conn.execute("INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)", (username, password_hash, role))
+            return True
+        except sqlite3.Error as e:
+            logging.error(f"添加用户 '{username}' 失败: {e}")
+            return False
+
+    def delete_user(self, user_id):
+        try:
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
+            return True
+        except sqlite3.Error as e:
+            logging.error(f"删除用户ID '{user_id}' 失败: {e}")
+            return False
+
+    def _query_paged_records(self, table_name, page, page_size, search_params={}):
+        offset = (page - 1) * page_size
+        self._check_table(table_name)
+        where, params = self._build_where(table_name, search_params)
+        columns = ", ".join(('id',) + TABLE_COLUMNS[table_name])
+        rows = self._connection().execute(
+            f"SELECT {columns} FROM {table_name}{where} ORDER BY date DESC, id DESC LIMIT ? OFFSET ?",
+            params + [page_size, offset]
+        ).fetchall()
+        return [tuple(row) for row in rows]
+
+    def _query_records_page(self, table_name, page_size, search_params={}, cursor=None, direction='next', page=1, count_mode='exact'):
+        self._check_table(table_name)
+        where, params = self._build_where(table_name, search_params)
+        columns = ", ".join(('id',) + TABLE_COLUMNS[table_name])
+        if cursor:
+            # 键集分页：(date, id) 行值比较可直接走 (date, id) 索引
+            op, order = ('<', 'DESC') if direction == 'next' else ('>', 'ASC')
+            where += (" AND" if where else " WHERE") + f" (date, id) {op} (?, ?)"
+            rows = self._connection().execute(
+                f"SELECT {columns} FROM {table_name}{where} ORDER BY date {order}, id {order} LIMIT ?",
+                params + [cursor[0], int(cursor[1]), page_size + 1]
+            ).fetchall()
+        else:
+            rows = self._connection().execute(
+                f"SELECT {columns} FROM {table_name}{where} ORDER BY date DESC, id DESC LIMIT ? OFFSET ?",
+                params + [page_size + 1, (page - 1) * page_size]
+            ).fetchall()
+        # 本地库统计总数代价很小，始终返回精确值
+        total = self._query_record_count(table_name, search_params) if count_mode else None
+        return self._build_page_result([tuple(row) for row in rows], page_size, cursor, direction, page, total)
+
+    def iter_record_chunks(self, table_name, search_params={}, chunk_size=1000):
+        self._check_table(table_name)
+        base_where, base_params = self._build_where(table_name, search_params)
+        cursor = None
+        while True:
+            where, params = base_where, list(base_params)
+            if cursor:
+                where += (" AND" if where else " WHERE") + " (date, id) > (?, ?)"
+                params += list(cursor)
+            rows = self._connection().execute(
+                f"SELECT * FROM {table_name}{where} ORDER BY date, id LIMIT ?", params + [chunk_size]
+            ).fetchall()
+            if rows:
+                yield [dict(row) for row in rows]
+            if len(rows) < chunk_size:
+                return
+            cursor = (rows[-1]['date'], rows[-1]['id'])
+
+    def get_search_overview(self, table_name, search_params={}):
+        try:
+            self._check_table(table_name)
+            name_col = self._name_column(table_name)
+            where, params = self._build_where(table_name, search_params)
+            conn = self._connection()
+            count, min_date, max_date = conn.execute(f"SELECT COUNT(*), MIN(date), MAX(date) FROM {table_name}{where}", params).fetchone()
+            names = [row[0] for row in conn.execute(f"SELECT DISTINCT {name_col} FROM {table_name}{where} LIMIT 2", params)]
+            return {'count': count, 'names': names, 'min_date': min_date, 'max_date': max_date}
+        except (sqlite3.Error, ValueError) as e:
+            logging.error(f"获取 {table_name} 搜索结果概况失败: {e}")
+            return None
+
+    def _query_record_count(self, table_name, search_params={}):
+        self._check_table(table_name)
+        where, params = self._build_where(table_name, search_params)
+        return self._connection().execute(f"SELECT COUNT(*) FROM {table_name}{where}", params).fetchone()[0]
+
+    def get_table_version(self, table_name):
+        try:
+            row = self._connection().execute("SELECT version FROM table_versions WHERE table_name = ?", (table_name,)).fetchone()
+            return row[0] if row else 0
+        except sqlite3.Error as e:
+            logging.error(f"获取 {table_name} 版本号失败: {e}")
+            return None
+
+    def fetch_changes(self, since_seq, limit=500):
+        try:
+            rows = self._connection().execute(
+                "SELECT seq, table_name, op, record_id, record FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?",
+                (int(since_seq or 0), int(limit))).fetchall()
+            return [{'seq': row['seq'], 'table_name': row['table_name'], 'op': row['op'], 'record_id': row['record_id'],
+                     'record': json.loads(row['record']) if row['record'] else None} for row in rows]
+        except (sqlite3.Error, ValueError) as e:
+            logging.error(f"读取变更日志失败: {e}")
+            return None
+
+    def get_latest_change_seq(self):
+        try:
+            return self._connection().execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+        except sqlite3.Error as e:
+            logging.error(f"读取变更日志序号失败: {e}")
+            return None
+
+    def prune_change_log(self, keep=CHANGE_LOG_RETENTION):
+        try:
+            with self._transaction() as conn:
+                cursor = conn.execute("DELETE FROM change_log WHERE seq <= (SELECT MAX(seq) FROM change_log) - ?", (int(keep),))
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            logging.error(f"清理变更日志失败: {e}")
+            return 0
+
+    def get_record(self, table_name, record_id):
+        try:
+            self._check_table(table_name)
+            row = self._connection().execute(f"SELECT * FROM {table_name} WHERE id = ?", (int(record_id),)).fetchone()
+            return dict(row) if row else None
+        except (sqlite3.Error, ValueError) as e:
+            logging.error(f"获取 {table_name} 记录ID {record_id} 失败: {e}")
+            return None
+
+    def record_exists(self, table_name, record_id):
+        self._check_table(table_name)
+        row = self._connection().execute(f"SELECT 1 FROM {table_name} WHERE id = ?", (int(record_id),)).fetchone()
+        return row is not None
+
+    def get_last_change(self, table_name, record_id):
+        self._check_table(table_name)
+        row = self._connection().execute(
+            "SELECT seq, changed_at FROM change_log WHERE table_name = ? AND record_id = ? ORDER BY seq DESC LIMIT 1",
+            (table_name, int(record_id))).fetchone()
+        if row is None:
+            return None
+        # CURRENT_TIMESTAMP 为 UTC 时间
+        return {'seq': row['seq'], 'changed_at': pd.Timestamp(row['changed_at'], tz='UTC').timestamp()}
+
+    def add_record(self, table_name, data):
+        try:
+            self._check_table(table_name)
+            clean_data = {k: v for k, v in self._clean_data(table_name, data).items() if v is not None}
+            columns = ", ".join(clean_data)
+            placeholders = ", ".join("?" for _ in clean_data)
+            with self._transaction() as conn:
+                conn.execute(f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})", list(clean_data.values()))
+            self._remember_written_values(table_name, [clean_data])
+            return True
+        except (sqlite3.Error, ValueError) as e:
+            logging.error(f"向 {table_name} 添加记录失败: {e}")
+            return False
+
+    def update_record(self, table_name, record_id, data):
+        try:
+            self._check_table(table_name)
+            clean_data = self._clean_data(table_name, data)
+            if not clean_data:
+                return True
+            assignments = ", ".join(f"{k} = ?" for k in clean_data)
+            with self._transaction() as conn:
+                conn.execute(f"UPDATE {table_name} SET {assignments} WHERE id = ?", list(clean_data.values()) + [int(record_id)])
+            self._remember_written_values(table_name, [clean_data])
+            return True
+        except (sqlite3.Error, ValueError) as e:
+            logging.error(f"更新 {table_name} 记录ID {record_id} 失败: {e}")
+            return False
+
+    def delete_record(self, table_name, record_id):
+        try:
+            self._check_table(table_name)
+            with self._transaction() as conn:
+                conn.execute(f"DELETE FROM {table_name} WHERE id = ?", (int(record_id),))
+            self._page_cache.invalidate(table_name)
+            return True
+        except (sqlite3.Error, ValueError) as e:
+            logging.error(f"删除记录ID '{record_id}' 失败: {e}")
+            return False
+
+    def _query_distinct_values(self, table_name, column_name):
+        self._check_table(table_name)
+        if column_name not in TABLE_COLUMNS[table_name]:
+            raise ValueError(f"未知的列: {column_name}")
+        rows = self._connection().execute(
+            f"SELECT DISTINCT {column_name} FROM {table_name} WHERE {column_name} IS NOT NULL AND {column_name} != '' ORDER BY {column_name}"
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def get_records_by_ids(self, table_name, ids):
+        try:
+            self._check_table(table_name)
+            ids = [int(i) for i in ids]
+            frames = []
+            conn = self._connection()
+            for i in range(0, len(ids), SQLITE_IN_CHUNK_SIZE):
+                chunk = ids[i:i + SQLITE_IN_CHUNK_SIZE]
+                placeholders = ", ".join("?" for _ in chunk)
+                frames.append(pd.read_sql_query(f"SELECT * FROM {table_name} WHERE id IN ({placeholders})", conn, params=chunk))
+            return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        except (sqlite3.Error, ValueError) as e:
+            logging.error(f"根据IDs获取 {table_name} 记录失败: {e}")
+            return pd.DataFrame()
+
+    def get_custom_summary(self, record_type, start_date, end_date, name=None, granularity='day'):
+        try:
+            if granularity not in SUMMARY_BUCKET_SQL:
+                raise ValueError(f"不支持的汇总粒度: {granularity}")
+            bucket = SUMMARY_BUCKET_SQL[granularity]
+            # 读取日汇总表，代价只与天数（及姓名、规格组合数）相关
+            sql = ("SELECT {0} AS date, SUM(total_amount) AS total_revenue, SUM(total_weight) AS total_weight "
+                   "FROM daily_summary WHERE record_type = ? AND date >= ? AND date <= ?").format(bucket)
+            params = [record_type, start_date, end_date]
+            if name and name != '全部':
+                sql += " AND name = ?"
+                params.append(name)
+            sql += f" GROUP BY {bucket} ORDER BY {bucket}"
+            summary_df = pd.read_sql_query(sql, self._connection(), params=params)
+            if summary_df.empty:
+                return pd.DataFrame()
+            summary_df['date'] = pd.to_datetime(summary_df['date'])
+            return summary_df
+        except (sqlite3.Error, ValueError) as e:
+            logging.error(f"获取自定义汇总数据失败: {e}")
+            return pd.DataFrame()
+
+    def _ensure_daily_summary(self):
+        # 旧库第一次打开时汇总表为空，按现有记录补建一次
+        conn = self._connection()
+        if conn.execute("SELECT 1 FROM daily_summary LIMIT 1").fetchone():
+            return
+        if any(conn.execute(f"SELECT 1 FROM {t} LIMIT 1").fetchone() for t in TABLE_COLUMNS):
+            self.rebuild_daily_summary()
+
+    def rebuild_daily_summary(self):
+        try:
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM daily_summary")
+                conn.execute(_summary_rebuild_sql())
+                row_count = conn.execute("SELECT COUNT(*) FROM daily_summary").fetchone()[0]
+            logging.info(f"日汇总表已重建，共 {row_count} 行。")
+            return row_count
+        except sqlite3.Error as e:
+            logging.error(f"重建日汇总表失败: {e}")
+            return None
+
+    def get_summary_totals(self, record_type, start_date=None, end_date=None, name=None):
+        sql = ("SELECT COALESCE(SUM(total_weight), 0), COALESCE(SUM(total_amount), 0), COALESCE(SUM(record_count), 0) "
+               "FROM daily_summary WHERE record_type = ?")
+        params = [record_type]
+        if start_date:
+            sql += " AND date >= ?"
+            params.append(start_date)
+        if end_date:
+            sql += " AND date <= ?"
+            params.append(end_date)
+        if name and name != '全部':
+            sql += " AND name = ?"
+            params.append(name)
+        try:
+            total_weight, total_amount, record_count = self._connection().execute(sql, params).fetchone()
+            return {'total_weight': total_weight, 'total_amount': total_amount, 'record_count': record_count}
+        except sqlite3.Error as e:
+            logging.error(f"获取汇总合计失败: {e}")
+            return {'total_weight': 0, 'total_amount': 0, 'record_count': 0}
+
+    def get_record_by_key(self, table_name, date, name, spec):
+        try:
+            self._check_table(table_name)
+            row = self._connection().execute(
+                f"SELECT * FROM {table_name} WHERE date = ? AND {self._name_column(table_name)} = ? AND spec = ?",
+                (str(date), name, spec)).fetchone()
+            return dict(row) if row else None
+        except (sqlite3.Error, ValueError) as e:
+            logging.error(f"按日期、姓名、规格查找 {table_name} 记录失败: {e}")
+            return None
+
+    def get_records_by_keys(self, table_name, keys):
+        try:
+            self._check_table(table_name)
+            keys = [(str(d), n, s) for d, n, s in keys]
+            records = []
+            conn = self._connection()
+            chunk_size = SQLITE_IN_CHUNK_SIZE // 3
+            for i in range(0, len(keys), chunk_size):
+                chunk = keys[i:i + chunk_size]
+                values = ", ".join("(?, ?, ?)" for _ in chunk)
+                rows = conn.execute(
+                    f"SELECT * FROM {table_name} WHERE (date, {self._name_column(table_name)}, spec) IN (VALUES {values})",
+                    [v for key in chunk for v in key]).fetchall()
+                records.extend(dict(row) for row in rows)
+            return records
+        except (sqlite3.Error, ValueError) as e:
+            logging.error(f"按自然键批量查找 {table_name} 记录失败: {e}")
+            return None
+
+    def upsert_records(self, table_name, records, policy='skip', batch_key=None):
+        if not records:
+            return {'inserted': 0, 'updated': 0, 'skipped': 0}
+        try:
+            self._check_table(table_name)
+            if table_name not in self._natural_key_tables:
+                logging.error(f"批量写入 {table_name} 失败: 该表缺少日期、姓名、规格的唯一约束，请查看启动日志")
+                return None
+            columns = TABLE_COLUMNS[table_name]
+            with self._transaction() as conn:
+                if batch_key and conn.execute("INSERT OR IGNORE INTO import_batches (batch_key) VALUES (?)", (batch_key,)).rowcount == 0:
+                    return {'inserted': 0, 'updated': 0, 'skipped': 0}
+                max_id = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table_name}").fetchone()[0]
+                cursor = conn.executemany(_upsert_sql(table_name, policy), [tuple(record.get(col) for col in columns) for record in records])
+                changed = max(cursor.rowcount, 0)
+                # 新插入的行 ID 都大于写入前的最大 ID，其余变更的行为被覆盖或累加的已有记录
+                inserted = conn.execute(f"SELECT COUNT(*) FROM {table_name} WHERE id > ?", (max_id,)).fetchone()[0]
+            self._remember_written_values(table_name, records)
+            return {'inserted': inserted, 'updated': changed - inserted, 'skipped': len(records) - changed}
+        except (sqlite3.Error, ValueError) as e:
+            logging.error(f"批量写入 {table_name} 失败: {e}")
+            return None
+
+    def bulk_insert_records(self, table_name, records):
+        if not records:
+            return 0
+        try:
+            self._check_table(table_name)
+            columns = TABLE_COLUMNS[table_name]
+            placeholders = ", ".join("?" for _ in columns)
+            with self._transaction() as conn:
+                conn.executemany(
+                    f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})",
+                    [tuple(record.get(col) for col in columns) for record in records]
+                )
+            self._remember_written_values(table_name, records)
+            return len(records)
+        except (sqlite3.Error, ValueError) as e:
+            logging.error(f"批量插入失败: {e}")
+            return 0
@@ -0,0 +1,40 @@
+# 文件路径: src/startup_timer.py
+# 版本：记录启动各阶段的耗时，启动完成后写入一行日志，便于发现变慢的环节
+
+import time
+import logging
+import threading
+
+
+class StartupTimer:
+    """按顺序记录启动里程碑，report() 输出相邻里程碑之间的耗时。"""
+
+    # 该阶段是用户输入用户名密码的时间，不计入启动总耗时
+    USER_WAIT_STAGE = "等待登录"
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self._marks = []
+        self._reported = False
+        self._lock = threading.Lock()
+
+    def mark(self, stage):
+        # stage 为到达该里程碑前这一阶段的名称；可在任何线程中调用
+        with self._lock:
+            self._marks.append((stage, time.perf_counter()))
+
+    def report(self):
+        # 只输出一次，返回 {阶段: 毫秒}
+        with self._lock:
+            if self._reported:
+                return None
+            self._reported = True
+            marks = sorted(self._marks, key=lambda m: m[1])
+        durations = {}
+        previous = self._start
+        for stage, at in marks:
+            durations[stage] = round((at - previous) * 1000)
+            previous = at
+        total = sum(ms for stage, ms in durations.items() if stage != self.USER_WAIT_STAGE)
+        logging.info("启动耗时(毫秒): " + ", ".join(f"{stage} {ms}" for stage, ms in durations.items()) + f"; 合计(不含登录输入) {total}")
+        return durations
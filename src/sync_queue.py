@@ -0,0 +1,512 @@
+# 文件路径: src/sync_queue.py
+# 版本：离线优先的写后同步队列，写操作先落本地日志，后台线程批量同步到云端
+#
+# 冲突处理规则：
+#   1. 同一条记录在队列中的多次修改按写入顺序合并，后写覆盖先写；
+#   2. 队列中已被删除的记录，之前尚未同步的修改直接丢弃；
+#   3. 修改与删除按时间戳判断：云端记录在本地操作之后被其他终端修改过（以变更日志中的时间为准），
+#      或修改的记录在云端已被删除，转为“冲突”状态，由用户选择以本地为准或丢弃；
+#      删除云端已不存在的记录视为已完成；
+#   4. 新增的记录与队列中尚未同步的新增记录日期、姓名、规格都相同时，直接拒绝，由界面提示；
+#      与云端已有记录相同时（离线期间其他终端已录入），转为“冲突”状态保留在日志中，
+#      不阻塞其他操作，由用户在状态栏打开同步问题窗口选择累加、覆盖或丢弃。
+#
+# 失败处理：网络不通时整个队列退避重试，不计入各操作的重试次数；云端可以访问但某条操作本身失败
+# （写入失败、查询报错、数据不合法等任何异常）时，只推迟这一条（及同一记录之后的操作），其余操作照常同步；重试 MAX_ATTEMPTS 次仍失败的转为“失败”状态，
+# 由用户在同步问题窗口重试或丢弃。
+# 时间戳比较使用本机时间与数据库服务器时间，两者应保持同步（误差远小于两次录入的间隔）。
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import datetime
+import threading
+from .db_base import natural_key_columns
+
+JOURNAL_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS pending_ops (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name TEXT NOT NULL,
+    op TEXT NOT NULL,
+    record_id TEXT,
+    payload TEXT,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    last_error TEXT,
+    policy TEXT,
+    next_attempt_at REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_pending_ops_status_seq ON pending_ops (status, seq);
+CREATE INDEX IF NOT EXISTS idx_pending_ops_record ON pending_ops (table_name, record_id, seq);
+-- 本终端同步到云端的最后一次修改在变更日志中的序号，判断冲突时不把自己的修改当成其他终端的
+CREATE TABLE IF NOT EXISTS own_changes (
+    table_name TEXT NOT NULL,
+    record_id TEXT NOT NULL,
+    change_seq INTEGER NOT NULL,
+    PRIMARY KEY (table_name, record_id)
+);
+"""
+
+class RemoteUnavailable(Exception):
+    """云端暂时无法访问，整个队列退避后重试。"""
+
+
+class OperationFailed(Exception):
+    """云端可以访问，但这一条操作写入失败。"""
+
+
+class SyncJournal:
+    def __init__(self, journal_path):
+        self.journal_path = journal_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(journal_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(JOURNAL_SCHEMA_SQL)
+
+    def append(self, table_name, op, record_id=None, payload=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO pending_ops (table_name, op, record_id, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                (table_name, op, None if record_id is None else str(record_id),
+                 json.dumps(payload, ensure_ascii=False) if payload is not None else None, time.time())
+            )
+
+    def peek(self, limit, now=None):
+        # 取出已到重试时间的操作；同一记录前面还有未完成（推迟、冲突、失败）的操作时，后面的操作先不取
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM pending_ops p WHERE status = 'pending' AND next_attempt_at <= ? "
+                "AND NOT (p.record_id IS NOT NULL AND EXISTS ("
+                "    SELECT 1 FROM pending_ops q WHERE q.table_name = p.table_name AND q.record_id = p.record_id "
+                "    AND q.seq < p.seq AND (q.status != 'pending' OR q.next_attempt_at > ?))) "
+                "ORDER BY seq LIMIT ?", (now, now, limit)
+            ).fetchall()
+        return self._decode(rows)
+
+    def _decode(self, rows):
+        return [dict(row, payload=json.loads(row['payload']) if row['payload'] else None) for row in rows]
+
+    def pending_inserts(self, table_name):
+        # 尚未写入云端的新增记录（含冲突、失败待处理的），用于新增前查重
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM pending_ops WHERE table_name = ? AND op = 'insert' ORDER BY seq",
+                (table_name,)).fetchall()
+        return self._decode(rows)
+
+    def problems(self):
+        # 需要用户处理的操作：与云端冲突的和多次重试仍失败的
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM pending_ops WHERE status IN ('conflict', 'failed') ORDER BY seq").fetchall()
+        return self._decode(rows)
+
+    def get(self, seq):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM pending_ops WHERE seq = ?", (seq,)).fetchone()
+        return self._decode([row])[0] if row else None
+
+    def mark_conflict(self, seqs, message):
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE pending_ops SET status = 'conflict', last_error = ? WHERE seq = ?",
+                                   [(message, seq) for seq in seqs])
+
+    def requeue(self, seq, policy=None):
+        # 重新排队并清零重试次数；policy 为处理冲突时用户选择的方式，同步时按该方式写入
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE pending_ops SET status = 'pending', attempts = 0, next_attempt_at = 0, last_error = NULL, policy = ? "
+                "WHERE seq = ?", (policy, seq))
+
+    def remove(self, seqs):
+        if not seqs:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM pending_ops WHERE seq = ?", [(s,) for s in seqs])
+
+    def mark_failed_attempt(self, seqs, error, max_attempts, retry_delay):
+        # 推迟 retry_delay 秒后再试，重试次数用完转为 failed，不再阻塞其他操作
+        with self._lock, self._conn:
+            for seq in seqs:
+                self._conn.execute(
+                    "UPDATE pending_ops SET attempts = attempts + 1, last_error = ?, next_attempt_at = ?, "
+                    "status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE status END WHERE seq = ?",
+                    (error, time.time() + retry_delay, max_attempts, seq)
+                )
+
+    def own_change(self, table_name, record_id):
+        with self._lock:
+            row = self._conn.execute("SELECT change_seq FROM own_changes WHERE table_name = ? AND record_id = ?",
+                                     (table_name, str(record_id))).fetchone()
+        return row[0] if row else None
+
+    def remember_own_change(self, table_name, record_id, change_seq):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO own_changes (table_name, record_id, change_seq) VALUES (?, ?, ?)",
+                               (table_name, str(record_id), change_seq))
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM pending_ops GROUP BY status").fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SyncedDatabaseManager:
+    """在任意 DatabaseManager 外包一层：读操作直接转发，增删改先写入本地日志立即返回。"""
+
+    BATCH_SIZE = 100
+    MAX_ATTEMPTS = 8
+    MAX_BACKOFF_SECONDS = 60
+    IDLE_INTERVAL_SECONDS = 5
+    # 队列中尚未同步的新增记录没有云端 ID，查重冲突时用它代替
+    PENDING_RECORD_ID = '待同步'
+    # 处理同步问题时可选的方式：重试 / 累加到云端记录（仅新增）/ 以本地为准覆盖云端 / 丢弃本地操作
+    RESOLVE_ACTIONS = ('retry', 'sum', 'overwrite', 'discard')
+
+    def __init__(self, remote, journal_path):
+        self.remote = remote
+        self.journal = SyncJournal(journal_path)
+        self.last_sync_time = None
+        self.last_error = None
+        # 每次成功同步后递增，界面据此判断是否需要刷新对应的表
+        self.sync_version = 0
+        self.synced_tables = set()
+        self._status_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._failures = 0
+        self._worker = threading.Thread(target=self._run, name="sync-worker", daemon=True)
+        self._worker.start()
+        logging.info(f"写后同步队列已启动，本地日志: {journal_path}")
+
+    def __getattr__(self, name):
+        return getattr(self.remote, name)
+
+    # --- 写操作：只写本地日志 ---
+
+    def add_record(self, table_name, data):
+        clean_data = {k: v for k, v in data.items() if v is not None}
+        # 只查本地日志，不访问网络，保存仍然是即时的；与云端记录的冲突在同步时发现
+        if self._find_pending_insert(table_name, clean_data) is not None:
+            return False
+        self.remote._remember_written_values(table_name, [clean_data])
+        return self._enqueue(table_name, 'insert', None, clean_data)
+
+    def update_record(self, table_name, record_id, data):
+        if self._find_pending_insert(table_name, data) is not None:
+            return False
+        self.remote._remember_written_values(table_name, [data])
+        return self._enqueue(table_name, 'update', record_id, data)
+
+    def get_record_by_key(self, table_name, date, name, spec):
+        key_columns = natural_key_columns(table_name)
+        pending = self._find_pending_insert(table_name, dict(zip(key_columns, (date, name, spec))))
+        if pending is not None:
+            return pending
+        return self.remote.get_record_by_key(table_name, date, name, spec)
+
+    def _find_pending_insert(self, table_name, data):
+        # 与队列中尚未同步的新增记录自然键相同时返回该记录（ID 为 PENDING_RECORD_ID），否则返回 None
+        key_columns = natural_key_columns(table_name)
+        if any(data.get(col) is None for col in key_columns):
+            return None
+        key = _record_key(key_columns, data)
+        try:
+            pending = self.journal.pending_inserts(table_name)
+        except sqlite3.Error as e:
+            logging.error(f"读取本地同步日志失败: {e}")
+            return None
+        for op in pending:
+            if _record_key(key_columns, op['payload']) == key:
+                return dict(op['payload'], id=self.PENDING_RECORD_ID)
+        return None
+
+    def delete_record(self, table_name, record_id):
+        return self._enqueue(table_name, 'delete', record_id, None)
+
+    def _enqueue(self, table_name, op, record_id, payload):
+        try:
+            self.journal.append(table_name, op, record_id, payload)
+        except sqlite3.Error as e:
+            logging.error(f"写入本地同步日志失败: {e}")
+            return False
+        self._wake.set()
+        return True
+
+    # --- 状态 ---
+
+    def get_sync_status(self):
+        counts = self.journal.counts()
+        with self._status_lock:
+            return {
+                'pending': counts.get('pending', 0),
+                'failed': counts.get('failed', 0),
+                'conflict': counts.get('conflict', 0),
+                'last_sync_time': self.last_sync_time,
+                'last_error': self.last_error,
+                'sync_version': self.sync_version,
+            }
+
+    def get_sync_problems(self):
+        # 冲突和失败的操作列表，供界面展示
+        return self.journal.problems()
+
+    def resolve_sync_problem(self, seq, action):
+        # action 为 RESOLVE_ACTIONS 之一：retry 原样重试，sum / overwrite 按该方式重新同步，discard 丢弃本地操作
+        if action not in self.RESOLVE_ACTIONS:
+            raise ValueError(f"未知的处理方式: {action}")
+        op = self.journal.get(seq)
+        if op is None:
+            return
+        if action == 'sum' and op['op'] != 'insert':
+            raise ValueError("只有新增记录可以累加到云端记录")
+        # 同一记录的修改与删除在同步时是合并处理的，也一起处理
+        seqs = [seq] if op['op'] == 'insert' else [
+            p['seq'] for p in self.journal.problems()
+            if p['op'] != 'insert' and p['table_name'] == op['table_name'] and p['record_id'] == op['record_id']]
+        if action == 'discard':
+            self.journal.remove(seqs)
+        else:
+            for problem_seq in seqs:
+                self.journal.requeue(problem_seq, None if action == 'retry' else action)
+            self._wake.set()
+
+    def pop_synced_tables(self):
+        with self._status_lock:
+            tables, self.synced_tables = self.synced_tables, set()
+        return tables
+
+    def close(self):
+        self._stopping.set()
+        self._wake.set()
+        self._worker.join(timeout=5)
+        self.journal.close()
+        self.remote.close()
+
+    # --- 后台同步 ---
+
+    def _run(self):
+        while not self._stopping.is_set():
+            ops = self.journal.peek(self.BATCH_SIZE)
+            if not ops:
+                self._wake.wait(self.IDLE_INTERVAL_SECONDS)
+                self._wake.clear()
+                continue
+            try:
+                self._flush(ops)
+                self._failures = 0
+            except Exception as e:
+                self._failures += 1
+                delay = min(2 ** self._failures, self.MAX_BACKOFF_SECONDS)
+                with self._status_lock:
+                    self.last_error = str(e)
+                logging.warning(f"同步到云端失败，{delay} 秒后重试: {e}")
+                # 被停止时不再等待退避，剩余操作留在日志中下次启动继续同步
+                self._stopping.wait(delay)
+
+    def _coalesce(self, ops):
+        # 按 (表, 记录ID) 合并修改与删除，插入保持原顺序；合并后的操作沿用最早一条的时间戳
+        merged = []
+        latest = {}
+        for op in ops:
+            if op['op'] == 'insert':
+                merged.append(dict(op, seqs=[op['seq']]))
+                continue
+            key = (op['table_name'], op['record_id'])
+            previous = latest.get(key)
+            if previous is None or previous['op'] == 'delete':
+                entry = dict(op, seqs=[op['seq']])
+                latest[key] = entry
+                merged.append(entry)
+            elif op['op'] == 'delete':
+                previous.update(op='delete', payload=None)
+                previous['seqs'].append(op['seq'])
+            else:
+                previous['payload'] = {**previous['payload'], **op['payload']}
+                previous['seqs'].append(op['seq'])
+        return merged
+
+    def _flush(self, ops):
+        merged = self._coalesce(ops)
+        tables = set()
+        try:
+            self._apply(merged, tables)
+        finally:
+            if tables:
+                with self._status_lock:
+                    self.synced_tables |= tables
+                    self.sync_version += 1
+        with self._status_lock:
+            self.last_sync_time = datetime.datetime.now()
+            self.last_error = None
+
+    def _apply(self, merged, tables):
+        i = 0
+        while i < len(merged):
+            op = merged[i]
+            table_name = op['table_name']
+            if op['op'] == 'insert':
+                # 连续的同表、同处理方式的插入合并成一次批量写入
+                batch = [op]
+                while (i + 1 < len(merged) and merged[i + 1]['op'] == 'insert' and merged[i + 1]['table_name'] == table_name
+                       and merged[i + 1]['policy'] == op['policy']):
+                    i += 1
+                    batch.append(merged[i])
+                if len(batch) == 1:
+                    self._isolate(table_name, lambda: self._apply_inserts(table_name, batch), op)
+                else:
+                    try:
+                        self._apply_inserts(table_name, batch)
+                    except (RemoteUnavailable, sqlite3.Error):
+                        raise
+                    except Exception:
+                        # 整批失败时逐条重试，只有真正出错的那一条被推迟
+                        for single in batch:
+                            self._isolate(table_name, lambda: self._apply_inserts(table_name, [single]), single)
+            else:
+                self._isolate(table_name, lambda: self._apply_change(table_name, op), op)
+            tables.add(table_name)
+            i += 1
+
+    def _isolate(self, table_name, apply, op):
+        # 执行一条操作；云端可访问而这条操作失败时（包括查询报错、数据不合法等任何异常）只推迟它自己，
+        # 计入重试次数；网络不通或本地日志读写出错时交给 _run 整体退避
+        try:
+            apply()
+        except (RemoteUnavailable, sqlite3.Error):
+            raise
+        except Exception as e:
+            if not self._remote_reachable(table_name):
+                raise RemoteUnavailable(str(e))
+            delay = min(2 ** (op['attempts'] + 1), self.MAX_BACKOFF_SECONDS)
+            logging.warning(f"同步操作失败，{delay} 秒后单独重试: {e}")
+            self.journal.mark_failed_attempt(op['seqs'], str(e), self.MAX_ATTEMPTS, delay)
+
+    def _remote_reachable(self, table_name):
+        try:
+            return self.remote.get_table_version(table_name) is not None
+        except Exception as e:
+            logging.warning(f"检查云端连接失败: {e}")
+            return False
+
+    def _apply_change(self, table_name, op):
+        record_id = op['record_id']
+        force = op['policy'] == 'overwrite'
+        if not self.remote.record_exists(table_name, record_id):
+            if op['op'] == 'delete':
+                # 其他终端已经删除，结果与本地期望一致
+                self.journal.remove(op['seqs'])
+            elif force:
+                self._restore_deleted(table_name, op)
+            else:
+                self._park_conflict(table_name, op, f"记录ID {record_id} 在云端已被其他终端删除")
+            return
+        if not force:
+            last = self.remote.get_last_change(table_name, record_id)
+            if (last and last['seq'] != self.journal.own_change(table_name, record_id)
+                    and last['changed_at'] > op['created_at']):
+                changed_at = datetime.datetime.fromtimestamp(last['changed_at']).strftime('%Y-%m-%d %H:%M:%S')
+                self._park_conflict(table_name, op, f"记录ID {record_id} 在本地修改之后已被其他终端修改（{changed_at}）")
+                return
+        if op['op'] == 'update':
+            if not self.remote.update_record(table_name, record_id, op['payload']):
+                raise OperationFailed(f"更新 {table_name} 记录ID {record_id} 失败")
+            last = self.remote.get_last_change(table_name, record_id)
+            if last:
+                self.journal.remember_own_change(table_name, record_id, last['seq'])
+        elif not self.remote.delete_record(table_name, record_id):
+            raise OperationFailed(f"删除 {table_name} 记录ID {record_id} 失败")
+        self.journal.remove(op['seqs'])
+
+    def _restore_deleted(self, table_name, op):
+        # 以本地为准：云端已删除的记录按本地修改后的内容重新新增（按自然键覆盖）
+        if any(op['payload'].get(col) is None for col in natural_key_columns(table_name)):
+            logging.warning(f"{table_name} 记录ID {op['record_id']} 已被删除，本地修改内容不完整，无法恢复，已丢弃。")
+        elif self.remote.upsert_records(table_name, [op['payload']], 'overwrite') is None:
+            raise OperationFailed(f"恢复 {table_name} 记录ID {op['record_id']} 失败")
+        self.journal.remove(op['seqs'])
+
+    def _apply_inserts(self, table_name, batch):
+        if batch[0]['policy'] == 'sum':
+            # 用户已选择累加到云端的同键记录。累加不幂等：逐条写入并带上该操作唯一的批次键，
+            # 响应丢失后重试时数据库识别出已写入过，不会再累加一次
+            for o in batch:
+                if self.remote.upsert_records(table_name, [o['payload']], 'sum', f"sync:{o['seq']}:{o['created_at']!r}") is None:
+                    raise OperationFailed(f"累加写入 {table_name} 失败")
+                self.journal.remove([o['seq']])
+            return
+        if batch[0]['policy']:
+            # 用户已选择覆盖云端的同键记录
+            if self.remote.upsert_records(table_name, [o['payload'] for o in batch], batch[0]['policy']) is None:
+                raise OperationFailed(f"批量写入 {table_name} 失败")
+            self.journal.remove([o['seq'] for o in batch])
+            return
+        key_columns = natural_key_columns(table_name)
+        existing = self._existing_by_key(table_name, key_columns, batch)
+        fresh, keys = [], set()
+        for o in batch:
+            key = _record_key(key_columns, o['payload'])
+            if key in existing:
+                self._park_conflict(table_name, o, f"云端已有同一天、同一人、同一规格的记录（ID {existing[key]['id']}）")
+            elif key in keys:
+                self._park_conflict(table_name, o, "队列中有同一天、同一人、同一规格的新增记录")
+            else:
+                keys.add(key)
+                fresh.append(o)
+        if not fresh:
+            return
+        counts = self.remote.upsert_records(table_name, [o['payload'] for o in fresh], 'skip')
+        if counts is None:
+            raise OperationFailed(f"批量插入 {table_name} 失败")
+        if counts['skipped']:
+            # 查重之后其他终端又写入了相同的键：与云端内容不同的行同样转为冲突，不静默丢弃
+            current = self._existing_by_key(table_name, key_columns, fresh)
+            written = []
+            for o in fresh:
+                remote = current.get(_record_key(key_columns, o['payload']))
+                if remote is not None and not _same_values(remote, o['payload']):
+                    self._park_conflict(table_name, o, f"云端已有同一天、同一人、同一规格的记录（ID {remote['id']}）")
+                else:
+                    written.append(o)
+            fresh = written
+        self.journal.remove([o['seq'] for o in fresh])
+
+    def _existing_by_key(self, table_name, key_columns, batch):
+        records = self.remote.get_records_by_keys(table_name, [tuple(o['payload'].get(col) for col in key_columns) for o in batch])
+        if records is None:
+            raise OperationFailed(f"查询 {table_name} 已有记录失败")
+        return {_record_key(key_columns, r): r for r in records}
+
+    def _park_conflict(self, table_name, op, message):
+        logging.warning(f"同步冲突: {table_name} {message}，本地{op['op']}操作已转为待处理。")
+        self.journal.mark_conflict(op['seqs'], message)
+
+
+def _record_key(key_columns, record):
+    return tuple(str(record.get(col)) for col in key_columns)
+
+
+def _same_values(remote, payload):
+    # payload 中的每个字段都与云端记录相同（数值按浮点比较）
+    for col, value in payload.items():
+        other = remote.get(col)
+        if isinstance(value, (int, float)) and isinstance(other, (int, float)):
+            if abs(value - other) > 1e-9:
+                return False
+        elif str(value) != str(other):
+            return False
+    return True
+
+
+def default_journal_path():
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(project_root, "sync_journal.db")
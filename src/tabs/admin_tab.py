@@ -4,9 +4,9 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import os
-import shutil
 import datetime
 from ..utils import hash_password
+from ..task_executor import PRIORITY_UI, PRIORITY_BACKGROUND
 
 class AdminTab(ttk.Frame):
     def __init__(self, parent, context):
@@ -47,6 +47,7 @@ class AdminTab(ttk.Frame):
         ttk.Button(config_button_frame, text="保存配置", command=self._save_config_from_form).pack(side="left", padx=5)
         ttk.Button(config_button_frame, text="立即备份数据库", command=self._backup_database).pack(side="left", padx=5)
         ttk.Button(config_button_frame, text="从备份恢复", command=self._restore_database).pack(side="left", padx=5)
+        ttk.Button(config_button_frame, text="重建汇总表", command=self._rebuild_daily_summary).pack(side="left", padx=5)
         user_frame = ttk.LabelFrame(self, text=" 用户管理 ", padding=15)
         user_frame.pack(side="top", fill="both", expand=True, pady=(10, 0))
         user_list_frame = ttk.Frame(user_frame)
@@ -87,8 +88,11 @@ class AdminTab(ttk.Frame):
     def _restore_database(self):
         pass
     def _load_users_to_tree(self):
+        # 用户列表在后台读取，读取完成前列表为空
+        self.app.submit_task(self.db_manager.get_all_users, self._fill_user_tree, priority=PRIORITY_UI)
+
+    def _fill_user_tree(self, users):
         self.user_tree.delete(*self.user_tree.get_children())
-        users = self.db_manager.get_all_users()
         for i, user in enumerate(users):
             tag = 'evenrow' if i % 2 == 0 else 'oddrow'
             self.user_tree.insert("", "end", values=user, tags=(tag,))
@@ -101,16 +105,36 @@ class AdminTab(ttk.Frame):
         self.app.show_status_message("系统配置已保存！") # <--- 修改点
 
     def _backup_database(self):
+        db_name = getattr(self.db_manager, 'db_name', None)
+        if not db_name:
+            messagebox.showinfo("提示", "当前使用云端数据库，无需在本地备份。", parent=self)
+            return
         backup_dir = "db_backups"
         if not os.path.exists(backup_dir): os.makedirs(backup_dir)
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_path = os.path.join(backup_dir, f"{os.path.splitext(self.db_manager.db_name)[0]}_backup_{timestamp}.db")
+        db_base_name = os.path.splitext(os.path.basename(db_name))[0]
+        backup_path = os.path.join(backup_dir, f"{db_base_name}_backup_{timestamp}.db")
         try:
-            shutil.copyfile(self.db_manager.db_name, backup_path)
+            # WAL 模式下直接复制文件可能丢失未检查点的数据，改用 SQLite 在线备份
+            self.db_manager.backup(backup_path)
             self.app.show_status_message(f"数据库已成功备份到 {backup_dir}") # <--- 修改点
         except Exception as e:
             messagebox.showerror("备份失败", f"备份数据库时发生错误: {e}", parent=self)
 
+    def _rebuild_daily_summary(self):
+        if not messagebox.askyesno("确认", "将按全部原始记录重新计算日汇总表，确定继续吗?", parent=self):
+            return
+        # 重建期间不影响其他操作，排在界面读取之后执行
+        self.app.submit_task(self.db_manager.rebuild_daily_summary, self._on_rebuild_complete, priority=PRIORITY_BACKGROUND)
+        self.app.show_status_message("正在后台重建汇总表...")
+
+    def _on_rebuild_complete(self, row_count):
+        if row_count is None:
+            messagebox.showerror("失败", "重建汇总表失败，详情请查看日志文件。\n使用云端数据库时，重建只能由数据库管理员在 "
+                                 "Supabase SQL 编辑器中执行：select public.rebuild_daily_summary();", parent=self)
+        else:
+            self.app.show_status_message(f"汇总表已重建，共 {row_count} 行。")
+
     def _add_user(self):
         username = self.new_username_entry.get().strip()
         password = self.new_password_entry.get()
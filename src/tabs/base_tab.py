@@ -6,8 +6,21 @@ from tkinter import ttk, messagebox, filedialog
 from tkcalendar import DateEntry
 import datetime
 import math
+import logging
 import pandas as pd
 from ..excel_importer import ExcelImporter
+from ..autocomplete import PrefixIndex
+from ..slip_renderer import render_settlement_html, render_settlement_pdf, pdf_available
+from ..utils import open_path
+from ..data_exporter import create_record_exporter, export_file_types
+from ..db_base import TABLE_COLUMNS, record_matches_search
+from ..task_executor import PRIORITY_UI, PRIORITY_BACKGROUND
+from .virtual_tree import VirtualRecordView
+
+# 输入联想时忽略的按键（方向键、回车等不触发过滤）
+AUTOCOMPLETE_IGNORED_KEYS = {'Up', 'Down', 'Left', 'Right', 'Return', 'KP_Enter', 'Escape', 'Tab', 'Shift_L', 'Shift_R', 'Control_L', 'Control_R'}
+# 候选值加载完成前使用的空索引
+EMPTY_AUTOCOMPLETE_INDEX = PrefixIndex(())
 
 class BaseRecordTab(ttk.Frame):
     def __init__(self, parent, context, config):
@@ -25,10 +38,21 @@ class BaseRecordTab(ttk.Frame):
         self.tree_columns = config["tree_columns"]
         
         self.PAGE_SIZE = 50
-        self.page_info = {'current': 1, 'total': 1, 'search_params': {}}
+        self.PREFETCH_LIMIT = 6
+        # anchor 记录加载当前页所用的 (游标, 方向)，刷新时据此重新加载同一页
+        self.page_info = {'current': 1, 'total': 1, 'search_params': {}, 'anchor': (None, 'next'), 'first': None, 'last': None}
+        # 页面在后台加载：只有序号等于 _page_request_seq 的结果才会显示，过期的结果直接丢弃
+        self._page_request_seq = 0
+        self._page_task = None
+        # 预取的相邻页 {(游标, 方向): 结果}，游标与页码无关，翻页后仍然有效；数据或搜索条件变化时整体作废
+        self._prefetched_pages = {}
+        self._prefetch_generation = 0
         self.current_record_id = None
         self.entries = {}
         self.vars = {}
+        self.autocomplete_indexes = {}
+        # 正在后台加载的输入联想索引 {列名: 任务}
+        self._autocomplete_tasks = {}
         
         self._create_widgets()
         self.load_paged_records()
@@ -48,6 +72,8 @@ class BaseRecordTab(ttk.Frame):
         self.form_grid.columnconfigure(1, weight=1)
         
         self._create_form_fields()
+        for col_name in (self.name_key, 'spec'):
+            self._bind_autocomplete(self.entries[col_name], col_name)
 
         button_frame = ttk.Frame(left_frame)
         button_frame.pack(fill='x', pady=(15, 0))
@@ -75,6 +101,7 @@ class BaseRecordTab(ttk.Frame):
         search_name_combo = ttk.Combobox(search_export_frame, textvariable=self.vars['search_name_var'])
         search_name_combo.grid(row=0, column=1, padx=5, pady=2, sticky='ew')
         search_name_combo.config(postcommand=lambda: self._update_combobox_values(self.name_key, search_name_combo))
+        self._bind_autocomplete(search_name_combo, self.name_key)
         
         ttk.Label(search_export_frame, text="日期:").grid(row=1, column=0, padx=(0,5), pady=2, sticky='w')
         date_frame = ttk.Frame(search_export_frame)
@@ -99,65 +126,275 @@ class BaseRecordTab(ttk.Frame):
         tree_container.rowconfigure(0, weight=1)
         tree_container.columnconfigure(0, weight=1)
         
-        self.tree = ttk.Treeview(tree_container, columns=self.tree_columns, show="headings")
-        self.tree.grid(row=0, column=0, sticky='nsew')
+        self.paged_tree = ttk.Treeview(tree_container, columns=self.tree_columns, show="headings")
+        self.paged_tree.grid(row=0, column=0, sticky='nsew')
+        self.tree = self.paged_tree
         
-        vsb = ttk.Scrollbar(tree_container, orient="vertical", command=self.tree.yview)
-        vsb.grid(row=0, column=1, sticky='ns')
-        self.tree.configure(yscrollcommand=vsb.set)
+        self.paged_vsb = ttk.Scrollbar(tree_container, orient="vertical", command=self.paged_tree.yview)
+        self.paged_vsb.grid(row=0, column=1, sticky='ns')
+        self.paged_tree.configure(yscrollcommand=self.paged_vsb.set)
         
-        self.tree.column("ID", width=0, stretch=False)
+        # 连续滚动模式：只渲染可见行，数据按块预取，可一次浏览整个搜索结果
+        self.virtual_view = VirtualRecordView(
+            tree_container, self.tree_columns,
+            # 块由视图自己缓存；使用出错时抛出异常的查询，失败的块不会被当作空块保存
+            fetch_block=lambda block_index, block_size: self.db_manager._query_paged_records(self.table_name, block_index + 1, block_size, self.page_info['search_params']),
+            fetch_total=lambda: self.db_manager.count_records(self.table_name, self.page_info['search_params']),
+            submit_task=self.app.submit_task
+        )
+        self.virtual_view.grid(row=0, column=0, columnspan=2, sticky='nsew')
+        self.virtual_view.grid_remove()
+
+        for tree in (self.paged_tree, self.virtual_view.tree):
+            tree.column("ID", width=0, stretch=False)
+            for col in self.tree_columns[1:]:
+                tree.column(col, width=80, anchor='center')
+                tree.heading(col, text=col)
+            tree.bind("<<TreeviewSelect>>", self._load_selected_to_form)
+        # 排序只对当前页有意义，连续滚动模式下不提供
         for col in self.tree_columns[1:]:
-            self.tree.column(col, width=80, anchor='center')
-            self.tree.heading(col, text=col, command=lambda c=col: self._sort_treeview_column(c, False))
-        
-        self.tree.bind("<<TreeviewSelect>>", self._load_selected_to_form)
+            self.paged_tree.heading(col, command=lambda c=col: self._sort_treeview_column(c, False))
 
         pagination_frame = ttk.Frame(tree_container)
         pagination_frame.grid(row=1, column=0, sticky='ew', pady=(5, 0))
+
+        self.page_info['pager'] = ttk.Frame(pagination_frame)
+        self.page_info['pager'].pack(side="left")
         
-        self.page_info['prev_button'] = ttk.Button(pagination_frame, text="<< 上一页", command=lambda: self.change_page(-1))
+        self.page_info['prev_button'] = ttk.Button(self.page_info['pager'], text="<< 上一页", command=lambda: self.change_page(-1))
         self.page_info['prev_button'].pack(side="left", padx=10)
         
-        self.page_info['label'] = ttk.Label(pagination_frame, text="第 1 / 1 页")
+        self.page_info['label'] = ttk.Label(self.page_info['pager'], text="第 1 / 1 页")
         self.page_info['label'].pack(side="left", padx=10)
 
-        self.page_info['next_button'] = ttk.Button(pagination_frame, text="下一页 >>", command=lambda: self.change_page(1))
+        self.page_info['next_button'] = ttk.Button(self.page_info['pager'], text="下一页 >>", command=lambda: self.change_page(1))
         self.page_info['next_button'].pack(side="left", padx=10)
+
+        self.vars['virtual_mode_var'] = tk.BooleanVar(value=False)
+        ttk.Checkbutton(pagination_frame, text="连续滚动浏览", variable=self.vars['virtual_mode_var'], command=self._toggle_view_mode).pack(side="right", padx=10)
     
     def _add_extra_buttons(self, parent_frame):
         export_buttons_frame = ttk.Frame(parent_frame)
         export_buttons_frame.grid(row=0, column=3, rowspan=2)
         ttk.Button(export_buttons_frame, text="导出选中项", command=self.export_settlement).pack(fill='x')
+        ttk.Button(export_buttons_frame, text="打印选中项", command=self.print_settlement_slip).pack(fill='x', pady=(2, 0))
         ttk.Button(export_buttons_frame, text="导出所有结果", command=self.export_settlement_from_search).pack(fill='x', pady=2)
+        ttk.Button(export_buttons_frame, text="导出数据文件", command=self.export_data_file).pack(fill='x', pady=(0, 2))
+        ttk.Button(export_buttons_frame, text="按日期批量结算", command=self.batch_export_settlements).pack(fill='x')
     
+    def _toggle_view_mode(self):
+        if self.vars['virtual_mode_var'].get():
+            self.paged_tree.grid_remove()
+            self.paged_vsb.grid_remove()
+            self.page_info['pager'].pack_forget()
+            self.virtual_view.grid()
+            self.tree = self.virtual_view.tree
+        else:
+            self.virtual_view.grid_remove()
+            self.paged_tree.grid()
+            self.paged_vsb.grid()
+            self.page_info['pager'].pack(side="left")
+            self.tree = self.paged_tree
+        self.current_record_id = None
+        self.load_paged_records()
+
     def load_paged_records(self):
-        self.tree.delete(*self.tree.get_children())
-        total_records = self.db_manager.count_records(self.table_name, self.page_info['search_params'])
-        total_pages = math.ceil(total_records / self.PAGE_SIZE) if total_records > 0 else 1
-        self.page_info['total'] = total_pages
+        # 重新加载当前页（搜索、保存、收到变更后调用），丢弃预取的相邻页和仍在加载的旧请求
+        self._page_request_seq += 1
+        if self.vars['virtual_mode_var'].get():
+            self.virtual_view.reload()
+            return
+        self._discard_prefetched_pages()
+        self._request_page(self.page_info['anchor'])
+
+    def _page_worker(self, search_params, cursor, direction):
+        result = self.db_manager.fetch_records_page(self.table_name, self.PAGE_SIZE, search_params, cursor, direction)
+        if cursor and not result['records']:
+            # 当前页的记录已被删光，回到第一页
+            result = self.db_manager.fetch_records_page(self.table_name, self.PAGE_SIZE, search_params)
+            result['reset'] = True
+        return result
+
+    def _request_page(self, anchor):
+        self._page_request_seq += 1
+        seq = self._page_request_seq
+        if self._page_task:
+            self._page_task.cancel()
+        # 加载期间禁用翻页，避免按旧的首末行游标连续翻页
+        self.page_info['prev_button']['state'] = 'disabled'
+        self.page_info['next_button']['state'] = 'disabled'
+        self.page_info['label'].config(text=f"第 {self.page_info['current']} / {self.page_info['total']} 页 (加载中...)")
+
+        def on_loaded(result):
+            if seq == self._page_request_seq:
+                self._page_task = None
+                self._show_page(result)
+
+        self._page_task = self.app.submit_task(self._page_worker, on_loaded, dict(self.page_info['search_params']), *anchor,
+                                               priority=PRIORITY_UI)
+
+    def _show_page(self, result):
+        if result.get('reset'):
+            self.page_info['anchor'] = (None, 'next')
+            self.page_info['current'] = 1
+        total_records = result['total'] or 0
+        self.page_info['total'] = math.ceil(total_records / self.PAGE_SIZE) if total_records > 0 else 1
         if self.page_info['current'] > self.page_info['total']: self.page_info['current'] = self.page_info['total']
-        records = self.db_manager.fetch_paged_records(self.table_name, self.page_info['current'], self.PAGE_SIZE, self.page_info['search_params'])
+        self._fill_tree(result['records'])
+        self.page_info['first'] = result['prev_cursor']
+        self.page_info['last'] = result['next_cursor']
+        self.page_info['label'].config(text=f"第 {self.page_info['current']} / {self.page_info['total']} 页")
+        self.page_info['prev_button']['state'] = 'normal' if result['has_prev'] else 'disabled'
+        self.page_info['next_button']['state'] = 'normal' if result['has_next'] else 'disabled'
+        self._prefetch_adjacent_pages(result)
+
+    def _fill_tree(self, records):
+        # 一次性换入新页：复用已有的行只改值，多删少补，避免先清空再逐行插入造成闪烁
+        items = self.tree.get_children()
         for i, record in enumerate(records):
             tag = 'evenrow' if i % 2 != 0 else 'oddrow'
-            self.tree.insert("", "end", values=record, tags=(tag,))
-        self.page_info['label'].config(text=f"第 {self.page_info['current']} / {self.page_info['total']} 页")
-        self.page_info['prev_button']['state'] = 'normal' if self.page_info['current'] > 1 else 'disabled'
-        self.page_info['next_button']['state'] = 'normal' if self.page_info['current'] < self.page_info['total'] else 'disabled'
-    
+            if i < len(items):
+                self.tree.item(items[i], values=record, tags=(tag,))
+            else:
+                self.tree.insert("", "end", values=record, tags=(tag,))
+        if len(items) > len(records):
+            self.tree.delete(*items[len(records):])
+        self.tree.selection_remove(self.tree.selection())
+
+    def _adjacent_anchors(self, result):
+        anchors = []
+        if result['has_next']:
+            anchors.append((result['next_cursor'], 'next'))
+        if result['has_prev']:
+            anchors.append((result['prev_cursor'], 'prev') if self.page_info['current'] > 2 else (None, 'next'))
+        return anchors
+
+    def _prefetch_adjacent_pages(self, result):
+        # 当前页显示后在后台预取上一页和下一页，翻页时直接使用
+        generation = self._prefetch_generation
+        search_params = dict(self.page_info['search_params'])
+        for anchor in self._adjacent_anchors(result):
+            if anchor in self._prefetched_pages:
+                continue
+            self._prefetched_pages[anchor] = None
+            while len(self._prefetched_pages) > self.PREFETCH_LIMIT:
+                self._prefetched_pages.pop(next(iter(self._prefetched_pages)))
+
+            def on_prefetched(page, anchor=anchor):
+                if generation == self._prefetch_generation and anchor in self._prefetched_pages and not page.get('reset'):
+                    self._prefetched_pages[anchor] = page
+
+            self.app.submit_task(self._page_worker, on_prefetched, search_params, *anchor, priority=PRIORITY_BACKGROUND)
+
+    def _discard_prefetched_pages(self):
+        self._prefetch_generation += 1
+        self._prefetched_pages = {}
+
+    def apply_changes(self, changes):
+        # 变更推送：只更新列表中受影响的行，新记录仅在第一页且符合搜索条件时按 (日期, ID) 倒序插入
+        if any(c['op'] == 'reload' for c in changes):
+            self.load_paged_records()
+            return
+        search_params = self.page_info['search_params']
+        upserts, removed = {}, set()
+        for change in changes:
+            record_id = str(change['record_id'])
+            record = change['record']
+            if change['op'] == 'delete' or not record_matches_search(self.table_name, record, search_params):
+                removed.add(record_id)
+            else:
+                upserts[record_id] = (record['id'],) + tuple(record.get(col) for col in TABLE_COLUMNS[self.table_name])
+
+        self._discard_prefetched_pages()
+        if self.vars['virtual_mode_var'].get():
+            # 连续滚动模式下增删会改变后续所有行的位置，重新加载但保持滚动位置
+            visible_ids = {str(self.tree.item(item, 'values')[0]) for item in self.tree.get_children()}
+            if removed or set(upserts) - visible_ids:
+                self.virtual_view.refresh()
+            else:
+                self.virtual_view.update_rows(upserts)
+            return
+
+        items = {str(self.tree.item(item, 'values')[0]): item for item in self.tree.get_children()}
+        removed_shown = removed & items.keys()
+        for record_id in removed_shown:
+            self.tree.delete(items.pop(record_id))
+        if removed_shown and not items:
+            self.load_paged_records()
+            return
+        on_first_page = self.page_info['anchor'][0] is None
+        for record_id, values in upserts.items():
+            if record_id in items:
+                self.tree.item(items[record_id], values=values)
+            elif on_first_page:
+                self._insert_sorted(values)
+        children = self.tree.get_children()
+        if len(children) > self.PAGE_SIZE:
+            self.tree.delete(*children[self.PAGE_SIZE:])
+            self.page_info['next_button']['state'] = 'normal'
+        children = self.tree.get_children()
+        for i, item in enumerate(children):
+            self.tree.item(item, tags=('evenrow' if i % 2 != 0 else 'oddrow',))
+        if not children:
+            return
+        # 翻页游标跟随当前页首末行
+        first, last = self.tree.item(children[0], 'values'), self.tree.item(children[-1], 'values')
+        self.page_info['first'] = (str(first[1]), int(first[0]))
+        self.page_info['last'] = (str(last[1]), int(last[0]))
+
+    def _insert_sorted(self, values):
+        key = (str(values[1]), int(values[0]))
+        for index, item in enumerate(self.tree.get_children()):
+            row = self.tree.item(item, 'values')
+            if (str(row[1]), int(row[0])) < key:
+                self.tree.insert("", index, values=values)
+                return
+        self.tree.insert("", "end", values=values)
+
     def change_page(self, direction):
         new_page = self.page_info['current'] + direction
         if 1 <= new_page <= self.page_info['total']:
+            if direction > 0:
+                anchor = (self.page_info['last'], 'next')
+            else:
+                anchor = (self.page_info['first'], 'prev') if new_page > 1 else (None, 'next')
+            self.page_info['anchor'] = anchor
             self.page_info['current'] = new_page
-            self.load_paged_records()
+            prefetched = self._prefetched_pages.get(anchor)
+            if prefetched is None:
+                self._request_page(anchor)
+                return
+            # 命中预取：立即显示，同时作废仍在加载的旧请求
+            self._page_request_seq += 1
+            if self._page_task:
+                self._page_task.cancel()
+                self._page_task = None
+            self._show_page(prefetched)
+
+    def _save_worker(self, record_id, data):
+        # 返回 (是否成功, 与之冲突的已有记录)；失败时查出冲突记录，界面据此提示
+        if record_id:
+            ok = self.db_manager.update_record(self.table_name, record_id, data)
+        else:
+            ok = self.db_manager.add_record(self.table_name, data)
+        if ok:
+            return True, None
+        return False, self.db_manager.get_record_by_key(self.table_name, data['date'], data[self.name_key], data['spec'])
 
     def add_record(self, save_and_new=False):
         data = self._get_form_data()
         if not data: return
-        if self.db_manager.add_record(self.table_name, data):
-            self.load_paged_records()
-            self._clear_form(keep_fields=save_and_new)
-            self.app.show_status_message("记录已成功添加！")
+
+        def on_saved(result):
+            ok, existing = result
+            if ok:
+                self.load_paged_records()
+                self._clear_form(keep_fields=save_and_new)
+                self.app.show_status_message("记录已成功添加！")
+            else:
+                self._show_save_error(existing, None)
+
+        self.app.submit_task(self._save_worker, on_saved, None, data, priority=PRIORITY_UI)
 
     def update_record(self):
         if not self.current_record_id:
@@ -165,10 +402,29 @@ class BaseRecordTab(ttk.Frame):
             return
         data = self._get_form_data()
         if not data: return
-        if self.db_manager.update_record(self.table_name, self.current_record_id, data):
-            self.load_paged_records()
-            self._clear_form()
-            self.app.show_status_message("记录已成功修改！")
+        record_id = self.current_record_id
+
+        def on_saved(result):
+            ok, existing = result
+            if ok:
+                self.load_paged_records()
+                self._clear_form()
+                self.app.show_status_message("记录已成功修改！")
+            else:
+                self._show_save_error(existing, record_id)
+
+        self.app.submit_task(self._save_worker, on_saved, record_id, data, priority=PRIORITY_UI)
+
+    def _show_save_error(self, existing, record_id):
+        # 保存失败最常见的原因是违反 (日期, 姓名, 规格) 唯一约束，告诉用户与哪条记录冲突
+        if existing and existing['id'] == getattr(self.db_manager, 'PENDING_RECORD_ID', None):
+            messagebox.showerror("保存失败", "已录入过同一天、同一人、同一规格的记录，该记录正在等待同步，"
+                                 "请同步完成后直接修改该记录。", parent=self)
+        elif existing and str(existing['id']) != str(record_id):
+            messagebox.showerror("保存失败", f"已存在同一天、同一人、同一规格的记录（ID {existing['id']}），"
+                                 "请直接修改该记录。", parent=self)
+        else:
+            messagebox.showerror("保存失败", "保存记录失败，请检查网络或数据库连接。", parent=self)
 
     def delete_selected_record(self):
         selected_item = self.tree.selection()
@@ -177,18 +433,66 @@ class BaseRecordTab(ttk.Frame):
             return
         if messagebox.askyesno("确认删除", "确定要删除选中的记录吗？", parent=self):
             record_id = self.tree.item(selected_item[0], "values")[0]
-            if self.db_manager.delete_record(self.table_name, record_id):
-                self.load_paged_records()
-                self._clear_form()
-                self.app.show_status_message("记录已删除。")
-            else:
-                messagebox.showerror("删除失败", "从云端删除记录时发生错误，请查看日志。", parent=self)
+
+            def on_deleted(ok):
+                if ok:
+                    self.load_paged_records()
+                    self._clear_form()
+                    self.app.show_status_message("记录已删除。")
+                else:
+                    messagebox.showerror("删除失败", "从云端删除记录时发生错误，请查看日志。", parent=self)
+
+            self.app.submit_task(self.db_manager.delete_record, on_deleted, self.table_name, record_id, priority=PRIORITY_UI)
             
+    def _build_autocomplete_index(self, col_name, current):
+        # 在工作线程中执行：候选值来自带缓存的 fetch_distinct_values，只有取值变化时才重建索引
+        values = tuple(self.db_manager.fetch_distinct_values(self.table_name, col_name))
+        if current is not None and (current.values == values or not values):
+            # 取值未变，或查询失败返回空列表时，继续使用已有索引
+            return current
+        return PrefixIndex(values)
+
+    def _refresh_autocomplete_index(self, col_name, combo_widget=None):
+        # 后台加载候选值并重建索引，完成后存入 autocomplete_indexes；同一列同时只有一个加载任务
+        if col_name in self._autocomplete_tasks:
+            return
+
+        def on_loaded(index):
+            self._autocomplete_tasks.pop(col_name, None)
+            self.autocomplete_indexes[col_name] = index
+            # 加载期间用户仍在该输入框中时，用新索引刷新下拉候选
+            if combo_widget is not None and combo_widget.winfo_exists() and combo_widget.focus_get() == combo_widget:
+                combo_widget['values'] = tuple(index.search(combo_widget.get()))
+
+        def on_failed(error):
+            self._autocomplete_tasks.pop(col_name, None)
+            logging.error(f"加载 {col_name} 输入联想候选值失败: {error}")
+
+        self._autocomplete_tasks[col_name] = self.app.submit_task(
+            self._build_autocomplete_index, on_loaded, col_name, self.autocomplete_indexes.get(col_name),
+            priority=PRIORITY_UI, on_error=on_failed)
+
+    def _get_autocomplete_index(self, col_name):
+        # 返回已有索引（尚未加载时为空索引），不在界面线程中查询数据库
+        return self.autocomplete_indexes.get(col_name) or EMPTY_AUTOCOMPLETE_INDEX
+
     def _update_combobox_values(self, col_name, combo_widget=None):
         if combo_widget is None: combo_widget = self.entries.get(col_name)
         if combo_widget:
-            combo_widget['values'] = tuple(self.db_manager.fetch_distinct_values(self.table_name, col_name))
-            
+            # 下拉列表只显示与已输入内容匹配的前若干项，避免把全部姓名交给 Tk 渲染
+            combo_widget['values'] = tuple(self._get_autocomplete_index(col_name).search(combo_widget.get()))
+            self._refresh_autocomplete_index(col_name, combo_widget)
+
+    def _bind_autocomplete(self, combo_widget, col_name):
+        def on_key_release(event):
+            if event.keysym in AUTOCOMPLETE_IGNORED_KEYS:
+                return
+            combo_widget['values'] = tuple(self._get_autocomplete_index(col_name).search(combo_widget.get()))
+            if col_name not in self.autocomplete_indexes:
+                self._refresh_autocomplete_index(col_name, combo_widget)
+        combo_widget.bind("<KeyRelease>", on_key_release, add='+')
+        combo_widget.bind("<FocusIn>", lambda e: self._refresh_autocomplete_index(col_name, combo_widget), add='+')
+
     def search_records(self):
         self.page_info['search_params'] = {
             'name': self.vars['search_name_var'].get(),
@@ -196,6 +500,7 @@ class BaseRecordTab(ttk.Frame):
             'end_date': self.vars['end_date_widget'].get_date().strftime('%Y-%m-%d') if self.vars['end_date_widget'].get() else None
         }
         self.page_info['current'] = 1
+        self.page_info['anchor'] = (None, 'next')
         self.load_paged_records()
 
     def _reset_search(self):
@@ -204,20 +509,49 @@ class BaseRecordTab(ttk.Frame):
         self.vars['end_date_widget'].set_date(None)
         self.page_info['search_params'] = {}
         self.page_info['current'] = 1
+        self.page_info['anchor'] = (None, 'next')
         self.load_paged_records()
         
     def _export_worker(self, ids):
         if not ids:
             return ('warning', "没有选中任何记录用于导出。")
         df = self.db_manager.get_records_by_ids(self.table_name, ids)
-        if df is None or df.empty:
+        return self._create_settlement(df)
+
+    def _export_search_worker(self, search_params):
+        # 按搜索条件导出全部结果：先做一次轻量检查，再把记录分块流式写入文件，内存中只保留一个块
+        overview = self.db_manager.get_search_overview(self.table_name, search_params)
+        if overview is None:
+            return ('warning', "查询搜索结果失败，请检查网络连接后重试。")
+        if not overview['count']:
             return ('warning', "没有有效数据可导出。")
+        if len(overview['names']) > 1:
+            return ('warning', "导出失败！\n\n请确保所有选中的记录都属于【同一个人】。")
+        entity_name = overview['names'][0]
+        file_path = self.excel_exporter.build_output_path(entity_name, self.title)
+        if not file_path:
+            return ('warning', "无法创建Excel输出目录，请检查设置。")
+        date_range = (overview['min_date'], overview['max_date'])
+        chunks = self.db_manager.iter_record_chunks(self.table_name, search_params)
+        try:
+            self.excel_exporter.write_settlement_stream(chunks, file_path, self.title, entity_name, self.record_type, date_range)
+        except PermissionError:
+            return ('warning', f"文件权限不足或文件被占用，无法写入：\n{file_path}\n请关闭可能正在使用此文件的Excel程序。")
+        return ('saved', (file_path, self.title))
+
+    def _settlement_subject(self, df):
+        # 返回 (提示信息, 结算对象, 日期范围)，记录为空或不属于同一个人时只有提示信息
+        if df is None or df.empty:
+            return "没有有效数据可导出。", None, None
         entity_names = df[self.name_key].unique()
         if len(entity_names) > 1:
-            return ('warning', "导出失败！\n\n请确保所有选中的记录都属于【同一个人】。")
-        entity_name = entity_names[0]
-        min_date, max_date = df['date'].min(), df['date'].max()
-        date_range = (min_date, max_date)
+            return "导出失败！\n\n请确保所有选中的记录都属于【同一个人】。", None, None
+        return None, entity_names[0], (df['date'].min(), df['date'].max())
+
+    def _create_settlement(self, df):
+        warning, entity_name, date_range = self._settlement_subject(df)
+        if warning:
+            return ('warning', warning)
         wb, entity_name = self.excel_exporter.create_settlement_workbook(df, self.title, entity_name, self.record_type, date_range)
         return ('save', (wb, entity_name, self.title))
 
@@ -228,6 +562,42 @@ class BaseRecordTab(ttk.Frame):
         elif status == 'save':
             wb, entity_name, title = data
             self.excel_exporter.save_and_notify(wb, entity_name, title)
+        elif status == 'saved':
+            file_path, title = data
+            self.excel_exporter.notify_saved(file_path, title)
+
+    def _slip_worker(self, ids):
+        # 打印用结算单：有 reportlab 时生成 PDF，否则生成可直接用浏览器打印的 HTML
+        df = self.db_manager.get_records_by_ids(self.table_name, ids)
+        warning, entity_name, date_range = self._settlement_subject(df)
+        if warning:
+            return ('warning', warning)
+        extension = ".pdf" if pdf_available() else ".html"
+        file_path = self.excel_exporter.build_output_path(entity_name, self.title, extension)
+        if not file_path:
+            return ('warning', "无法创建输出目录，请检查设置。")
+        if extension == ".pdf":
+            with open(file_path, 'wb') as f:
+                f.write(render_settlement_pdf(df, self.title, entity_name, self.record_type, date_range, self.excel_exporter.config_manager))
+        else:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(render_settlement_html(df, self.title, entity_name, self.record_type, date_range, self.excel_exporter.config_manager))
+        return ('slip', file_path)
+
+    def _on_slip_complete(self, result):
+        status, data = result
+        if status == 'warning':
+            messagebox.showwarning("提示", data, parent=self)
+        else:
+            open_path(data)
+
+    def print_settlement_slip(self):
+        selected_items = self.tree.selection()
+        if not selected_items:
+            messagebox.showwarning("提示", "请选择至少一条记录来打印。", parent=self)
+            return
+        selected_ids = [self.tree.item(item, "values")[0] for item in selected_items]
+        self.app.run_long_task(self._slip_worker, self._on_slip_complete, selected_ids)
 
     def export_settlement(self):
         selected_items = self.tree.selection()
@@ -238,13 +608,69 @@ class BaseRecordTab(ttk.Frame):
         self.app.run_long_task(self._export_worker, self._on_export_complete, selected_ids)
 
     def export_settlement_from_search(self):
-        all_items = self.tree.get_children()
-        if not all_items:
+        if not self.tree.get_children():
             messagebox.showwarning("提示", "当前没有搜索结果可供导出。", parent=self)
             return
-        all_ids = [self.tree.item(item, "values")[0] for item in all_items]
-        self.app.run_long_task(self._export_worker, self._on_export_complete, all_ids)
+        self.app.run_long_task(self._export_search_worker, self._on_export_complete, dict(self.page_info['search_params']))
     
+    def _export_data_worker(self, progress, file_path, search_params):
+        # 导出搜索结果的原始数据 (CSV / Parquet)，不要求属于同一个人，按块写入
+        overview = self.db_manager.get_search_overview(self.table_name, search_params)
+        if overview is None:
+            return ('warning', "查询搜索结果失败，请检查网络连接后重试。")
+        if not overview['count']:
+            return ('warning', "没有有效数据可导出。")
+        exporter = create_record_exporter(file_path, self.record_type)
+        chunks = self.db_manager.iter_record_chunks(self.table_name, search_params, chunk_size=5000)
+        try:
+            exporter.write(chunks, file_path, progress, overview['count'])
+        except PermissionError:
+            return ('warning', f"文件权限不足或文件被占用，无法写入：\n{file_path}")
+        return ('saved', (file_path, "数据文件"))
+
+    def export_data_file(self):
+        default_name = f"{self.title.replace('结算单', '记录')}_{datetime.date.today():%Y%m%d}"
+        file_path = filedialog.asksaveasfilename(title="导出数据文件", defaultextension=".csv", initialfile=default_name,
+                                                 filetypes=export_file_types(), parent=self)
+        if not file_path:
+            return
+        # 导出只读取数据，在后台进行，进度显示在状态栏
+        self.app.submit_task(self._export_data_worker, self._on_export_complete, file_path, dict(self.page_info['search_params']),
+                             with_progress=True)
+
+    def _batch_export_worker(self, progress, search_params):
+        # 一次取回整个结算周期的记录，按姓名分组后每人生成一份结算单
+        progress(0, 0, "正在查询记录...")
+        chunks = [pd.DataFrame(rows) for rows in self.db_manager.iter_record_chunks(self.table_name, search_params)]
+        if not chunks:
+            return ('warning', "所选日期范围内没有记录。")
+        df = pd.concat(chunks, ignore_index=True)
+        date_range = (search_params['start_date'], search_params['end_date'])
+        batch_dir, results, failures = self.excel_exporter.export_batch_settlements(df, self.title, self.record_type, self.name_key, date_range, progress)
+        if not batch_dir:
+            return ('warning', "无法创建Excel输出目录，请检查设置。")
+        return ('batch', (batch_dir, results, failures))
+
+    def _on_batch_export_complete(self, result):
+        status, data = result
+        if status == 'warning':
+            messagebox.showwarning("提示", data, parent=self)
+        else:
+            self.excel_exporter.notify_batch_saved(*data)
+
+    def batch_export_settlements(self):
+        if not self.vars['start_date_widget'].get() or not self.vars['end_date_widget'].get():
+            messagebox.showwarning("提示", "请先在搜索栏选择结算周期的开始和结束日期。", parent=self)
+            return
+        search_params = {
+            'start_date': self.vars['start_date_widget'].get_date().strftime('%Y-%m-%d'),
+            'end_date': self.vars['end_date_widget'].get_date().strftime('%Y-%m-%d')
+        }
+        if not messagebox.askyesno("批量结算", f"将为 {search_params['start_date']} 至 {search_params['end_date']} 期间的每个人分别生成结算单，是否继续？", parent=self):
+            return
+        # 整批生成可能需要几分钟，显示确定进度的等待窗口，取消后进程池不再开始新的结算单
+        self.app.run_progress_task(self._batch_export_worker, self._on_batch_export_complete, search_params)
+
     def _sort_treeview_column(self, col, reverse):
         try:
             data = [(self.tree.set(child, col), child) for child in self.tree.get_children('')]
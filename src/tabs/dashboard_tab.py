@@ -1,5 +1,5 @@
 # 文件路径: src/tabs/dashboard_tab.py
-# 版本：已更新为只显示种植户数据报表
+# 版本：已更新为只显示种植户数据报表；汇总查询在后台执行，界面线程只负责画图
 
 import tkinter as tk
 from tkinter import ttk
@@ -8,21 +8,32 @@ import pandas as pd
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import datetime
+from ..task_executor import PRIORITY_UI
+
+# 时间粒度: 显示名 -> (get_custom_summary 参数, 柱宽(天), 图例前缀)
+GRANULARITY_OPTIONS = {
+    '按日': ('day', 0.8, '日'),
+    '按周': ('week', 5, '周'),
+    '按月': ('month', 20, '月'),
+}
 
 class DashboardTab(ttk.Frame):
     def __init__(self, parent, context):
         super().__init__(parent)
         self.parent = parent
         self.context = context
+        self.app = self.context["app"]
         self.db_manager = self.context["db_manager"]
         self.chart_canvas = None
+        # 只显示最近一次“生成图表”的结果，之前未完成的查询被取消
+        self._chart_task = None
         
         # --- 优化点：报表类型固定为种植户 ---
         self.report_type = "grower"
         
         self._create_widgets()
-        # 初始化时直接加载种植户数据
-        self._update_name_combobox_values()
+        # 初始化时在后台加载种植户数据，查询期间显示占位文字
+        self.app.submit_task(self._fetch_names, self._set_names, priority=PRIORITY_UI)
         self._generate_custom_chart()
 
     def _create_widgets(self):
@@ -50,6 +61,10 @@ class DashboardTab(ttk.Frame):
         first_day_of_month = today.replace(day=1)
         self.start_date_entry.set_date(first_day_of_month)
         self.end_date_entry.set_date(today)
+
+        ttk.Label(control_frame, text="粒度:").pack(side="left", padx=(15, 5))
+        self.granularity_var = tk.StringVar(value='按日')
+        ttk.Combobox(control_frame, textvariable=self.granularity_var, values=list(GRANULARITY_OPTIONS), state='readonly', width=6).pack(side="left")
         
         # --- 优化点：生成图表按钮绑定了新的响应函数 ---
         ttk.Button(control_frame, text="生成图表", command=self._generate_custom_chart).pack(side="left", padx=20)
@@ -64,18 +79,34 @@ class DashboardTab(ttk.Frame):
         self.total_weight_label = ttk.Label(stats_frame, text="总净重: 0.00 斤", font=FONT_BOLD)
         self.total_weight_label.pack(side="left", padx=20)
 
+        self.season_total_label = ttk.Label(stats_frame, text="本年累计: 0.00 元 / 0.00 斤 / 0 笔")
+        self.season_total_label.pack(side="right", padx=20)
+
         self.chart_frame = ttk.Frame(self)
         self.chart_frame.pack(expand=True, fill="both", pady=10, padx=5)
 
     # --- 优化点：移除了 _on_report_type_change 函数 ---
 
-    def _update_name_combobox_values(self):
+    def _fetch_names(self):
         # 直接使用固定的表名和列名
-        table_name = "grower_records"
-        name_column = 'grower_name'
-        names = self.db_manager.fetch_distinct_values(table_name, name_column)
+        return self.db_manager.fetch_distinct_values("grower_records", 'grower_name')
+
+    def _set_names(self, names):
         self.name_combo['values'] = ['全部'] + names
+
+    def _update_name_combobox_values(self):
+        self._set_names(self._fetch_names())
         
+    def _fetch_season_totals(self, name):
+        # 本年累计直接读取日汇总表，不扫描原始记录
+        today = datetime.date.today()
+        return self.db_manager.get_summary_totals(self.report_type, today.replace(month=1, day=1).strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d'), name)
+
+    def _chart_worker(self, start_date, end_date, name, granularity):
+        # 在工作线程中执行：聚合在数据库端完成，这里只拿到每个时间段一行
+        df = self.db_manager.get_custom_summary(self.report_type, start_date, end_date, name, granularity)
+        return df, self._fetch_season_totals(name)
+
     def _generate_custom_chart(self):
         name = self.name_var.get()
         try:
@@ -84,9 +115,19 @@ class DashboardTab(ttk.Frame):
         except AttributeError:
             return
 
-        # 直接调用数据库查询，类型固定为 grower
-        df = self.db_manager.get_custom_summary(self.report_type, start_date, end_date, name)
-        
+        granularity, bar_width, period_label = GRANULARITY_OPTIONS[self.granularity_var.get()]
+        if self._chart_task:
+            self._chart_task.cancel()
+        self.total_revenue_label.config(text="总金额: 正在加载...")
+        self.total_weight_label.config(text="总净重: 正在加载...")
+        self._chart_task = self.app.submit_task(
+            self._chart_worker,
+            lambda result: self._draw_chart(result, name, start_date, end_date, bar_width, period_label),
+            start_date, end_date, name, granularity, priority=PRIORITY_UI)
+
+    def _draw_chart(self, result, name, start_date, end_date, bar_width, period_label):
+        df, totals = result
+        self._chart_task = None
         if self.chart_canvas:
             self.chart_canvas.get_tk_widget().destroy()
 
@@ -100,9 +141,9 @@ class DashboardTab(ttk.Frame):
             self.total_revenue_label.config(text=f"总金额: {total_revenue:,.2f} 元")
             self.total_weight_label.config(text=f"总净重: {total_weight:,.2f} 斤")
             
-            ax1.bar(df['date'], df['total_revenue'], label='日收购金额 (元)', width=0.8)
+            ax1.bar(df['date'], df['total_revenue'], label=f'{period_label}收购金额 (元)', width=bar_width)
             ax2 = ax1.twinx()
-            ax2.plot(df['date'], df['total_weight'], color='r', marker='o', linestyle='--', label='日收购净重 (斤)')
+            ax2.plot(df['date'], df['total_weight'], color='r', marker='o', linestyle='--', label=f'{period_label}收购净重 (斤)')
             
             name_text = "全部种植户" if name == '全部' else name
             chart_title = f"{name_text} 从 {start_date} 到 {end_date} 的收购数据趋势"
@@ -129,6 +170,8 @@ class DashboardTab(ttk.Frame):
             except Exception:
                 ax1.text(0.5, 0.5, 'No data for the current filter', ha='center', va='center')
 
+        self.season_total_label.config(text=f"本年累计: {totals['total_amount']:,.2f} 元 / {totals['total_weight']:,.2f} 斤 / {totals['record_count']} 笔")
+
         fig.tight_layout()
         self.chart_canvas = FigureCanvasTkAgg(fig, master=self.chart_frame)
         self.chart_canvas.draw()
@@ -1,11 +1,12 @@
 # 文件路径: src/tabs/grower_tab.py
-# 版本：已更新，向 ExcelImporter 传递 db_manager
+# 版本：导入按 (日期, 姓名, 规格) 写入，与已有记录冲突时可选择跳过、覆盖或累加
 
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from tkcalendar import DateEntry
 import datetime
-from ..excel_importer import ExcelImporter
+from ..excel_importer import create_importer, import_file_types
+from ..import_job import ImportCheckpoint, import_job_key, merge_duplicate_keys, run_import_job
 from .base_tab import BaseRecordTab
 
 class GrowerTab(BaseRecordTab):
@@ -18,62 +19,101 @@ class GrowerTab(BaseRecordTab):
             "title": "种植户结算单",
             "tree_columns": ("ID", "日期", "姓名", "规格", "毛重", "次果", "皮重", "净重", "单价", "金额", "备注")
         }
+        self.import_checkpoint = ImportCheckpoint()
         super().__init__(parent, context, config)
 
     def _add_extra_buttons(self, parent_frame):
         super()._add_extra_buttons(parent_frame)
         file_op_frame = parent_frame.grid_slaves(row=0, column=3)[0]
-        ttk.Button(file_op_frame, text="从Excel导入", command=self._import_from_excel).pack(fill='x', pady=(10, 0))
+        ttk.Button(file_op_frame, text="从文件导入", command=self._import_from_excel).pack(fill='x', pady=(10, 0))
 
-    def _import_worker(self, file_path):
-        # --- 核心修改点：将 self.db_manager 传递给 ExcelImporter ---
-        importer = ExcelImporter(file_path, self.record_type, self.db_manager)
-        new_records, duplicate_count, total_rows = importer.parse_excel()
+    def _import_worker(self, progress, file_path):
+        importer = create_importer(file_path, self.record_type, self.db_manager)
+        records, total_rows = importer.parse(progress)
         
-        if new_records is None:
-            return ('error', "文件解析失败，请检查文件格式。")
+        if records is None:
+            return ('error', importer.error or "文件解析失败，请检查文件格式。")
         
-        return ('confirm_import', (new_records, duplicate_count, total_rows))
+        return ('confirm_import', (file_path, records, total_rows, importer.invalid_report()))
 
     def _on_import_complete(self, result):
         status, data = result
         if status == 'error':
             messagebox.showerror("错误", data, parent=self)
         elif status == 'confirm_import':
-            new_records, duplicate_count, total_rows = data
+            file_path, records, total_rows, invalid_report = data
             
-            if not new_records and duplicate_count == 0:
-                 messagebox.showinfo("提示", "Excel文件中没有可导入的有效数据。", parent=self)
+            if not records:
+                 messagebox.showinfo("提示", "\n\n".join(filter(None, ["文件中没有可导入的有效数据。", invalid_report])), parent=self)
                  return
             
-            msg_parts = [f"成功解析 {total_rows} 条记录。"]
-            if duplicate_count > 0:
-                msg_parts.append(f"发现 {duplicate_count} 条重复记录（已跳过）。")
-            if new_records:
-                msg_parts.append(f"\n是否确认导入剩余的 {len(new_records)} 条新记录？")
-            else:
-                msg_parts.append("\n没有新的记录需要导入。")
-
-            msg = "\n".join(msg_parts)
-            
-            if new_records and messagebox.askyesno("确认导入", msg, parent=self):
-                self.app.run_long_task(self._db_insert_worker, self._on_db_insert_complete, new_records)
-            elif not new_records:
-                 messagebox.showinfo("导入完成", msg, parent=self)
-
-
-    def _db_insert_worker(self, records):
-        return self.db_manager.bulk_insert_records(self.table_name, records)
-
-    def _on_db_insert_complete(self, inserted_count):
-        self.app.show_status_message(f"成功导入 {inserted_count} 条新记录！")
+            msg_parts = [f"成功解析 {total_rows} 条记录，其中 {len(records)} 条有效。"]
+            if invalid_report:
+                msg_parts.append(invalid_report)
+            msg_parts.append("\n日期、姓名、规格都相同的记录（包括文件内重复的行）视为同一条，请选择处理方式：")
+
+            policy = self._ask_conflict_policy("\n".join(msg_parts))
+            if policy:
+                records, merged_count = merge_duplicate_keys(records, self.table_name, policy)
+                if merged_count:
+                    self.app.show_status_message(f"文件内有 {merged_count} 行与其他行重复，已合并。")
+                # 先把待导入记录写入断点库，中途失败后可从断点继续
+                job_key = import_job_key(file_path, self.table_name)
+                self.import_checkpoint.create(job_key, file_path, self.table_name, records, policy)
+                self.app.run_progress_task(self._db_insert_worker, self._on_db_insert_complete, job_key)
+
+    def _ask_conflict_policy(self, message):
+        # 返回 'skip' / 'overwrite' / 'sum'，取消返回 None
+        dialog = tk.Toplevel(self)
+        dialog.title("确认导入")
+        dialog.transient(self.winfo_toplevel())
+        dialog.resizable(False, False)
+        ttk.Label(dialog, text=message, justify='left', wraplength=460).pack(padx=15, pady=(15, 10), anchor='w')
+        policy_var = tk.StringVar(value='skip')
+        for value, text in (('skip', "跳过：保留已有记录，不导入重复的行"),
+                            ('overwrite', "覆盖：用文件中的数据替换已有记录"),
+                            ('sum', "累加：把重量和金额加到已有记录上")):
+            ttk.Radiobutton(dialog, text=text, value=value, variable=policy_var).pack(padx=25, pady=2, anchor='w')
+        result = {'policy': None}
+
+        def confirm():
+            result['policy'] = policy_var.get()
+            dialog.destroy()
+
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(pady=15)
+        ttk.Button(button_frame, text="确定导入", command=confirm).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="取消", command=dialog.destroy).pack(side='left', padx=5)
+        dialog.grab_set()
+        self.wait_window(dialog)
+        return result['policy']
+
+    def _db_insert_worker(self, progress, job_key):
+        return run_import_job(self.db_manager, self.import_checkpoint, job_key, progress)
+
+    def _on_db_insert_complete(self, result):
+        if result['error']:
+            messagebox.showerror("导入中断", f"已导入 {result['done']} / {result['total']} 条记录，{result['error']}。\n"
+                                 "请检查网络后重新导入同一文件，将从中断处继续。", parent=self)
+        else:
+            self.app.show_status_message(
+                f"导入完成：新增 {result['inserted']} 条，更新 {result['updated']} 条，跳过 {result['skipped']} 条。")
         self.load_paged_records()
 
     def _import_from_excel(self):
-        file_path = filedialog.askopenfilename(title="请选择要导入的Excel文件", filetypes=[("Excel 文件", "*.xlsx")])
+        file_path = filedialog.askopenfilename(title="请选择要导入的文件（Excel / CSV / Parquet）", filetypes=import_file_types())
         if not file_path: 
             return
-        self.app.run_long_task(self._import_worker, self._on_import_complete, file_path)
+        job_key = import_job_key(file_path, self.table_name)
+        pending = self.import_checkpoint.pending(job_key)
+        if pending:
+            done, total = pending
+            if messagebox.askyesno("继续导入", f"该文件上次导入到第 {done} / {total} 条时中断，是否从中断处继续？\n"
+                                   "选择“否”将重新解析整个文件。", parent=self):
+                self.app.run_progress_task(self._db_insert_worker, self._on_db_insert_complete, job_key)
+                return
+            self.import_checkpoint.discard(job_key)
+        self.app.run_progress_task(self._import_worker, self._on_import_complete, file_path)
     
     # (其余方法保持不变, 此处省略...)
     def _create_form_fields(self):
@@ -0,0 +1,172 @@
+# 文件路径: src/tabs/virtual_tree.py
+# 版本：虚拟滚动的记录列表，Treeview 中只保留可见窗口的行，数据按块从数据库预取
+
+import logging
+import collections
+from tkinter import ttk
+from ..task_executor import PRIORITY_UI, PRIORITY_BACKGROUND
+
+
+class VirtualRecordView(ttk.Frame):
+    """
+    fetch_block(block_index, block_size) 与 fetch_total() 通过 submit_task（即 app.submit_task）
+    在共享的后台任务池中执行，结果回到 Tk 主线程；界面只渲染当前可见的几十行。
+    """
+
+    BLOCK_SIZE = 200
+    MAX_CACHED_BLOCKS = 50
+    ROW_HEIGHT = 28
+
+    def __init__(self, parent, columns, fetch_block, fetch_total, submit_task):
+        super().__init__(parent)
+        self.submit_task = submit_task
+        self.fetch_block = fetch_block
+        self.fetch_total = fetch_total
+        self.total = 0
+        self.top = 0
+        self.visible_rows = 20
+        # 每次 reload 递增，旧查询返回的结果据此丢弃
+        self.generation = 0
+        self._blocks = collections.OrderedDict()
+        # 未完成的查询 {key: task}，reload 时取消，不再占用任务池
+        self._pending = {}
+
+        self.rowconfigure(0, weight=1)
+        self.columnconfigure(0, weight=1)
+        self.tree = ttk.Treeview(self, columns=columns, show="headings")
+        self.tree.grid(row=0, column=0, sticky='nsew')
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.scrollbar.grid(row=0, column=1, sticky='ns')
+        self.status_label = ttk.Label(self, text="")
+        self.status_label.grid(row=1, column=0, columnspan=2, sticky='w', pady=(5, 0))
+
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll_to(self.top - int(e.delta / 120) * 3))
+        self.tree.bind("<Button-4>", lambda e: self.scroll_to(self.top - 3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_to(self.top + 3))
+        self.tree.bind("<Prior>", lambda e: self.scroll_to(self.top - self.visible_rows))
+        self.tree.bind("<Next>", lambda e: self.scroll_to(self.top + self.visible_rows))
+
+    def reload(self):
+        self.generation += 1
+        self._blocks.clear()
+        self._cancel_pending()
+        self.top = 0
+        self.tree.delete(*self.tree.get_children())
+        self.status_label.config(text="正在统计记录数...")
+        self._submit(('total', self.generation, None), PRIORITY_UI, self.fetch_total)
+
+    def refresh(self):
+        # 记录有增删时重新统计并加载，但保持当前滚动位置
+        self.generation += 1
+        self._blocks.clear()
+        self._cancel_pending()
+        self._submit(('total', self.generation, None), PRIORITY_UI, self.fetch_total)
+
+    def update_rows(self, rows):
+        # rows 为 {记录ID字符串: 记录元组}，只替换缓存块和可见行中已有的记录，位置不变
+        for block in self._blocks.values():
+            for i, record in enumerate(block):
+                if str(record[0]) in rows:
+                    block[i] = rows[str(record[0])]
+        for item in self.tree.get_children():
+            record_id = str(self.tree.item(item, 'values')[0])
+            if record_id in rows:
+                self.tree.item(item, values=rows[record_id])
+
+    def scroll_to(self, top):
+        top = max(0, min(int(top), max(self.total - self.visible_rows, 0)))
+        if top != self.top:
+            self.top = top
+            self._render()
+        return "break"
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == 'moveto':
+            self.scroll_to(float(value) * self.total)
+        elif action == 'scroll':
+            step = self.visible_rows if unit == 'pages' else 1
+            self.scroll_to(self.top + int(value) * step)
+
+    def _on_resize(self, event):
+        visible_rows = max(1, event.height // self.ROW_HEIGHT - 1)
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self._render()
+
+    def _render(self):
+        first_block = self.top // self.BLOCK_SIZE
+        last_block = (self.top + self.visible_rows) // self.BLOCK_SIZE
+        rows = []
+        missing = False
+        for index in range(self.top, min(self.top + self.visible_rows, self.total)):
+            block = self._get_block(index // self.BLOCK_SIZE)
+            offset = index % self.BLOCK_SIZE
+            if block is None or offset >= len(block):
+                missing = True
+                break
+            rows.append((index, block[offset]))
+        # 可见的块优先读取，再以后台优先级预取前后相邻的块，滚动时通常已在缓存中
+        for block_index in range(first_block - 1, last_block + 2):
+            if 0 <= block_index * self.BLOCK_SIZE < self.total:
+                visible = first_block <= block_index <= last_block
+                self._request_block(block_index, PRIORITY_UI if visible else PRIORITY_BACKGROUND)
+
+        self.tree.delete(*self.tree.get_children())
+        for index, record in rows:
+            tag = 'evenrow' if index % 2 != 0 else 'oddrow'
+            self.tree.insert("", "end", values=record, tags=(tag,))
+        if self.total:
+            self.scrollbar.set(self.top / self.total, min(self.top + self.visible_rows, self.total) / self.total)
+        else:
+            self.scrollbar.set(0, 1)
+        end = min(self.top + self.visible_rows, self.total)
+        loading = " (加载中...)" if missing else ""
+        self.status_label.config(text=f"第 {self.top + 1 if self.total else 0} - {end} 条，共 {self.total} 条{loading}")
+
+    def _get_block(self, block_index):
+        block = self._blocks.get(block_index)
+        if block is not None:
+            self._blocks.move_to_end(block_index)
+        return block
+
+    def _request_block(self, block_index, priority):
+        key = ('block', self.generation, block_index)
+        if block_index in self._blocks or key in self._pending:
+            return
+        self._submit(key, priority, self.fetch_block, block_index, self.BLOCK_SIZE)
+
+    def _submit(self, key, priority, func, *args):
+        def loaded(result):
+            self._pending.pop(key, None)
+            kind, generation, block_index = key
+            if generation != self.generation or result is None:
+                return
+            if kind == 'total':
+                self.total = result
+                self.top = min(self.top, max(self.total - self.visible_rows, 0))
+            elif not result and block_index * self.BLOCK_SIZE < self.total:
+                # 总数范围内的块不应为空，不缓存，滚动时重新请求
+                logging.warning(f"虚拟列表第 {block_index} 块返回空结果，稍后重试")
+                return
+            else:
+                self._blocks[block_index] = result
+                while len(self._blocks) > self.MAX_CACHED_BLOCKS:
+                    self._blocks.popitem(last=False)
+            self._render()
+
+        def failed(error):
+            # 滚动时会再次请求，不弹窗打断用户
+            self._pending.pop(key, None)
+            logging.error(f"虚拟列表加载数据失败: {error}")
+
+        self._pending[key] = self.submit_task(func, loaded, *args, priority=priority, on_error=failed)
+
+    def _cancel_pending(self):
+        for task in self._pending.values():
+            task.cancel()
+        self._pending.clear()
+
+    def destroy(self):
+        self._cancel_pending()
+        super().destroy()
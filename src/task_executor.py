@@ -0,0 +1,144 @@
+# 文件路径: src/task_executor.py
+# 版本：共享的后台任务池，固定数量的工作线程按优先级取任务，结果统一由界面线程派发
+#
+# 工作线程只执行任务函数，从不接触 Tk 控件；完成、出错和进度都放入同一个结果队列，
+# 由界面线程定时调用 dispatch() 依次执行回调。一个程序只需一个 TaskExecutor。
+
+import queue
+import logging
+import itertools
+import threading
+
+# 数字越小越先执行：界面上正在等待的读取 > 用户发起的保存、导出 > 后台维护任务
+PRIORITY_UI = 0
+PRIORITY_NORMAL = 5
+PRIORITY_BACKGROUND = 10
+
+DEFAULT_MAX_WORKERS = 4
+
+
+class TaskCancelled(Exception):
+    """任务被取消。由 progress 回调在工作线程中抛出，使长任务在下一次报告进度时停止。"""
+
+
+class Task:
+    def __init__(self, executor, function, args, priority, on_complete, on_error, on_progress, with_progress):
+        self._executor = executor
+        self.function = function
+        self.args = args
+        self.priority = priority
+        self.on_complete = on_complete
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.with_progress = with_progress
+        self.finished = False
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        # 尚未开始的任务不再执行；正在执行的任务结果被丢弃，带进度的任务在下一次报告进度时停止
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def report_progress(self, done, total, text=""):
+        if self.cancelled:
+            raise TaskCancelled()
+        self._executor._results.put(('progress', self, (done, total, text)))
+
+    def _run(self):
+        if self.cancelled:
+            return 'cancelled', None
+        try:
+            if self.with_progress:
+                return 'success', self.function(self.report_progress, *self.args)
+            return 'success', self.function(*self.args)
+        except TaskCancelled:
+            return 'cancelled', None
+        except Exception as e:
+            logging.error(f"后台任务 {getattr(self.function, '__name__', self.function)} 出错: {e}", exc_info=True)
+            return 'error', e
+
+
+class TaskExecutor:
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, on_error=None):
+        # on_error(exception)：任务没有指定 on_error 时使用的默认错误处理，在界面线程中调用
+        self.default_on_error = on_error
+        self._tasks = queue.PriorityQueue()
+        self._results = queue.Queue()
+        self._sequence = itertools.count()
+        self._active = set()
+        self._lock = threading.Lock()
+        self._workers = [threading.Thread(target=self._work, name=f"task-worker-{i}", daemon=True)
+                         for i in range(max(1, max_workers))]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, function, *args, priority=PRIORITY_NORMAL, on_complete=None, on_error=None,
+               on_progress=None, with_progress=False):
+        # with_progress=True 时 function 的第一个参数是 progress(done, total, text)；所有回调都在界面线程中执行
+        task = Task(self, function, args, priority, on_complete, on_error, on_progress, with_progress)
+        with self._lock:
+            self._active.add(task)
+        # 相同优先级按提交顺序执行
+        self._tasks.put((priority, next(self._sequence), task))
+        return task
+
+    def pending_count(self):
+        # 已提交但尚未派发结果的任务数
+        with self._lock:
+            return len(self._active)
+
+    def shutdown(self):
+        # 取消所有未完成的任务并让工作线程退出，不等待正在执行的任务
+        with self._lock:
+            for task in self._active:
+                task.cancel()
+        for _ in self._workers:
+            self._tasks.put((-1, next(self._sequence), None))
+
+    def _work(self):
+        while True:
+            _, _, task = self._tasks.get()
+            if task is None:
+                return
+            status, result = task._run()
+            self._results.put((status, task, result))
+
+    def dispatch(self, max_items=100):
+        # 在界面线程中调用：执行已完成任务的回调，同一任务的多次进度只保留最新一次
+        items = []
+        while len(items) < max_items:
+            try:
+                items.append(self._results.get_nowait())
+            except queue.Empty:
+                break
+        latest_progress = {}
+        for status, task, result in items:
+            if status == 'progress':
+                latest_progress[task] = result
+                continue
+            task.finished = True
+            with self._lock:
+                self._active.discard(task)
+            if status == 'cancelled' or task.cancelled:
+                continue
+            if status == 'success':
+                if task.on_complete:
+                    self._call(task.on_complete, result)
+            else:
+                handler = task.on_error or self.default_on_error
+                if handler:
+                    self._call(handler, result)
+        for task, progress in latest_progress.items():
+            if not task.finished and not task.cancelled and task.on_progress:
+                self._call(task.on_progress, *progress)
+        return len(items)
+
+    def _call(self, callback, *args):
+        # 某个回调出错不能影响其他任务的派发
+        try:
+            callback(*args)
+        except Exception as e:
+            logging.error(f"任务回调出错: {e}", exc_info=True)
@@ -3,6 +3,7 @@
 
 import os
 import sys
+import subprocess
 from passlib.context import CryptContext # 导入 passlib
 
 # --- 新增：创建密码哈希上下文 ---
@@ -23,4 +24,13 @@ def resource_path(relative_path):
         base_path = sys._MEIPASS
     except Exception:
         base_path = os.path.abspath(".")
-    return os.path.join(base_path, relative_path)
\ No newline at end of file
+    return os.path.join(base_path, relative_path)
+
+def open_path(path):
+    """ 用系统默认程序打开文件或文件夹, 兼容 Windows / macOS / Linux """
+    if sys.platform.startswith('win'):
+        os.startfile(path)
+    elif sys.platform == 'darwin':
+        subprocess.Popen(['open', path])
+    else:
+        subprocess.Popen(['xdg-open', path])
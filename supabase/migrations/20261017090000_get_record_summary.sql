@@ -0,0 +1,44 @@
+-- 看板汇总下推到数据库：按 日/周/月 聚合金额与重量，客户端只接收聚合后的行
+create or replace function public.get_record_summary(
+    p_record_type text,
+    p_start_date date,
+    p_end_date date,
+    p_name text default null,
+    p_granularity text default 'day'
+)
+returns table (date date, total_revenue double precision, total_weight double precision)
+language plpgsql
+stable
+as $$
+begin
+    if p_granularity not in ('day', 'week', 'month') then
+        raise exception 'unsupported granularity: %', p_granularity;
+    end if;
+
+    if p_record_type = 'grower' then
+        return query
+            select date_trunc(p_granularity, r.date::timestamp)::date,
+                   sum(r.total_amount)::double precision,
+                   sum(r.net_weight)::double precision
+            from public.grower_records r
+            where r.date::date between p_start_date and p_end_date
+              and (p_name is null or r.grower_name = p_name)
+            group by 1
+            order by 1;
+    elsif p_record_type = 'client' then
+        return query
+            select date_trunc(p_granularity, r.date::timestamp)::date,
+                   sum(r.total_amount)::double precision,
+                   sum(r.weight)::double precision
+            from public.client_records r
+            where r.date::date between p_start_date and p_end_date
+              and (p_name is null or r.client_name = p_name)
+            group by 1
+            order by 1;
+    else
+        raise exception 'unsupported record type: %', p_record_type;
+    end if;
+end;
+$$;
+
+grant execute on function public.get_record_summary(text, date, date, text, text) to anon, authenticated;
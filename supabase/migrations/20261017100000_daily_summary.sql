@@ -0,0 +1,159 @@
+-- 增量维护的日汇总表：(record_type, date, name, spec) -> 重量/金额/记录数
+-- 由触发器在同一事务内维护，桌面端、网页端、同步队列的写入都会自动更新
+
+create table if not exists public.daily_summary (
+    record_type text not null,
+    date date not null,
+    name text not null,
+    spec text not null,
+    total_weight double precision not null default 0,
+    total_amount double precision not null default 0,
+    record_count integer not null default 0,
+    primary key (record_type, date, name, spec)
+);
+
+create index if not exists idx_daily_summary_type_date on public.daily_summary (record_type, date);
+create index if not exists idx_daily_summary_type_name_date on public.daily_summary (record_type, name, date);
+
+create or replace function public.apply_daily_summary_delta(
+    p_record_type text, p_date date, p_name text, p_spec text,
+    p_weight double precision, p_amount double precision, p_count integer
+)
+returns void
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    insert into public.daily_summary as s (record_type, date, name, spec, total_weight, total_amount, record_count)
+    values (p_record_type, p_date, p_name, p_spec, coalesce(p_weight, 0), coalesce(p_amount, 0), p_count)
+    on conflict (record_type, date, name, spec) do update
+        set total_weight = s.total_weight + excluded.total_weight,
+            total_amount = s.total_amount + excluded.total_amount,
+            record_count = s.record_count + excluded.record_count;
+
+    delete from public.daily_summary
+    where record_type = p_record_type and date = p_date and name = p_name and spec = p_spec and record_count <= 0;
+end;
+$$;
+
+create or replace function public.grower_records_daily_summary()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform public.apply_daily_summary_delta('grower', old.date::date, old.grower_name, old.spec, -old.net_weight, -old.total_amount, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform public.apply_daily_summary_delta('grower', new.date::date, new.grower_name, new.spec, new.net_weight, new.total_amount, 1);
+    end if;
+    return null;
+end;
+$$;
+
+create or replace function public.client_records_daily_summary()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform public.apply_daily_summary_delta('client', old.date::date, old.client_name, old.spec, -old.weight, -old.total_amount, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform public.apply_daily_summary_delta('client', new.date::date, new.client_name, new.spec, new.weight, new.total_amount, 1);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists trg_grower_records_daily_summary on public.grower_records;
+create trigger trg_grower_records_daily_summary
+    after insert or update or delete on public.grower_records
+    for each row execute function public.grower_records_daily_summary();
+
+drop trigger if exists trg_client_records_daily_summary on public.client_records;
+create trigger trg_client_records_daily_summary
+    after insert or update or delete on public.client_records
+    for each row execute function public.client_records_daily_summary();
+
+-- 全量重建，用于修复汇总表
+create or replace function public.rebuild_daily_summary()
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    inserted_rows integer;
+begin
+    lock table public.daily_summary in exclusive mode;
+    delete from public.daily_summary;
+    insert into public.daily_summary (record_type, date, name, spec, total_weight, total_amount, record_count)
+    select 'grower', date::date, grower_name, spec, coalesce(sum(net_weight), 0), coalesce(sum(total_amount), 0), count(*)
+    from public.grower_records group by date::date, grower_name, spec
+    union all
+    select 'client', date::date, client_name, spec, coalesce(sum(weight), 0), coalesce(sum(total_amount), 0), count(*)
+    from public.client_records group by date::date, client_name, spec;
+    get diagnostics inserted_rows = row_count;
+    return inserted_rows;
+end;
+$$;
+
+-- 看板汇总改为读取日汇总表，代价只与天数相关
+create or replace function public.get_record_summary(
+    p_record_type text,
+    p_start_date date,
+    p_end_date date,
+    p_name text default null,
+    p_granularity text default 'day'
+)
+returns table (date date, total_revenue double precision, total_weight double precision)
+language plpgsql
+stable
+as $$
+begin
+    if p_granularity not in ('day', 'week', 'month') then
+        raise exception 'unsupported granularity: %', p_granularity;
+    end if;
+
+    return query
+        select date_trunc(p_granularity, s.date::timestamp)::date,
+               sum(s.total_amount),
+               sum(s.total_weight)
+        from public.daily_summary s
+        where s.record_type = p_record_type
+          and s.date between p_start_date and p_end_date
+          and (p_name is null or s.name = p_name)
+        group by 1
+        order by 1;
+end;
+$$;
+
+create or replace function public.get_summary_totals(
+    p_record_type text,
+    p_start_date date default null,
+    p_end_date date default null,
+    p_name text default null
+)
+returns table (total_weight double precision, total_amount double precision, record_count bigint)
+language sql
+stable
+as $$
+    select coalesce(sum(s.total_weight), 0), coalesce(sum(s.total_amount), 0), coalesce(sum(s.record_count), 0)
+    from public.daily_summary s
+    where s.record_type = p_record_type
+      and (p_start_date is null or s.date >= p_start_date)
+      and (p_end_date is null or s.date <= p_end_date)
+      and (p_name is null or s.name = p_name);
+$$;
+
+grant select on public.daily_summary to anon, authenticated;
+grant execute on function public.rebuild_daily_summary() to anon, authenticated;
+grant execute on function public.get_summary_totals(text, date, date, text) to anon, authenticated;
+
+select public.rebuild_daily_summary();
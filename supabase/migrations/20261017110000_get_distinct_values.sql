@@ -0,0 +1,27 @@
+-- 下拉框候选值：数据库端 DISTINCT，只传回唯一值而不是整列
+create or replace function public.get_distinct_values(p_table text, p_column text)
+returns table (value text)
+language plpgsql
+stable
+as $$
+begin
+    if not (
+        (p_table = 'grower_records' and p_column in ('grower_name', 'spec'))
+        or (p_table = 'client_records' and p_column in ('client_name', 'spec'))
+    ) then
+        raise exception 'unsupported column: %.%', p_table, p_column;
+    end if;
+
+    return query execute format(
+        'select distinct %1$I::text from public.%2$I where %1$I is not null and %1$I::text <> '''' order by 1',
+        p_column, p_table
+    );
+end;
+$$;
+
+create index if not exists idx_grower_records_name_date on public.grower_records (grower_name, date);
+create index if not exists idx_client_records_name_date on public.client_records (client_name, date);
+create index if not exists idx_grower_records_spec on public.grower_records (spec);
+create index if not exists idx_client_records_spec on public.client_records (spec);
+
+grant execute on function public.get_distinct_values(text, text) to anon, authenticated;
@@ -0,0 +1,36 @@
+-- 每张业务表一个版本号，任何增删改语句执行后递增一次
+-- 网页端用它生成 ETag，并判断缓存的页面是否仍然有效
+
+create table if not exists public.table_versions (
+    table_name text primary key,
+    version bigint not null default 0,
+    updated_at timestamptz not null default now()
+);
+
+insert into public.table_versions (table_name) values ('grower_records'), ('client_records')
+on conflict (table_name) do nothing;
+
+create or replace function public.bump_table_version()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    update public.table_versions
+    set version = version + 1, updated_at = now()
+    where table_name = tg_table_name;
+    return null;
+end;
+$$;
+
+-- 语句级触发器：批量插入一千行也只递增一次
+drop trigger if exists trg_grower_records_version on public.grower_records;
+create trigger trg_grower_records_version
+    after insert or update or delete on public.grower_records
+    for each statement execute function public.bump_table_version();
+
+drop trigger if exists trg_client_records_version on public.client_records;
+create trigger trg_client_records_version
+    after insert or update or delete on public.client_records
+    for each statement execute function public.bump_table_version();
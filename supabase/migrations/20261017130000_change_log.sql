@@ -0,0 +1,59 @@
+-- 变更日志：业务表每一行的增删改都追加一条记录
+-- 桌面端和网页端按 seq 增量读取，只更新列表中受影响的行，不必整页刷新
+
+create table if not exists public.change_log (
+    seq bigserial primary key,
+    table_name text not null,
+    op text not null,
+    record_id bigint not null,
+    record jsonb,
+    changed_at timestamptz not null default now()
+);
+
+create or replace function public.log_record_change()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if tg_op = 'DELETE' then
+        insert into public.change_log (table_name, op, record_id, record)
+        values (tg_table_name, 'delete', old.id, null);
+    else
+        insert into public.change_log (table_name, op, record_id, record)
+        values (tg_table_name, lower(tg_op), new.id, to_jsonb(new));
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists trg_grower_records_changes on public.grower_records;
+create trigger trg_grower_records_changes
+    after insert or update or delete on public.grower_records
+    for each row execute function public.log_record_change();
+
+drop trigger if exists trg_client_records_changes on public.client_records;
+create trigger trg_client_records_changes
+    after insert or update or delete on public.client_records
+    for each row execute function public.log_record_change();
+
+-- 只保留最近 p_keep 条，由网页端的变更推送线程定期调用
+create or replace function public.prune_change_log(p_keep bigint default 10000)
+returns bigint
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    removed bigint;
+begin
+    delete from public.change_log
+    where seq <= (select max(seq) from public.change_log) - p_keep;
+    get diagnostics removed = row_count;
+    return removed;
+end;
+$$;
+
+grant select on public.change_log to anon, authenticated;
+grant execute on function public.prune_change_log(bigint) to anon, authenticated;
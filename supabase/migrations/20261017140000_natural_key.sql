@@ -0,0 +1,96 @@
+-- 自然键唯一约束：同一天、同一人、同一规格只能有一条记录
+-- 导入改为调用 import_records，在一条 INSERT ... ON CONFLICT 语句中完成查重和写入，并发导入也不会产生重复
+
+do $$
+begin
+    if exists (select 1 from public.grower_records group by date, grower_name, spec having count(*) > 1) then
+        raise exception 'grower_records 中存在日期、姓名、规格都相同的重复记录，请先合并后再执行本迁移';
+    end if;
+    if exists (select 1 from public.client_records group by date, client_name, spec having count(*) > 1) then
+        raise exception 'client_records 中存在日期、姓名、规格都相同的重复记录，请先合并后再执行本迁移';
+    end if;
+end;
+$$;
+
+create unique index if not exists uq_grower_records_natural_key
+    on public.grower_records (date, grower_name, spec);
+create unique index if not exists uq_client_records_natural_key
+    on public.client_records (date, client_name, spec);
+
+-- p_policy: skip 跳过已有记录；overwrite 用导入的值覆盖；sum 把重量和金额累加到已有记录上
+-- 返回 {"inserted": n, "updated": n, "skipped": n}
+-- overwrite / sum 时同一批中的自然键不能重复（导入前已在文件内合并），skip 时重复的行按已有记录跳过
+create or replace function public.import_records(p_table text, p_records jsonb, p_policy text default 'skip')
+returns jsonb
+language plpgsql
+security invoker
+set search_path = public
+as $$
+declare
+    total bigint := jsonb_array_length(p_records);
+    inserted bigint;
+    updated bigint;
+begin
+    if p_policy not in ('skip', 'overwrite', 'sum') then
+        raise exception '未知的冲突处理方式: %', p_policy;
+    end if;
+
+    if p_table = 'grower_records' and p_policy = 'skip' then
+        with written as (
+            insert into public.grower_records (date, grower_name, spec, gross_weight, secondary_fruit, tare_weight, net_weight, unit_price, total_amount, notes)
+            select date, grower_name, spec, gross_weight, secondary_fruit, tare_weight, net_weight, unit_price, total_amount, notes
+            from jsonb_populate_recordset(null::public.grower_records, p_records)
+            on conflict (date, grower_name, spec) do nothing
+            returning 1
+        )
+        select count(*), 0 into inserted, updated from written;
+    elsif p_table = 'grower_records' then
+        with written as (
+            insert into public.grower_records as t
+                (date, grower_name, spec, gross_weight, secondary_fruit, tare_weight, net_weight, unit_price, total_amount, notes)
+            select date, grower_name, spec, gross_weight, secondary_fruit, tare_weight, net_weight, unit_price, total_amount, notes
+            from jsonb_populate_recordset(null::public.grower_records, p_records)
+            on conflict (date, grower_name, spec) do update set
+                gross_weight = case when p_policy = 'sum' then coalesce(t.gross_weight, 0) + coalesce(excluded.gross_weight, 0) else excluded.gross_weight end,
+                secondary_fruit = case when p_policy = 'sum' then coalesce(t.secondary_fruit, 0) + coalesce(excluded.secondary_fruit, 0) else excluded.secondary_fruit end,
+                tare_weight = case when p_policy = 'sum' then coalesce(t.tare_weight, 0) + coalesce(excluded.tare_weight, 0) else excluded.tare_weight end,
+                net_weight = case when p_policy = 'sum' then coalesce(t.net_weight, 0) + coalesce(excluded.net_weight, 0) else excluded.net_weight end,
+                unit_price = case when p_policy = 'sum' then t.unit_price else excluded.unit_price end,
+                total_amount = case when p_policy = 'sum' then coalesce(t.total_amount, 0) + coalesce(excluded.total_amount, 0) else excluded.total_amount end,
+                notes = case when p_policy = 'sum' then t.notes else excluded.notes end
+            returning (xmax = 0) as is_insert
+        )
+        select count(*) filter (where is_insert), count(*) filter (where not is_insert) into inserted, updated from written;
+    elsif p_table = 'client_records' and p_policy = 'skip' then
+        with written as (
+            insert into public.client_records (date, client_name, spec, pieces, weight, unit_price, total_amount, notes)
+            select date, client_name, spec, pieces, weight, unit_price, total_amount, notes
+            from jsonb_populate_recordset(null::public.client_records, p_records)
+            on conflict (date, client_name, spec) do nothing
+            returning 1
+        )
+        select count(*), 0 into inserted, updated from written;
+    elsif p_table = 'client_records' then
+        with written as (
+            insert into public.client_records as t
+                (date, client_name, spec, pieces, weight, unit_price, total_amount, notes)
+            select date, client_name, spec, pieces, weight, unit_price, total_amount, notes
+            from jsonb_populate_recordset(null::public.client_records, p_records)
+            on conflict (date, client_name, spec) do update set
+                pieces = case when p_policy = 'sum' then coalesce(t.pieces, 0) + coalesce(excluded.pieces, 0) else excluded.pieces end,
+                weight = case when p_policy = 'sum' then coalesce(t.weight, 0) + coalesce(excluded.weight, 0) else excluded.weight end,
+                unit_price = case when p_policy = 'sum' then t.unit_price else excluded.unit_price end,
+                total_amount = case when p_policy = 'sum' then coalesce(t.total_amount, 0) + coalesce(excluded.total_amount, 0) else excluded.total_amount end,
+                notes = case when p_policy = 'sum' then t.notes else excluded.notes end
+            returning (xmax = 0) as is_insert
+        )
+        select count(*) filter (where is_insert), count(*) filter (where not is_insert) into inserted, updated from written;
+    else
+        raise exception '未知的表: %', p_table;
+    end if;
+
+    return jsonb_build_object('inserted', inserted, 'updated', updated, 'skipped', total - inserted - updated);
+end;
+$$;
+
+grant execute on function public.import_records(text, jsonb, text) to anon, authenticated;
@@ -0,0 +1,3 @@
+-- 写后同步队列按记录查询最近一次变更的时间，判断本地修改与其他终端的修改谁先谁后
+create index if not exists idx_change_log_record
+    on public.change_log (table_name, record_id, seq desc);
@@ -0,0 +1,95 @@
+-- 导入批次登记：import_records 按 p_batch_key 记录已写入的批次
+-- sum 方式不是幂等的，网络超时或程序崩溃后重试同一批会把重量和金额再累加一次；登记后重复的批次直接跳过
+
+create table if not exists public.import_batches (
+    batch_key text primary key,
+    applied_at timestamptz not null default now()
+);
+
+grant select, insert on public.import_batches to anon, authenticated;
+
+-- 参数表变化，先删除旧的三参数版本，避免 PostgREST 按参数名匹配时出现歧义
+drop function if exists public.import_records(text, jsonb, text);
+
+create or replace function public.import_records(p_table text, p_records jsonb, p_policy text default 'skip', p_batch_key text default null)
+returns jsonb
+language plpgsql
+security invoker
+set search_path = public
+as $$
+declare
+    total bigint := jsonb_array_length(p_records);
+    inserted bigint;
+    updated bigint;
+begin
+    if p_policy not in ('skip', 'overwrite', 'sum') then
+        raise exception '未知的冲突处理方式: %', p_policy;
+    end if;
+
+    -- 同一批只写入一次：登记与写入在同一事务中，响应丢失后重试已写入的批次什么都不做
+    if p_batch_key is not null then
+        insert into public.import_batches (batch_key) values (p_batch_key) on conflict do nothing;
+        if not found then
+            return jsonb_build_object('inserted', 0, 'updated', 0, 'skipped', 0);
+        end if;
+    end if;
+
+    if p_table = 'grower_records' and p_policy = 'skip' then
+        with written as (
+            insert into public.grower_records (date, grower_name, spec, gross_weight, secondary_fruit, tare_weight, net_weight, unit_price, total_amount, notes)
+            select date, grower_name, spec, gross_weight, secondary_fruit, tare_weight, net_weight, unit_price, total_amount, notes
+            from jsonb_populate_recordset(null::public.grower_records, p_records)
+            on conflict (date, grower_name, spec) do nothing
+            returning 1
+        )
+        select count(*), 0 into inserted, updated from written;
+    elsif p_table = 'grower_records' then
+        with written as (
+            insert into public.grower_records as t
+                (date, grower_name, spec, gross_weight, secondary_fruit, tare_weight, net_weight, unit_price, total_amount, notes)
+            select date, grower_name, spec, gross_weight, secondary_fruit, tare_weight, net_weight, unit_price, total_amount, notes
+            from jsonb_populate_recordset(null::public.grower_records, p_records)
+            on conflict (date, grower_name, spec) do update set
+                gross_weight = case when p_policy = 'sum' then coalesce(t.gross_weight, 0) + coalesce(excluded.gross_weight, 0) else excluded.gross_weight end,
+                secondary_fruit = case when p_policy = 'sum' then coalesce(t.secondary_fruit, 0) + coalesce(excluded.secondary_fruit, 0) else excluded.secondary_fruit end,
+                tare_weight = case when p_policy = 'sum' then coalesce(t.tare_weight, 0) + coalesce(excluded.tare_weight, 0) else excluded.tare_weight end,
+                net_weight = case when p_policy = 'sum' then coalesce(t.net_weight, 0) + coalesce(excluded.net_weight, 0) else excluded.net_weight end,
+                unit_price = case when p_policy = 'sum' then t.unit_price else excluded.unit_price end,
+                total_amount = case when p_policy = 'sum' then coalesce(t.total_amount, 0) + coalesce(excluded.total_amount, 0) else excluded.total_amount end,
+                notes = case when p_policy = 'sum' then t.notes else excluded.notes end
+            returning (xmax = 0) as is_insert
+        )
+        select count(*) filter (where is_insert), count(*) filter (where not is_insert) into inserted, updated from written;
+    elsif p_table = 'client_records' and p_policy = 'skip' then
+        with written as (
+            insert into public.client_records (date, client_name, spec, pieces, weight, unit_price, total_amount, notes)
+            select date, client_name, spec, pieces, weight, unit_price, total_amount, notes
+            from jsonb_populate_recordset(null::public.client_records, p_records)
+            on conflict (date, client_name, spec) do nothing
+            returning 1
+        )
+        select count(*), 0 into inserted, updated from written;
+    elsif p_table = 'client_records' then
+        with written as (
+            insert into public.client_records as t
+                (date, client_name, spec, pieces, weight, unit_price, total_amount, notes)
+            select date, client_name, spec, pieces, weight, unit_price, total_amount, notes
+            from jsonb_populate_recordset(null::public.client_records, p_records)
+            on conflict (date, client_name, spec) do update set
+                pieces = case when p_policy = 'sum' then coalesce(t.pieces, 0) + coalesce(excluded.pieces, 0) else excluded.pieces end,
+                weight = case when p_policy = 'sum' then coalesce(t.weight, 0) + coalesce(excluded.weight, 0) else excluded.weight end,
+                unit_price = case when p_policy = 'sum' then t.unit_price else excluded.unit_price end,
+                total_amount = case when p_policy = 'sum' then coalesce(t.total_amount, 0) + coalesce(excluded.total_amount, 0) else excluded.total_amount end,
+                notes = case when p_policy = 'sum' then t.notes else excluded.notes end
+            returning (xmax = 0) as is_insert
+        )
+        select count(*) filter (where is_insert), count(*) filter (where not is_insert) into inserted, updated from written;
+    else
+        raise exception '未知的表: %', p_table;
+    end if;
+
+    return jsonb_build_object('inserted', inserted, 'updated', updated, 'skipped', total - inserted - updated);
+end;
+$$;
+
+grant execute on function public.import_records(text, jsonb, text, text) to anon, authenticated;
@@ -0,0 +1,7 @@
+-- rebuild_daily_summary 是 security definer 函数，会锁住并重建整张汇总表，不能让持有 anon key 的客户端调用
+-- 汇总表由触发器增量维护，只有数据修复时才需要重建：请在 Supabase SQL 编辑器中执行
+--     select public.rebuild_daily_summary();
+-- 新建函数默认对 public 开放执行权限，需要一并收回
+
+revoke execute on function public.rebuild_daily_summary() from public, anon, authenticated;
+grant execute on function public.rebuild_daily_summary() to service_role;
@@ -0,0 +1,20 @@
+-- prune_change_log 是 security definer 函数，持有 anon key 的客户端调用它就能清空其他终端增量同步依赖的变更日志
+-- 收回客户端的执行权限，改由数据库内的定时任务每天清理一次，只保留最近 10000 条
+-- 新建函数默认对 public 开放执行权限，需要一并收回
+
+revoke execute on function public.prune_change_log(bigint) from public, anon, authenticated;
+grant execute on function public.prune_change_log(bigint) to service_role;
+
+-- 定时任务依赖 pg_cron 扩展；项目未提供该扩展时跳过，请在 Supabase SQL 编辑器中手动执行
+--     select public.prune_change_log(10000);
+do $$
+begin
+    if exists (select 1 from pg_available_extensions where name = 'pg_cron') then
+        create extension if not exists pg_cron;
+        perform cron.unschedule(jobid) from cron.job where jobname = 'prune-change-log';
+        perform cron.schedule('prune-change-log', '17 3 * * *', 'select public.prune_change_log(10000)');
+    else
+        raise notice '未安装 pg_cron，prune_change_log 需要手动执行';
+    end if;
+end;
+$$;
@@ -0,0 +1,31 @@
+# 文件路径: tests/conftest.py
+# 版本：测试共用的夹具，全部基于临时目录中的 SQLite 数据库，不访问网络
+
+import time
+import pytest
+from src.sqlite_database import SQLiteDatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = SQLiteDatabaseManager(str(tmp_path / "records.db"))
+    yield manager
+    manager.close()
+
+
+def grower(date='2026-01-01', name='张三', spec='大', gross=10.0, price=2.0, **overrides):
+    # 字段齐全的种植户记录，净重与金额按界面的规则计算
+    record = {'date': date, 'grower_name': name, 'spec': spec, 'gross_weight': gross, 'secondary_fruit': 0.0,
+              'tare_weight': 0.0, 'net_weight': gross, 'unit_price': price, 'total_amount': round(gross * price, 2), 'notes': ''}
+    record.update(overrides)
+    return record
+
+
+def wait_for(condition, timeout=10.0):
+    # 等待后台线程完成，超时返回 False
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
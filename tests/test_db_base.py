@@ -0,0 +1,81 @@
+# 文件路径: tests/test_db_base.py
+# 版本：游标编码与进程内缓存
+
+from src.db_base import encode_cursor, decode_cursor
+from src.cache import PageCache, DistinctValueCache
+
+
+def test_cursor_round_trip():
+    assert encode_cursor(('2025-09-18', 41)) == '2025-09-18_41'
+    assert decode_cursor('2025-09-18_41') == ('2025-09-18', 41)
+    assert decode_cursor(encode_cursor(('2025-01-01', 7))) == ('2025-01-01', 7)
+
+
+def test_decode_cursor_rejects_garbage():
+    assert encode_cursor(None) == ''
+    assert decode_cursor('') is None
+    assert decode_cursor(None) is None
+    assert decode_cursor('2025-09-18') is None
+    assert decode_cursor('2025-09-18_abc') is None
+
+
+def test_page_cache_invalidation_is_per_table():
+    cache = PageCache(max_entries=10, ttl_seconds=60)
+    cache.set(('grower_records', 'page', 1), ['a'], cache.generation('grower_records'))
+    cache.set(('client_records', 'page', 1), ['b'], cache.generation('client_records'))
+    cache.invalidate('grower_records')
+    assert cache.get(('grower_records', 'page', 1)) is None
+    assert cache.get(('client_records', 'page', 1)) == ['b']
+
+
+def test_page_cache_drops_results_of_queries_overtaken_by_a_write():
+    # 查询开始后表被写入过，查询结果已经过时，不能放入缓存
+    cache = PageCache(max_entries=10, ttl_seconds=60)
+    generation = cache.generation('grower_records')
+    cache.invalidate('grower_records')
+    cache.set(('grower_records', 'page', 1), ['stale'], generation)
+    assert cache.get(('grower_records', 'page', 1)) is None
+
+
+
+def test_page_cache_global_invalidate_covers_tables_with_queries_in_flight():
+    # 表还没有缓存条目，但已有查询在进行中；全部失效后该查询的结果同样不能放入缓存
+    cache = PageCache(max_entries=10, ttl_seconds=60)
+    generation = cache.generation('grower_records')
+    cache.invalidate()
+    cache.set(('grower_records', 'page', 1), ['stale'], generation)
+    assert cache.get(('grower_records', 'page', 1)) is None
+
+
+def test_page_cache_evicts_least_recently_used():
+    cache = PageCache(max_entries=2, ttl_seconds=60)
+    for i in range(2):
+        cache.set(('t', i), i, cache.generation('t'))
+    cache.get(('t', 0))
+    cache.set(('t', 2), 2, cache.generation('t'))
+    assert cache.get(('t', 1)) is None
+    assert cache.get(('t', 0)) == 0
+    assert cache.stats()['evictions'] == 1
+
+
+def test_page_cache_disabled_with_zero_entries():
+    cache = PageCache(max_entries=0)
+    cache.set(('t', 1), 'x', cache.generation('t'))
+    assert cache.get(('t', 1)) is None
+
+
+def test_distinct_cache_add_keeps_sorted_unique_values():
+    cache = DistinctValueCache(ttl_seconds=60)
+    cache.add(('t', 'c'), '李四')
+    assert cache.get(('t', 'c')) is None
+    cache.set(('t', 'c'), ['王五', '张三', '王五'])
+    cache.add(('t', 'c'), '李四')
+    cache.add(('t', 'c'), '张三')
+    cache.add(('t', 'c'), '')
+    assert cache.get(('t', 'c')) == sorted(['王五', '张三', '李四'])
+
+
+def test_distinct_cache_expires():
+    cache = DistinctValueCache(ttl_seconds=0)
+    cache.set(('t', 'c'), ['a'])
+    assert cache.get(('t', 'c')) is None
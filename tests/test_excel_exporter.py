@@ -0,0 +1,15 @@
+# 文件路径: tests/test_excel_exporter.py
+# 版本：批量结算文件命名
+
+from src.excel_exporter import unique_file_stem
+
+
+def test_names_that_sanitize_alike_get_distinct_stems():
+    used = set()
+    stems = [unique_file_stem(name, used) for name in ('张/三', '张:三', '张三', '?', '*')]
+    assert stems == ['张三', '张三_2', '张三_3', '未命名', '未命名_2']
+
+
+def test_stems_are_unique_ignoring_case():
+    used = set()
+    assert [unique_file_stem(name, used) for name in ('ab', 'AB')] == ['ab', 'AB_2']
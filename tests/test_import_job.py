@@ -0,0 +1,94 @@
+# 文件路径: tests/test_import_job.py
+# 版本：文件解析的有效行判断、文件内重复键合并，以及分批导入的断点续传
+
+import pytest
+from src.import_job import ImportCheckpoint, merge_duplicate_keys, run_import_job
+from src.excel_importer import CsvImporter
+from conftest import grower
+
+CSV_HEADER = "日期,姓名,规格,毛重(斤),次果(斤),皮重(斤),单价,备注\n"
+
+
+def test_csv_importer_skips_invalid_rows(tmp_path, db):
+    path = tmp_path / "records.csv"
+    path.write_text(CSV_HEADER
+                    + "2026-01-01,张三,大,100,2,3,1.5,\n"      # 第 2 行：有效
+                    + "2026-01-01,李四,大,abc,0,0,1.5,\n"      # 第 3 行：毛重不是数字
+                    + "2026-01-01,,大,100,0,0,1.5,\n"          # 第 4 行：缺少姓名
+                    + "2026/01/03,王五,小,50,,,2,补录\n"        # 第 5 行：另一种日期写法，空白数值按 0
+                    + "不是日期,赵六,小,50,0,0,2,\n",          # 第 6 行：日期无效
+                    encoding='utf-8')
+    importer = CsvImporter(str(path), 'grower', db)
+    records, total = importer.parse()
+    assert total == 5
+    assert [(r['grower_name'], r['date']) for r in records] == [('张三', '2026-01-01'), ('王五', '2026-01-03')]
+    assert records[0]['net_weight'] == 95 and records[0]['total_amount'] == 142.5
+    assert records[1]['secondary_fruit'] == 0 and records[1]['total_amount'] == 100
+    assert [(row, columns) for _, row, columns in importer.invalid_rows] == [(3, '毛重(斤)'), (4, '姓名'), (6, '日期')]
+
+
+def test_csv_importer_reports_missing_columns(tmp_path, db):
+    path = tmp_path / "records.csv"
+    path.write_text("日期,姓名\n2026-01-01,张三\n", encoding='utf-8')
+    importer = CsvImporter(str(path), 'grower', db)
+    assert importer.parse() == (None, 0)
+    assert '规格' in importer.error
+
+
+@pytest.mark.parametrize('policy, net_weight', [('skip', 10.0), ('overwrite', 5.0), ('sum', 15.0)])
+def test_merge_duplicate_keys(policy, net_weight):
+    merged, dropped = merge_duplicate_keys([grower(gross=10.0), grower(spec='小'), grower(gross=5.0)], 'grower_records', policy)
+    assert dropped == 1 and len(merged) == 2
+    assert merged[0]['net_weight'] == net_weight
+
+
+def _create_job(tmp_path, db, records, policy):
+    source = tmp_path / "source.csv"
+    source.write_text("x", encoding='utf-8')
+    checkpoint = ImportCheckpoint(str(tmp_path / "checkpoint.db"))
+    checkpoint.create('job', str(source), 'grower_records', records, policy)
+    return checkpoint
+
+
+class FlakyManager:
+    """前 fail_after 批正常写入，之后每次写入都失败，模拟导入中途断网。"""
+
+    def __init__(self, db, fail_after, lose_response=False):
+        self.db = db
+        self.fail_after = fail_after
+        self.lose_response = lose_response
+        self.calls = 0
+
+    def upsert_records(self, table_name, records, policy='skip', batch_key=None):
+        self.calls += 1
+        if self.calls > self.fail_after:
+            if self.lose_response:
+                # 数据库已经写入，但客户端没有收到响应
+                self.db.upsert_records(table_name, records, policy, batch_key)
+            return None
+        return self.db.upsert_records(table_name, records, policy, batch_key)
+
+
+def test_import_resumes_from_checkpoint(tmp_path, db):
+    records = [grower(name=f"种植户{i}") for i in range(7)]
+    checkpoint = _create_job(tmp_path, db, records, 'skip')
+
+    result = run_import_job(FlakyManager(db, fail_after=1), checkpoint, 'job', batch_size=3, max_retries=0)
+    assert result['error'] and result['done'] == 3 and result['inserted'] == 3
+    assert checkpoint.pending('job') == (3, 7)
+
+    result = run_import_job(db, checkpoint, 'job', batch_size=3, max_retries=0)
+    assert result['error'] is None and result['done'] == 7 and result['inserted'] == 4
+    assert checkpoint.pending('job') is None
+    assert db.count_records('grower_records') == 7
+
+
+def test_sum_import_does_not_double_count_after_lost_response(tmp_path, db):
+    db.upsert_records('grower_records', [grower(gross=10.0)])
+    checkpoint = _create_job(tmp_path, db, [grower(gross=10.0)], 'sum')
+
+    # 写入成功但响应丢失，断点停在 0；续传时同一批次键被数据库识别为已写入
+    assert run_import_job(FlakyManager(db, fail_after=0, lose_response=True), checkpoint, 'job', max_retries=0)['error']
+    assert checkpoint.pending('job') == (0, 1)
+    assert run_import_job(db, checkpoint, 'job', max_retries=0)['error'] is None
+    assert db.get_record_by_key('grower_records', '2026-01-01', '张三', '大')['net_weight'] == 20.0
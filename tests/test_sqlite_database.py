@@ -0,0 +1,126 @@
+# 文件路径: tests/test_sqlite_database.py
+# 版本：SQLite 后端的分页总数、按自然键写入、汇总触发器与旧库重复记录合并
+
+import sqlite3
+import pytest
+from src.sqlite_database import SQLiteDatabaseManager
+from conftest import grower
+
+
+def _fill(db, count):
+    records = [grower(date=f"2026-01-{i % 28 + 1:02d}", name=f"种植户{i}") for i in range(count)]
+    assert db.upsert_records('grower_records', records)['inserted'] == count
+
+
+def test_keyset_paging_keeps_total_and_visits_every_row(db):
+    _fill(db, 25)
+    page = db.fetch_records_page('grower_records', 10)
+    seen = [row[0] for row in page['records']]
+    assert page['total'] == 25 and not page['has_prev']
+    while page['has_next']:
+        page = db.fetch_records_page('grower_records', 10, {}, page['next_cursor'], 'next')
+        # 总数按搜索条件统计，不随游标位置变小
+        assert page['total'] == 25
+        seen.extend(row[0] for row in page['records'])
+    assert len(seen) == 25 and len(set(seen)) == 25
+
+    back = db.fetch_records_page('grower_records', 10, {}, page['prev_cursor'], 'prev')
+    assert back['total'] == 25 and back['has_next']
+    assert [row[0] for row in back['records']] == seen[10:20]
+
+
+
+class CachedSQLiteDatabaseManager(SQLiteDatabaseManager):
+    PAGE_CACHE_ENTRIES = 10
+
+
+def test_cached_results_are_not_shared_with_callers(tmp_path):
+    db = CachedSQLiteDatabaseManager(str(tmp_path / "records.db"))
+    _fill(db, 3)
+    page = db.fetch_records_page('grower_records', 10)
+    page['records'].clear()
+    rows = db.fetch_paged_records('grower_records', 1, 10)
+    rows.pop()
+    assert len(db.fetch_records_page('grower_records', 10)['records']) == 3
+    assert len(db.fetch_paged_records('grower_records', 1, 10)) == 3
+    assert db.get_page_cache_stats()['hits'] == 2
+    db.close()
+
+
+def test_paging_total_follows_search(db):
+    _fill(db, 25)
+    params = {'start_date': '2026-01-01', 'end_date': '2026-01-10'}
+    expected = db.count_records('grower_records', params)
+    first = db.fetch_records_page('grower_records', 5, params)
+    second = db.fetch_records_page('grower_records', 5, params, first['next_cursor'], 'next')
+    assert first['total'] == second['total'] == expected < 25
+    assert db.fetch_records_page('grower_records', 5, params, count_mode=None)['total'] is None
+
+
+@pytest.mark.parametrize('policy, net_weight, counts', [
+    ('skip', 10.0, {'inserted': 1, 'updated': 0, 'skipped': 1}),
+    ('overwrite', 5.0, {'inserted': 1, 'updated': 1, 'skipped': 0}),
+    ('sum', 15.0, {'inserted': 1, 'updated': 1, 'skipped': 0}),
+])
+def test_upsert_policies(db, policy, net_weight, counts):
+    db.upsert_records('grower_records', [grower(gross=10.0)])
+    result = db.upsert_records('grower_records', [grower(gross=5.0), grower(spec='小')], policy)
+    assert result == counts
+    assert db.get_record_by_key('grower_records', '2026-01-01', '张三', '大')['net_weight'] == net_weight
+
+
+def test_upsert_rejects_unknown_policy(db):
+    assert db.upsert_records('grower_records', [grower()], 'merge') is None
+
+
+def test_batch_key_makes_sum_retries_idempotent(db):
+    db.upsert_records('grower_records', [grower(gross=10.0)])
+    assert db.upsert_records('grower_records', [grower(gross=10.0)], 'sum', 'run:0:1')['updated'] == 1
+    # 响应丢失后重发同一批：数据库已登记该批次，不再累加
+    assert db.upsert_records('grower_records', [grower(gross=10.0)], 'sum', 'run:0:1') == {'inserted': 0, 'updated': 0, 'skipped': 0}
+    assert db.get_record_by_key('grower_records', '2026-01-01', '张三', '大')['net_weight'] == 20.0
+
+
+def test_daily_summary_follows_inserts_updates_and_deletes(db):
+    db.upsert_records('grower_records', [grower(gross=10.0), grower(spec='小', gross=4.0)])
+    totals = db.get_summary_totals('grower', '2026-01-01', '2026-01-01')
+    assert totals == {'total_weight': 14.0, 'total_amount': 28.0, 'record_count': 2}
+    record = db.get_record_by_key('grower_records', '2026-01-01', '张三', '小')
+    db.update_record('grower_records', record['id'], {'net_weight': 6.0, 'total_amount': 12.0})
+    db.delete_record('grower_records', db.get_record_by_key('grower_records', '2026-01-01', '张三', '大')['id'])
+    assert db.get_summary_totals('grower', '2026-01-01', '2026-01-01') == {'total_weight': 6.0, 'total_amount': 12.0, 'record_count': 1}
+
+
+def test_add_record_rejects_duplicate_natural_key(db):
+    assert db.add_record('grower_records', grower())
+    assert not db.add_record('grower_records', grower(gross=3.0))
+
+
+def test_get_records_by_keys(db):
+    db.upsert_records('grower_records', [grower(), grower(spec='小'), grower(name='李四')])
+    found = db.get_records_by_keys('grower_records', [('2026-01-01', '张三', '小'), ('2026-01-01', '王五', '大')])
+    assert [(r['grower_name'], r['spec']) for r in found] == [('张三', '小')]
+
+
+def test_old_database_duplicates_are_merged_before_unique_index(tmp_path):
+    path = str(tmp_path / "old.db")
+    SQLiteDatabaseManager(path).close()
+    conn = sqlite3.connect(path)
+    conn.execute("DROP INDEX uq_grower_records_natural_key")
+    for notes in ('上午', '下午', '上午'):
+        record = grower(notes=notes)
+        conn.execute(f"INSERT INTO grower_records ({', '.join(record)}) VALUES ({', '.join('?' for _ in record)})", tuple(record.values()))
+    conn.commit()
+    conn.close()
+
+    db = SQLiteDatabaseManager(path)
+    try:
+        merged = db.get_record_by_key('grower_records', '2026-01-01', '张三', '大')
+        assert db.count_records('grower_records') == 1
+        assert merged['net_weight'] == 30.0 and merged['total_amount'] == 60.0
+        assert sorted(merged['notes'].split(',')) == ['上午', '下午']
+        assert db.get_summary_totals('grower', '2026-01-01', '2026-01-01')['record_count'] == 1
+        # 唯一约束已建立，批量写入可用
+        assert db.upsert_records('grower_records', [grower()], 'skip')['skipped'] == 1
+    finally:
+        db.close()
@@ -0,0 +1,203 @@
+# 文件路径: tests/test_sync_queue.py
+# 版本：写后同步队列的重试、失败、冲突状态转换；用一个本地 SQLite 库充当云端
+
+import time
+import pytest
+from src.sync_queue import SyncJournal, SyncedDatabaseManager
+from conftest import grower, wait_for
+
+
+class Remote:
+    """把 SQLite 数据库当作云端：online=False 模拟断网，poison 中的姓名写入时总是失败，
+    broken 中的记录ID 查询变更日志时总是报错（模拟云端可访问但请求被拒绝）。"""
+
+    def __init__(self, db):
+        self.db = db
+        self.online = True
+        self.poison = set()
+        self.broken = set()
+
+    def __getattr__(self, name):
+        attr = getattr(self.db, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            if not self.online:
+                # 与 DatabaseManager 一致：查询记录是否存在时抛出异常，其余方法返回失败值
+                if name in ('record_exists', 'get_last_change'):
+                    raise ConnectionError("网络不可用")
+                return None
+            return attr(*args, **kwargs)
+        return call
+
+    def get_last_change(self, table_name, record_id):
+        if self.online and str(record_id) in self.broken:
+            raise ValueError("请求被拒绝 (400)")
+        return self.__getattr__('get_last_change')(table_name, record_id)
+
+    def upsert_records(self, table_name, records, policy='skip', batch_key=None):
+        if not self.online or any(r.get('grower_name') in self.poison for r in records):
+            return None
+        return self.db.upsert_records(table_name, records, policy, batch_key)
+
+
+class FastSyncedDatabaseManager(SyncedDatabaseManager):
+    MAX_ATTEMPTS = 2
+    MAX_BACKOFF_SECONDS = 0.1
+    IDLE_INTERVAL_SECONDS = 0.1
+
+
+@pytest.fixture
+def remote(db):
+    return Remote(db)
+
+
+@pytest.fixture
+def synced(tmp_path, remote):
+    manager = FastSyncedDatabaseManager(remote, str(tmp_path / "journal.db"))
+    yield manager
+    manager.close()
+
+
+def _settled(manager):
+    return lambda: manager.get_sync_status()['pending'] == 0
+
+
+def test_journal_failed_attempts_then_failed(tmp_path):
+    journal = SyncJournal(str(tmp_path / "journal.db"))
+    journal.append('grower_records', 'update', 1, {'notes': 'a'})
+    seq = journal.peek(10)[0]['seq']
+
+    journal.mark_failed_attempt([seq], "写入失败", max_attempts=2, retry_delay=60)
+    # 推迟期间不再取出，但仍是 pending
+    assert journal.peek(10) == [] and journal.counts() == {'pending': 1}
+    assert [op['seq'] for op in journal.peek(10, now=time.time() + 61)] == [seq]
+
+    journal.mark_failed_attempt([seq], "写入失败", max_attempts=2, retry_delay=0)
+    assert journal.counts() == {'failed': 1}
+    assert [op['last_error'] for op in journal.problems()] == ["写入失败"]
+
+    journal.requeue(seq, 'overwrite')
+    op = journal.peek(10)[0]
+    assert (op['status'], op['attempts'], op['policy']) == ('pending', 0, 'overwrite')
+    journal.close()
+
+
+def test_journal_holds_back_later_ops_on_a_blocked_record(tmp_path):
+    journal = SyncJournal(str(tmp_path / "journal.db"))
+    journal.append('grower_records', 'update', 1, {'notes': 'a'})
+    journal.append('grower_records', 'update', 2, {'notes': 'b'})
+    journal.append('grower_records', 'delete', 1)
+    first = journal.peek(10)[0]['seq']
+    journal.mark_conflict([first], "云端已修改")
+    # 记录 1 的删除必须等前面的修改处理完，记录 2 不受影响
+    assert [op['record_id'] for op in journal.peek(10)] == ['2']
+    journal.remove([first])
+    assert [op['record_id'] for op in journal.peek(10)] == ['2', '1']
+    journal.close()
+
+
+def test_insert_reaches_remote(synced, db):
+    assert synced.add_record('grower_records', grower())
+    assert wait_for(_settled(synced))
+    assert db.get_record_by_key('grower_records', '2026-01-01', '张三', '大')['net_weight'] == 10.0
+
+
+def test_duplicate_pending_insert_is_rejected(synced, remote):
+    remote.online = False
+    assert synced.add_record('grower_records', grower())
+    assert not synced.add_record('grower_records', grower(gross=3.0))
+    assert synced.get_record_by_key('grower_records', '2026-01-01', '张三', '大')['id'] == synced.PENDING_RECORD_ID
+
+
+def test_outage_does_not_use_up_attempts(synced, remote, db):
+    remote.online = False
+    synced.add_record('grower_records', grower())
+    time.sleep(0.5)
+    status = synced.get_sync_status()
+    assert status['pending'] == 1 and status['failed'] == 0 and status['last_error']
+    remote.online = True
+    assert wait_for(_settled(synced))
+    assert db.count_records('grower_records') == 1
+
+
+def test_failing_op_is_moved_aside_without_blocking_others(synced, remote, db):
+    remote.poison.add('坏数据')
+    synced.add_record('grower_records', grower(name='坏数据'))
+    synced.add_record('grower_records', grower(name='李四'))
+    assert wait_for(lambda: synced.get_sync_status()['failed'] == 1)
+    assert db.get_record_by_key('grower_records', '2026-01-01', '李四', '大') is not None
+    assert db.get_record_by_key('grower_records', '2026-01-01', '坏数据', '大') is None
+
+    remote.poison.clear()
+    seq = synced.get_sync_problems()[0]['seq']
+    synced.resolve_sync_problem(seq, 'retry')
+    assert wait_for(lambda: synced.get_sync_status()['failed'] == 0 and synced.get_sync_status()['pending'] == 0)
+    assert db.count_records('grower_records') == 2
+
+
+def test_op_raising_while_remote_is_reachable_counts_attempts(synced, remote, db):
+    db.add_record('grower_records', grower(name='张三'))
+    db.add_record('grower_records', grower(name='李四'))
+    bad = db.get_record_by_key('grower_records', '2026-01-01', '张三', '大')['id']
+    good = db.get_record_by_key('grower_records', '2026-01-01', '李四', '大')['id']
+    remote.broken.add(str(bad))
+    synced.update_record('grower_records', bad, {'notes': '本地'})
+    synced.update_record('grower_records', good, {'notes': '本地'})
+    # 出错的操作用完重试次数后转为失败，不阻塞其他记录的同步
+    assert wait_for(lambda: synced.get_sync_status()['failed'] == 1)
+    assert synced.get_sync_status()['pending'] == 0
+    assert db.get_record('grower_records', good)['notes'] == '本地'
+    assert synced.get_sync_problems()[0]['last_error'] == "请求被拒绝 (400)"
+
+
+def test_insert_conflicting_with_remote_is_parked_and_summed(synced, db):
+    db.add_record('grower_records', grower(gross=100.0))
+    synced.add_record('grower_records', grower(gross=30.0))
+    assert wait_for(lambda: synced.get_sync_status()['conflict'] == 1)
+    assert db.get_record_by_key('grower_records', '2026-01-01', '张三', '大')['net_weight'] == 100.0
+
+    seq = synced.get_sync_problems()[0]['seq']
+    synced.resolve_sync_problem(seq, 'sum')
+    assert wait_for(lambda: synced.get_sync_status()['conflict'] == 0 and synced.get_sync_status()['pending'] == 0)
+    assert db.get_record_by_key('grower_records', '2026-01-01', '张三', '大')['net_weight'] == 130.0
+
+
+def test_conflicting_insert_can_be_discarded(synced, db):
+    db.add_record('grower_records', grower(gross=100.0))
+    synced.add_record('grower_records', grower(gross=30.0))
+    assert wait_for(lambda: synced.get_sync_status()['conflict'] == 1)
+    synced.resolve_sync_problem(synced.get_sync_problems()[0]['seq'], 'discard')
+    assert synced.get_sync_problems() == []
+    assert db.get_record_by_key('grower_records', '2026-01-01', '张三', '大')['net_weight'] == 100.0
+
+
+def test_update_older_than_remote_change_is_a_conflict(synced, remote, db):
+    db.add_record('grower_records', grower())
+    record_id = db.get_record_by_key('grower_records', '2026-01-01', '张三', '大')['id']
+    remote.online = False
+    synced.update_record('grower_records', record_id, {'notes': '本地'})
+    # 本地修改发生在其他终端修改之前（变更日志时间精确到秒，把本地操作提前几秒）
+    with synced.journal._lock, synced.journal._conn:
+        synced.journal._conn.execute("UPDATE pending_ops SET created_at = created_at - 5")
+    db.update_record('grower_records', record_id, {'notes': '其他终端'})
+    remote.online = True
+    assert wait_for(lambda: synced.get_sync_status()['conflict'] == 1)
+    assert db.get_record('grower_records', record_id)['notes'] == '其他终端'
+
+    seq = synced.get_sync_problems()[0]['seq']
+    with pytest.raises(ValueError):
+        synced.resolve_sync_problem(seq, 'sum')
+    synced.resolve_sync_problem(seq, 'overwrite')
+    assert wait_for(_settled(synced))
+    assert db.get_record('grower_records', record_id)['notes'] == '本地'
+
+
+def test_delete_of_record_already_deleted_remotely_is_done(synced, db):
+    db.add_record('grower_records', grower())
+    record_id = db.get_record_by_key('grower_records', '2026-01-01', '张三', '大')['id']
+    db.delete_record('grower_records', record_id)
+    synced.delete_record('grower_records', record_id)
+    assert wait_for(_settled(synced))
+    assert synced.get_sync_problems() == []
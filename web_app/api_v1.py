@@ -0,0 +1,303 @@
+# 文件路径: web_app/api_v1.py
+# 版本：JSON 接口 /api/v1，供扫码秤终端和脚本读写记录
+#
+#   GET    /api/v1/<表名>?name=&start_date=&end_date=&limit=&after=&before=&fields=&count=
+#   GET    /api/v1/<表名>/<id>?fields=
+#   POST   /api/v1/<表名>            新增记录（JSON），净重与金额由服务器计算
+#   PATCH  /api/v1/<表名>/<id>       修改记录（JSON，只需提供要改的字段）
+#   日期、姓名、规格与已有记录相同时，新增和修改都返回 409
+#   DELETE /api/v1/<表名>/<id>
+#   GET    /api/v1/summary?record_type=grower&start_date=&end_date=&name=&granularity=day
+#
+# 列表按 (date, id) 倒序键集分页，翻页时带上返回的 next_cursor / prev_cursor；
+# 客户端声明 Accept-Encoding: gzip 时较大的响应会被压缩。
+
+import gzip
+import json
+import datetime
+from flask import Blueprint, request
+
+from src.db_base import TABLE_COLUMNS, NAME_COLUMNS, encode_cursor, decode_cursor
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+# 小于该字节数的响应不压缩，压缩收益抵不过开销
+GZIP_MIN_SIZE = 512
+NUMERIC_FIELDS = {'gross_weight', 'secondary_fruit', 'tare_weight', 'net_weight', 'unit_price', 'total_amount', 'pieces', 'weight'}
+REQUIRED_FIELDS = {
+    'grower_records': ('date', 'grower_name', 'spec', 'gross_weight', 'unit_price'),
+    'client_records': ('date', 'client_name', 'spec', 'pieces', 'weight', 'unit_price'),
+}
+# 新增记录时可省略的字段及默认值，与网页表单一致
+DEFAULT_FIELDS = {
+    'grower_records': {'secondary_fruit': 0.0, 'tare_weight': 0.0, 'notes': ''},
+    'client_records': {'notes': ''},
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def json_response(payload, status=200):
+    # 返回 (内容, 状态码, 响应头)，Flask 与 Quart 的视图函数都可以直接返回
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=str)
+    return body, status, {'Content-Type': 'application/json; charset=utf-8'}
+
+
+def check_table(table_name):
+    if table_name not in TABLE_COLUMNS:
+        raise ApiError(404, f"未知的数据表: {table_name}")
+
+
+def parse_fields(table_name, args):
+    fields = args.get('fields', '').strip()
+    if not fields:
+        return None
+    selected = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = [f for f in selected if f != 'id' and f not in TABLE_COLUMNS[table_name]]
+    if unknown:
+        raise ApiError(400, f"未知的字段: {', '.join(unknown)}")
+    return selected
+
+
+def select_fields(record, fields):
+    return record if fields is None else {f: record.get(f) for f in fields}
+
+
+def clean_payload(table_name, data, partial):
+    # 只接受表中已有的列，数值列统一转换为数字，缺少必填字段时报错
+    if not isinstance(data, dict):
+        raise ApiError(400, "请求体必须是 JSON 对象。")
+    unknown = [k for k in data if k not in TABLE_COLUMNS[table_name]]
+    if unknown:
+        raise ApiError(400, f"未知的字段: {', '.join(unknown)}")
+    clean = {}
+    for key, value in data.items():
+        if key in NUMERIC_FIELDS and value is not None:
+            try:
+                value = int(value) if key == 'pieces' else float(value)
+            except (TypeError, ValueError):
+                raise ApiError(400, f"字段 {key} 必须是数字。")
+        elif isinstance(value, str):
+            value = value.strip()
+        clean[key] = value
+    if 'date' in clean:
+        try:
+            datetime.date.fromisoformat(str(clean['date']))
+        except ValueError:
+            raise ApiError(400, "日期格式应为 YYYY-MM-DD。")
+    if not partial:
+        missing = [k for k in REQUIRED_FIELDS[table_name] if clean.get(k) in (None, '')]
+        if missing:
+            raise ApiError(400, f"缺少必填字段: {', '.join(missing)}")
+        for key, value in DEFAULT_FIELDS[table_name].items():
+            if clean.get(key) is None:
+                clean[key] = value
+    return clean
+
+
+def derive_amounts(table_name, record):
+    # 与网页表单相同的计算规则
+    if table_name == 'grower_records':
+        record['net_weight'] = (record.get('gross_weight') or 0) - (record.get('secondary_fruit') or 0) - (record.get('tare_weight') or 0)
+        record['total_amount'] = round(record['net_weight'] * (record.get('unit_price') or 0), 2)
+    else:
+        record['total_amount'] = round((record.get('pieces') or 0) * (record.get('weight') or 0) * (record.get('unit_price') or 0), 2)
+    return record
+
+
+def parse_list_query(args):
+    # 解析列表查询参数，返回 fetch_records_page 所需的 (limit, search_params, cursor, direction, count_mode)
+    try:
+        limit = min(max(int(args.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+    except ValueError:
+        raise ApiError(400, "limit 必须是整数。")
+    search_params = {k: args.get(k, '').strip() for k in ('name', 'start_date', 'end_date')}
+    search_params = {k: v for k, v in search_params.items() if v}
+    after = decode_cursor(args.get('after'))
+    before = decode_cursor(args.get('before'))
+    cursor, direction = (after, 'next') if after else (before, 'prev')
+    # 默认不统计总数，需要时传 count=exact
+    count_mode = 'exact' if args.get('count') == 'exact' else None
+    return limit, search_params, cursor, direction, count_mode
+
+
+def list_payload(table_name, result, fields):
+    columns = ('id',) + TABLE_COLUMNS[table_name]
+    return {
+        'data': [select_fields(dict(zip(columns, row)), fields) for row in result['records']],
+        'total': result['total'],
+        'has_next': result['has_next'],
+        'has_prev': result['has_prev'],
+        'next_cursor': encode_cursor(result['next_cursor']) if result['has_next'] else None,
+        'prev_cursor': encode_cursor(result['prev_cursor']) if result['has_prev'] else None,
+    }
+
+
+def merge_update(table_name, record, changes):
+    # 任何参与计算的字段变化后都重新计算净重和金额；返回 (需要写入的字段, 修改后的完整记录)
+    merged = derive_amounts(table_name, {**record, **changes})
+    changes = dict(changes, **{k: merged[k] for k in ('net_weight', 'total_amount') if k in merged})
+    return changes, {k: merged.get(k) for k in ('id',) + TABLE_COLUMNS[table_name]}
+
+
+def natural_key(table_name, record):
+    return record.get('date'), record.get(NAME_COLUMNS[table_name]), record.get('spec')
+
+
+def save_error(existing, record_id, message):
+    # 保存失败时按 get_record_by_key 的结果区分唯一约束冲突 (409) 与其他错误 (500)
+    if existing and existing.get('id') != record_id:
+        return ApiError(409, f"已存在日期、姓名、规格都相同的记录 (ID {existing['id']})。")
+    return ApiError(500, message)
+
+
+def parse_summary_query(args):
+    record_type = args.get('record_type', 'grower')
+    if record_type not in ('grower', 'client'):
+        raise ApiError(400, "record_type 只能是 grower 或 client。")
+    granularity = args.get('granularity', 'day')
+    start_date = args.get('start_date') or datetime.date.today().replace(day=1).isoformat()
+    end_date = args.get('end_date') or datetime.date.today().isoformat()
+    return record_type, start_date, end_date, args.get('name') or None, granularity
+
+
+def summary_payload(record_type, start_date, end_date, granularity, df, totals):
+    buckets = [] if df.empty else [
+        {'date': row.date.strftime('%Y-%m-%d'), 'total_revenue': float(row.total_revenue or 0), 'total_weight': float(row.total_weight or 0)}
+        for row in df.itertuples(index=False)
+    ]
+    return {
+        'record_type': record_type,
+        'granularity': granularity,
+        'start_date': start_date,
+        'end_date': end_date,
+        'totals': totals,
+        'data': buckets,
+    }
+
+
+def gzip_body(data, accept_encoding):
+    # 客户端接受 gzip 且内容足够大时返回压缩后的字节，否则返回 None
+    if len(data) < GZIP_MIN_SIZE or 'gzip' not in (accept_encoding or '').lower():
+        return None
+    return gzip.compress(data, compresslevel=5)
+
+
+# 以下接口逻辑由 Flask 蓝图和 asgi.py 共用：每个视图是一个生成器，需要数据库时 yield (方法名, 参数...)，
+# 由驱动函数调用同步或异步的数据库接口后把结果 send 回来，最后 return 响应。两种服务不再各写一份视图。
+# 视图的参数为 (查询参数, 请求体 JSON, 路由参数按名称传入)
+
+def list_records_view(args, body, table_name):
+    check_table(table_name)
+    fields = parse_fields(table_name, args)
+    limit, search_params, cursor, direction, count_mode = parse_list_query(args)
+    result = yield 'fetch_records_page', table_name, limit, search_params, cursor, direction, 1, count_mode
+    return json_response(list_payload(table_name, result, fields))
+
+
+def get_record_view(args, body, table_name, record_id):
+    check_table(table_name)
+    fields = parse_fields(table_name, args)
+    record = yield 'get_record', table_name, record_id
+    if not record:
+        raise ApiError(404, "记录不存在。")
+    return json_response({'data': select_fields(record, fields)})
+
+
+def create_record_view(args, body, table_name):
+    check_table(table_name)
+    record = derive_amounts(table_name, clean_payload(table_name, body, partial=False))
+    if not (yield 'add_record', table_name, record):
+        raise save_error((yield 'get_record_by_key', table_name, *natural_key(table_name, record)), None, "保存记录失败。")
+    return json_response({'data': record}, 201)
+
+
+def update_record_view(args, body, table_name, record_id):
+    check_table(table_name)
+    changes = clean_payload(table_name, body, partial=True)
+    record = yield 'get_record', table_name, record_id
+    if not record:
+        raise ApiError(404, "记录不存在。")
+    changes, updated = merge_update(table_name, record, changes)
+    if not (yield 'update_record', table_name, record_id, changes):
+        raise save_error((yield 'get_record_by_key', table_name, *natural_key(table_name, updated)), record_id, "更新记录失败。")
+    return json_response({'data': updated})
+
+
+def delete_record_view(args, body, table_name, record_id):
+    check_table(table_name)
+    if not (yield 'delete_record', table_name, record_id):
+        raise ApiError(500, "删除记录失败。")
+    return '', 204, {}
+
+
+def summary_view(args, body):
+    record_type, start_date, end_date, name, granularity = parse_summary_query(args)
+    df = yield 'get_custom_summary', record_type, start_date, end_date, name, granularity
+    totals = yield 'get_summary_totals', record_type, start_date, end_date, name
+    return json_response(summary_payload(record_type, start_date, end_date, granularity, df, totals))
+
+
+# (规则, 方法, 视图)；规则相对于 /api/v1
+ROUTES = (
+    ('/summary', 'GET', summary_view),
+    ('/<table_name>', 'GET', list_records_view),
+    ('/<table_name>', 'POST', create_record_view),
+    ('/<table_name>/<int:record_id>', 'GET', get_record_view),
+    ('/<table_name>/<int:record_id>', 'PATCH', update_record_view),
+    ('/<table_name>/<int:record_id>', 'DELETE', delete_record_view),
+)
+# 这些方法返回真值表示写入成功，驱动函数据此通知页面缓存失效
+WRITE_METHODS = {'add_record', 'update_record', 'delete_record'}
+
+
+def run_view(view, get_db, on_write, *args, **route_args):
+    # 同步驱动：在当前请求线程中依次执行视图需要的数据库调用
+    steps = view(*args, **route_args)
+    try:
+        call = next(steps)
+        while True:
+            db_manager = get_db()
+            if db_manager is None:
+                raise ApiError(503, "数据库未连接。")
+            method, *params = call
+            result = getattr(db_manager, method)(*params)
+            if method in WRITE_METHODS and result and on_write:
+                on_write(params[0])
+            call = steps.send(result)
+    except StopIteration as finished:
+        return finished.value
+
+
+def create_api_blueprint(get_db, on_write=None):
+    # get_db() 返回本次请求使用的 DatabaseManager（来自连接池），不可用时返回 None
+    # on_write(table_name) 在写入成功后调用，用于让页面缓存失效
+    api = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+    @api.errorhandler(ApiError)
+    def handle_api_error(e):
+        return json_response({'error': e.message}, e.status)
+
+    @api.after_request
+    def compress(response):
+        if (response.direct_passthrough or response.status_code < 200 or response.status_code >= 300
+                or 'Content-Encoding' in response.headers):
+            return response
+        body = gzip_body(response.get_data(), request.headers.get('Accept-Encoding'))
+        if body is not None:
+            response.set_data(body)
+            response.headers['Content-Encoding'] = 'gzip'
+            response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    for rule, method, view in ROUTES:
+        def endpoint(view=view, **route_args):
+            return run_view(view, get_db, on_write, request.args, request.get_json(silent=True), **route_args)
+        api.add_url_rule(rule, view.__name__.removesuffix('_view'), endpoint, methods=[method])
+
+    return api
@@ -0,0 +1,90 @@
+# 文件路径: web_app/asgi.py
+# 版本：基于 asyncio 的 JSON 接口服务，面向大量扫码秤终端同时连接的场景
+#
+# 提供与 server.py 中 /api/v1 完全相同的接口（视图逻辑共用 api_v1.ROUTES），但运行在 ASGI 服务器上：
+#     pip install quart hypercorn
+#     cd web_app && hypercorn asgi:app --bind 0.0.0.0:5002
+# 云端后端使用 supabase-py 的异步客户端，请求在等待数据库时不占用线程；
+# 数据库调用的并发数由 async_max_concurrency 控制，参数相同的列表查询在进行中时会被合并为一次。
+# 网页界面仍由 server.py 提供。
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from quart import Quart, request
+
+from src.config import ConfigManager
+from src.async_database import create_async_database_manager
+from api_v1 import ApiError, ROUTES, json_response, gzip_body
+
+app = Quart(__name__)
+
+config = ConfigManager()
+db = None
+
+
+@app.before_serving
+async def connect():
+    # 异步客户端必须在事件循环中创建
+    global db
+    try:
+        db = await create_async_database_manager(config, config.get("async_max_concurrency", 16))
+        print("成功连接到数据库。")
+    except Exception as e:
+        print(f"连接数据库失败: {e}")
+
+
+async def run_view(view, *args, **route_args):
+    # 异步驱动：与 api_v1.run_view 相同，只是数据库调用在事件循环中等待
+    steps = view(*args, **route_args)
+    try:
+        call = next(steps)
+        while True:
+            if db is None:
+                raise ApiError(503, "数据库未连接。")
+            method, *params = call
+            call = steps.send(await getattr(db, method)(*params))
+    except StopIteration as finished:
+        return finished.value
+
+
+@app.errorhandler(ApiError)
+async def handle_api_error(e):
+    return json_response({'error': e.message}, e.status)
+
+
+@app.after_request
+async def compress(response):
+    if response.status_code < 200 or response.status_code >= 300 or 'Content-Encoding' in response.headers:
+        return response
+    body = gzip_body(await response.get_data(), request.headers.get('Accept-Encoding'))
+    if body is not None:
+        response.set_data(body)
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+for rule, method, view in ROUTES:
+    async def endpoint(view=view, **route_args):
+        return await run_view(view, request.args, await request.get_json(silent=True), **route_args)
+    app.add_url_rule('/api/v1' + rule, view.__name__.removesuffix('_view'), endpoint, methods=[method])
+
+
+@app.route('/api/v1/status', methods=['GET'])
+async def status():
+    if db is None:
+        raise ApiError(503, "数据库未连接。")
+    return json_response(db.stats())
+
+
+@app.after_serving
+async def shutdown():
+    if db is not None:
+        await db.close()
+
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5002)
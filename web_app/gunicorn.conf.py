@@ -0,0 +1,31 @@
+# 文件路径: web_app/gunicorn.conf.py
+# 版本：网页端的 gunicorn 部署配置
+#
+# 用法（gunicorn 会自动读取当前目录下的 gunicorn.conf.py）：
+#     pip install gunicorn gevent
+#     cd web_app && gunicorn server:app
+#
+# /events 是变更推送的长连接 (SSE)，每个打开的列表页一直占用一个连接。gunicorn 默认的 sync 工作进程
+# 一次只处理一个请求，打开几个页面就会占满全部进程，其余请求排队直到超时。
+# 这里使用 gevent 协程工作进程：每个长连接只占用一个协程，一个进程可同时保持上千个连接。
+# 未安装 gevent 时退回 gthread 线程工作进程，此时每个打开的页面占用一个线程，
+# threads 应大于同时打开的页面数加上并发请求数。
+
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5001")
+# 每个进程各有一个变更轮询线程和数据库连接池，进程数不必多
+workers = int(os.environ.get("GUNICORN_WORKERS", "2"))
+
+try:
+    import gevent  # noqa: F401
+    worker_class = "gevent"
+    worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", "1000"))
+except ImportError:
+    worker_class = "gthread"
+    threads = int(os.environ.get("GUNICORN_THREADS", "64"))
+
+# SSE 每 SSE_HEARTBEAT_SECONDS 秒发送一次心跳；长连接不受请求超时限制，timeout 只用于检测卡死的工作进程
+timeout = 60
+graceful_timeout = 10
+keepalive = 5
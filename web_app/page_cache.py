@@ -0,0 +1,67 @@
+# 文件路径: web_app/page_cache.py
+# 版本：列表页的条件请求与页面缓存
+#
+# 表版本号每隔几秒最多向数据库确认一次；版本不变时浏览器带着 ETag 刷新直接得到 304，
+# 其他浏览器访问相同页面时直接返回缓存的 HTML，都不再查询记录和总数。
+
+import time
+import hashlib
+import threading
+import collections
+
+
+class TableVersionTracker:
+    def __init__(self, check_interval=2.0):
+        self.check_interval = check_interval
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, db_manager, table_name):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._versions.get(table_name)
+            if entry and now - entry[1] < self.check_interval:
+                return entry[0]
+        version = db_manager.get_table_version(table_name)
+        if version is None:
+            return None
+        with self._lock:
+            self._versions[table_name] = (version, now)
+        return version
+
+    def invalidate(self, table_name):
+        # 本进程写入后立即失效，下一个请求重新读取版本号，不必等到检查间隔结束
+        with self._lock:
+            self._versions.pop(table_name, None)
+
+
+class RenderedPageCache:
+    """按 (页面, 表, 版本号, 查询参数) 缓存渲染好的 HTML，超出容量时淘汰最久未用的页面。"""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._pages = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._pages.get(key)
+            if body is not None:
+                self._pages.move_to_end(key)
+            return body
+
+    def set(self, key, body):
+        with self._lock:
+            self._pages[key] = body
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+
+
+def page_key(endpoint, table_name, version, args):
+    # args 为请求的查询参数 (MultiDict)，按参数名排序，保证相同查询得到相同的键
+    return (endpoint, table_name, version, tuple(sorted(args.items(multi=True))))
+
+
+def make_etag(key):
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:20]
@@ -1,31 +1,152 @@
 # 文件路径: web_app/server.py
 # 版本：已为种植户页面增加完整的搜索和分页功能
 
-from flask import Flask, render_template, request, redirect, url_for
+from flask import Flask, render_template, request, redirect, url_for, Response, g, make_response
 import sys
 import os
 import datetime
+import json
+import queue
+import functools
 import math # 引入 math 用于计算总页数
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.database import DatabaseManager
+from src.database import create_database_manager
+from src.db_base import NAME_COLUMNS, encode_cursor, decode_cursor
+from src.config import ConfigManager
+from src.slip_renderer import render_settlement_html, render_settlement_pdf, pdf_available
+from src.db_pool import DatabaseManagerPool
+from src.cache import PageCache
+from src.change_feed import ChangeFeed, coalesce_changes, reload_events, MAX_PATCH_ROWS
+from api_v1 import create_api_blueprint
+from page_cache import TableVersionTracker, RenderedPageCache, page_key, make_etag
+import pandas as pd
 
 app = Flask(__name__, static_folder='static')
 app.secret_key = 'some_secret_key_for_flash_messages' 
 
+# 每个请求从池中取一个独立的 DatabaseManager，多线程部署时请求之间互不争用同一个客户端
 try:
-    db_manager = DatabaseManager()
-    print("成功连接到Supabase数据库。")
+    # 池中的管理器共用一个分页缓存：任何一个写入后，其他实例不会再返回旧页面
+    db_pool = DatabaseManagerPool(functools.partial(create_database_manager, page_cache=PageCache()),
+                                  size=ConfigManager().get("db_pool_size", 4))
+    print("成功连接到数据库。")
 except Exception as e:
     print(f"连接数据库失败: {e}")
-    db_manager = None
+    db_pool = None
+
+def get_db():
+    if db_pool is None:
+        return None
+    if 'db_manager' not in g:
+        g.db_manager = db_pool.acquire()
+    return g.db_manager
+
+@app.teardown_appcontext
+def release_db(exception=None):
+    db_manager = g.pop('db_manager', None)
+    if db_manager is not None:
+        db_pool.release(db_manager)
+
+version_tracker = TableVersionTracker(check_interval=ConfigManager().get("version_check_interval", 2.0))
+page_cache = RenderedPageCache()
+
+def record_written(table_name):
+    version_tracker.invalidate(table_name)
+
+def cached_listing(table_name):
+    # 列表页：表版本号不变时，带 If-None-Match 的刷新返回 304，其余请求优先使用缓存的页面
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            db_manager = get_db()
+            version = version_tracker.get(db_manager, table_name) if db_manager else None
+            if version is None:
+                return view(*args, **kwargs)
+            key = page_key(request.endpoint, table_name, version, request.args)
+            etag = make_etag(key)
+            if etag in request.if_none_match:
+                response = Response(status=304)
+            else:
+                body = page_cache.get(key)
+                if body is None:
+                    body = view(*args, **kwargs)
+                    if not isinstance(body, str):
+                        return body
+                    page_cache.set(key, body)
+                response = make_response(body)
+            response.set_etag(etag)
+            # 浏览器每次都要带 ETag 重新确认，保证数据变化后立即看到新页面
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+app.register_blueprint(create_api_blueprint(get_db, on_write=record_written))
+
+def pooled_query(method, *args):
+    with db_pool.connection() as db_manager:
+        return getattr(db_manager, method)(*args)
+
+# 所有浏览器共用一个变更轮询线程，第一个 /events 连接到来时启动
+change_feed = ChangeFeed(pooled_query, interval=ConfigManager().get("change_poll_interval", 1.0)) if db_pool else None
+SSE_HEARTBEAT_SECONDS = 15
+
+def sse_message(changes, table_name=None):
+    events = [e for e in coalesce_changes(changes) if not table_name or e['table_name'] == table_name]
+    if not events:
+        return None
+    seq = max((c['seq'] for c in changes if 'seq' in c), default=None)
+    data = json.dumps(events, ensure_ascii=False, default=str)
+    return (f"id: {seq}\n" if seq else "") + f"event: changes\ndata: {data}\n\n"
+
+@app.route('/events')
+def events():
+    # 变更推送 (Server-Sent Events)：每个打开的列表页一直占用一个连接，不能用 gunicorn 默认的 sync 工作进程，
+    # 请使用 web_app/gunicorn.conf.py 中的 gevent（或 gthread）配置部署
+    if change_feed is None: return "数据库未连接。", 500
+    table_name = request.args.get('table')
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    change_feed.start()
+    subscriber = change_feed.subscribe()
+
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            last_seq = 0
+            if last_event_id is not None:
+                # 断线重连：补发断开期间的变更，错过太多时让页面整页刷新
+                missed = pooled_query('fetch_changes', last_event_id, MAX_PATCH_ROWS + 1)
+                if missed is None or len(missed) > MAX_PATCH_ROWS:
+                    missed = reload_events()
+                else:
+                    last_seq = missed[-1]['seq'] if missed else 0
+                message = sse_message(missed, table_name)
+                if message:
+                    yield message
+            while True:
+                try:
+                    changes = subscriber.get(timeout=SSE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                changes = [c for c in changes if c.get('seq', last_seq + 1) > last_seq]
+                message = sse_message(changes, table_name)
+                if message:
+                    yield message
+        finally:
+            change_feed.unsubscribe(subscriber)
+
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 PAGE_SIZE = 50 # 定义每页显示的记录数
 
 # --- 核心修改点：主页路由现在处理搜索和分页 ---
 @app.route('/')
+@cached_listing('grower_records')
 def index():
+    db_manager = get_db()
     if not db_manager: return "数据库未连接。", 500
     
     # 从URL获取当前页码，默认为第一页
@@ -40,31 +161,46 @@ def index():
     # 清理空的参数，避免传给数据库
     clean_search_params = {k: v for k, v in search_params.items() if v}
 
-    # 获取符合搜索条件的总记录数和总页数
-    total_records = db_manager.count_records('grower_records', clean_search_params)
+    # 翻页链接带上 after/before 游标时走键集分页，否则按页码定位；总数随同一次查询返回
+    after = decode_cursor(request.args.get('after'))
+    before = decode_cursor(request.args.get('before'))
+    cursor, direction = (after, 'next') if after else (before, 'prev')
+    result = db_manager.fetch_records_page('grower_records', PAGE_SIZE, clean_search_params, cursor, direction, page)
+    total_records = result['total'] or 0
     total_pages = math.ceil(total_records / PAGE_SIZE) if total_records > 0 else 1
-
-    # 获取当前页的数据
-    records = db_manager.fetch_paged_records('grower_records', page, PAGE_SIZE, clean_search_params)
     
     # 将所有需要的信息传递给HTML模板
     return render_template('index.html', 
-                           records=records,
+                           records=result['records'],
                            page=page, 
                            total_pages=total_pages,
+                           has_prev=result['has_prev'],
+                           has_next=result['has_next'],
+                           prev_cursor=encode_cursor(result['prev_cursor']),
+                           next_cursor=encode_cursor(result['next_cursor']),
                            search_params=search_params)
 
 
 @app.route('/clients')
+@cached_listing('client_records')
 def clients_page():
     # (此函数保持不变)
+    db_manager = get_db()
     if not db_manager: return "数据库未连接。", 500
     records = db_manager.fetch_paged_records('client_records', 1, 100)
     return render_template('clients.html', records=records)
 
+def save_failed(db_manager, table_name, data, record_id=None):
+    # 区分 (日期, 姓名, 规格) 唯一约束冲突与其他保存失败
+    existing = db_manager.get_record_by_key(table_name, data['date'], data[NAME_COLUMNS[table_name]], data['spec'])
+    if existing and existing['id'] != record_id:
+        return "已存在同一天、同一人、同一规格的记录，请直接修改该记录。", 409
+    return "保存记录失败。", 500
+
 # --- 添加、编辑、删除等路由保持不变 (此处省略) ---
 @app.route('/add_grower', methods=['GET', 'POST'])
 def add_grower():
+    db_manager = get_db()
     if not db_manager: return "数据库未连接。", 500
     if request.method == 'POST':
         try:
@@ -72,7 +208,9 @@ def add_grower():
             if not data['grower_name'] or not data['spec']: return "姓名和规格不能为空！", 400
             data['net_weight'] = data['gross_weight'] - data['secondary_fruit'] - data['tare_weight']
             data['total_amount'] = round(data['net_weight'] * data['unit_price'], 2)
-            db_manager.add_record('grower_records', data)
+            if not db_manager.add_record('grower_records', data):
+                return save_failed(db_manager, 'grower_records', data)
+            record_written('grower_records')
             return redirect(url_for('index'))
         except (ValueError, TypeError) as e: return f"数据格式错误: {e}", 400
     today = datetime.date.today().strftime('%Y-%m-%d')
@@ -80,13 +218,16 @@ def add_grower():
 
 @app.route('/add_client', methods=['GET', 'POST'])
 def add_client():
+    db_manager = get_db()
     if not db_manager: return "数据库未连接。", 500
     if request.method == 'POST':
         try:
             data = { 'date': request.form['date'], 'client_name': request.form['client_name'].strip(), 'spec': request.form['spec'].strip(), 'pieces': int(request.form['pieces']), 'weight': float(request.form['weight']), 'unit_price': float(request.form['unit_price']), 'notes': request.form.get('notes', '').strip() }
             if not data['client_name'] or not data['spec']: return "客户名称和规格不能为空！", 400
             data['total_amount'] = round(data['pieces'] * data['weight'] * data['unit_price'], 2)
-            db_manager.add_record('client_records', data)
+            if not db_manager.add_record('client_records', data):
+                return save_failed(db_manager, 'client_records', data)
+            record_written('client_records')
             return redirect(url_for('clients_page'))
         except (ValueError, TypeError) as e: return f"数据格式错误: {e}", 400
     today = datetime.date.today().strftime('%Y-%m-%d')
@@ -94,41 +235,85 @@ def add_client():
 
 @app.route('/edit_grower/<int:record_id>', methods=['GET', 'POST'])
 def edit_grower(record_id):
+    db_manager = get_db()
     if not db_manager: return "数据库未连接。", 500
     if request.method == 'POST':
         try:
             data = { 'date': request.form['date'], 'grower_name': request.form['grower_name'].strip(), 'spec': request.form['spec'].strip(), 'gross_weight': float(request.form['gross_weight']), 'secondary_fruit': float(request.form.get('secondary_fruit', 0)), 'tare_weight': float(request.form.get('tare_weight', 0)), 'unit_price': float(request.form['unit_price']), 'notes': request.form.get('notes', '').strip() }
             data['net_weight'] = data['gross_weight'] - data['secondary_fruit'] - data['tare_weight']
             data['total_amount'] = round(data['net_weight'] * data['unit_price'], 2)
-            db_manager.update_record('grower_records', record_id, data)
+            if not db_manager.update_record('grower_records', record_id, data):
+                return save_failed(db_manager, 'grower_records', data, record_id)
+            record_written('grower_records')
             return redirect(url_for('index'))
         except (ValueError, TypeError) as e: return f"数据格式错误: {e}", 400
-    response = db_manager.supabase.table('grower_records').select("*").eq('id', record_id).single().execute()
-    return render_template('edit_grower.html', record=response.data)
+    record = db_manager.get_record('grower_records', record_id)
+    if not record: return "记录不存在。", 404
+    return render_template('edit_grower.html', record=record)
 
 @app.route('/edit_client/<int:record_id>', methods=['GET', 'POST'])
 def edit_client(record_id):
+    db_manager = get_db()
     if not db_manager: return "数据库未连接。", 500
     if request.method == 'POST':
         try:
             data = { 'date': request.form['date'], 'client_name': request.form['client_name'].strip(), 'spec': request.form['spec'].strip(), 'pieces': int(request.form['pieces']), 'weight': float(request.form['weight']), 'unit_price': float(request.form['unit_price']), 'notes': request.form.get('notes', '').strip() }
             data['total_amount'] = round(data['pieces'] * data['weight'] * data['unit_price'], 2)
-            db_manager.update_record('client_records', record_id, data)
+            if not db_manager.update_record('client_records', record_id, data):
+                return save_failed(db_manager, 'client_records', data, record_id)
+            record_written('client_records')
             return redirect(url_for('clients_page'))
         except (ValueError, TypeError) as e: return f"数据格式错误: {e}", 400
-    response = db_manager.supabase.table('client_records').select("*").eq('id', record_id).single().execute()
-    return render_template('edit_client.html', record=response.data)
+    record = db_manager.get_record('client_records', record_id)
+    if not record: return "记录不存在。", 404
+    return render_template('edit_client.html', record=record)
+
+# 结算单：/settlement/grower?name=张三&start_date=...&end_date=...&format=pdf，默认输出可打印的 HTML
+SETTLEMENT_TYPES = {
+    'grower': ('grower_records', 'grower_name', '种植户结算单'),
+    'client': ('client_records', 'client_name', '客户结算单'),
+}
+
+@app.route('/settlement/<record_type>')
+def settlement(record_type):
+    db_manager = get_db()
+    if not db_manager: return "数据库未连接。", 500
+    if record_type not in SETTLEMENT_TYPES: return "未知的结算类型。", 404
+    table_name, name_key, title = SETTLEMENT_TYPES[record_type]
+    search_params = {k: request.args.get(k, '').strip() for k in ('name', 'start_date', 'end_date')}
+    search_params = {k: v for k, v in search_params.items() if v}
+    if not search_params.get('name'): return "请指定结算对象姓名。", 400
+
+    overview = db_manager.get_search_overview(table_name, search_params)
+    if overview is None: return "查询记录失败，请稍后重试。", 500
+    if not overview['count']: return "没有符合条件的记录。", 404
+    if len(overview['names']) > 1: return "搜索结果包含多个人，请输入完整姓名。", 400
+    records = [row for chunk in db_manager.iter_record_chunks(table_name, search_params) for row in chunk]
+    df = pd.DataFrame(records)
+    entity_name = overview['names'][0]
+    date_range = (overview['min_date'], overview['max_date'])
+
+    config = ConfigManager()
+    if request.args.get('format') == 'pdf':
+        if not pdf_available(): return "服务器未安装 reportlab，无法生成PDF。", 501
+        pdf = render_settlement_pdf(df, title, entity_name, record_type, date_range, config)
+        return Response(pdf, mimetype='application/pdf', headers={'Content-Disposition': 'inline; filename="settlement.pdf"'})
+    return render_settlement_html(df, title, entity_name, record_type, date_range, config)
 
 @app.route('/delete_grower/<int:record_id>', methods=['POST'])
 def delete_grower(record_id):
+    db_manager = get_db()
     if not db_manager: return "数据库未连接。", 500
     db_manager.delete_record('grower_records', record_id)
+    record_written('grower_records')
     return redirect(url_for('index'))
 
 @app.route('/delete_client/<int:record_id>', methods=['POST'])
 def delete_client(record_id):
+    db_manager = get_db()
     if not db_manager: return "数据库未连接。", 500
     db_manager.delete_record('client_records', record_id)
+    record_written('client_records')
     return redirect(url_for('clients_page'))
 
 
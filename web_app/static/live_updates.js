@@ -0,0 +1,97 @@
+// 文件路径: web_app/static/live_updates.js
+// 版本：订阅 /events 变更推送，只更新表格中受影响的行，不再需要手动刷新页面
+
+(function () {
+    var tbody = document.getElementById('records');
+    var template = document.getElementById('row-template');
+    if (!tbody || !template || !window.EventSource) return;
+
+    var table = tbody.dataset.table;
+    var limit = parseInt(tbody.dataset.limit, 10) || 50;
+    var liveInsert = tbody.dataset.liveInsert === 'true';
+
+    function matchesSearch(record) {
+        // 与服务器端的搜索条件一致：姓名模糊匹配，日期闭区间
+        var name = tbody.dataset.name || '';
+        var date = String(record.date || '').slice(0, 10);
+        if (name && String(record[tbody.dataset.nameField] || '').indexOf(name) === -1) return false;
+        if (tbody.dataset.startDate && date < tbody.dataset.startDate) return false;
+        if (tbody.dataset.endDate && date > tbody.dataset.endDate) return false;
+        return true;
+    }
+
+    function formatValue(value, format) {
+        if (value === null || value === undefined) return '';
+        if (format === 'fixed2') return Number(value).toFixed(2);
+        if (format === 'int') return String(Math.trunc(Number(value)));
+        return String(value);
+    }
+
+    function buildRow(record) {
+        var row = template.content.firstElementChild.cloneNode(true);
+        row.dataset.id = record.id;
+        row.dataset.date = String(record.date).slice(0, 10);
+        row.querySelectorAll('[data-field]').forEach(function (cell) {
+            cell.textContent = formatValue(record[cell.dataset.field], cell.dataset.format);
+        });
+        row.querySelectorAll('[data-record-link]').forEach(function (el) {
+            var attr = el.tagName === 'FORM' ? 'action' : 'href';
+            el.setAttribute(attr, el.getAttribute(attr).replace(/\/0$/, '/' + record.id));
+        });
+        return row;
+    }
+
+    function findRow(id) {
+        return tbody.querySelector('tr[data-id="' + id + '"]');
+    }
+
+    function insertSorted(row) {
+        // 列表按 (日期, ID) 倒序排列
+        var rows = tbody.querySelectorAll('tr[data-id]');
+        for (var i = 0; i < rows.length; i++) {
+            var other = rows[i];
+            if (other.dataset.date < row.dataset.date ||
+                (other.dataset.date === row.dataset.date && Number(other.dataset.id) < Number(row.dataset.id))) {
+                tbody.insertBefore(row, other);
+                return;
+            }
+        }
+        tbody.appendChild(row);
+    }
+
+    function flash(row) {
+        row.classList.add('row-changed');
+        setTimeout(function () { row.classList.remove('row-changed'); }, 2000);
+    }
+
+    function apply(change) {
+        if (change.table_name !== table) return;
+        if (change.op === 'reload') {
+            window.location.reload();
+            return;
+        }
+        var existing = findRow(change.record_id);
+        if (change.op === 'delete' || !matchesSearch(change.record)) {
+            if (existing) existing.remove();
+            return;
+        }
+        var row = buildRow(change.record);
+        if (existing) {
+            existing.replaceWith(row);
+        } else if (liveInsert) {
+            insertSorted(row);
+        } else {
+            return;
+        }
+        flash(row);
+        var empty = tbody.querySelector('tr.empty-row');
+        if (empty) empty.remove();
+        var rows = tbody.querySelectorAll('tr[data-id]');
+        for (var i = limit; i < rows.length; i++) rows[i].remove();
+    }
+
+    var source = new EventSource('/events?table=' + encodeURIComponent(table));
+    source.addEventListener('changes', function (event) {
+        JSON.parse(event.data).forEach(apply);
+    });
+})();